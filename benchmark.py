@@ -0,0 +1,264 @@
+# benchmark.py
+#
+# Misst den Durchsatz der Pipeline read_participants -> filter_participants -> generate_certificates
+# -> generate_master_certificates mit synthetischen Teilnehmerdateien.
+#
+# Beispiel: python benchmark.py --sizes 100,1000,5000 --workers 4 --json-report benchmark.json
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+import tex_stub
+from participant_reader import read_participants, filter_participants, ParticipantIndex
+from certificate_generator import (generate_certificates, generate_master_certificates, BATCH_MODES, LATEX_PREAMBLE,
+                                   OutputLayout)
+from tex_daemon import TexDaemon
+
+# Verteilung angelehnt an reale Turniere: Altersklassen mit typischen Gewichtsklassen
+AGE_CLASSES = {
+    'MenU15': ['-34,0', '-37,0', '-40,0', '-43,0', '-46,0', '-50,0', '-55,0', '-60,0', '-66,0', '+66,0'],
+    'WomenU15': ['-33,0', '-36,0', '-40,0', '-44,0', '-48,0', '-52,0', '-57,0', '-63,0', '+63,0'],
+    'MenU18': ['-23,0', '-46,0', '-50,0', '-55,0', '-60,0', '-66,0', '-73,0', '-81,0', '-90,0', '+90,0'],
+    'WomenU18': ['-40,0', '-44,0', '-48,0', '-52,0', '-57,0', '-63,0', '-70,0', '+70,0'],
+    'MenU21': ['-60,0', '-66,0', '-73,0', '-81,0', '-90,0', '-100,0', '+100,0'],
+    'WomenU21': ['-48,0', '-52,0', '-57,0', '-63,0', '-70,0', '-78,0', '+78,0'],
+}
+FIRST_NAMES = ['Anna', 'Ben', 'Clara', 'David', 'Elif', 'Felix', 'Greta', 'Hannes', 'Ida', 'Jonas',
+               'Karl-Heinz', 'Lea', 'Mehmet', 'Nora', 'Oskar', 'Paula', 'Jürgen', 'Sören', 'Zoë', 'Maximilian']
+LAST_NAMES = ['Müller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Meyer', 'Wagner', 'Becker', 'Schulz',
+              'Hoffmann', 'Schäfer', 'Koch', 'Bauer', 'Richter', 'Klein', 'Wolf', 'Schröder-Neumann', 'Yılmaz']
+CLUBS = ['JC Musterstadt', 'TSV Beispielhausen', 'Budokan Nord', 'SV Blau-Weiß', '']
+# Platzierungen in einer Gewichtsklasse in Siegerehrungsreihenfolge
+PLACINGS = [1, 2, 3, 3, 5, 5, 7, 7]
+
+def synthesize_participants(count: int, seed: int = 0) -> List[Dict]:
+    """Erzeugt Einträge im Format des Ergebnis-Exports (competitors.json)."""
+    rng = random.Random(seed)
+    categories = [f"{age} {weight}" for age, weights in AGE_CLASSES.items() for weight in weights]
+    per_category: Dict[str, int] = {}
+    items = []
+    for ix in range(count):
+        category = rng.choice(categories)
+        rank = per_category.get(category, 0)
+        per_category[category] = rank + 1
+        items.append({
+            'ix': ix, 'id': '', 'coachid': '',
+            'pos': PLACINGS[rank] if rank < len(PLACINGS) else 0,
+            'flags': 0,
+            'last': rng.choice(LAST_NAMES).upper(),
+            'first': f"{rng.choice(FIRST_NAMES)} {ix}",
+            'club': rng.choice(CLUBS), 'country': '',
+            'category': category,
+            'belt': '?', 'tatami': rng.randint(1, 4), 'waittime': -1, 'matchnum': 0, 'round': 33,
+        })
+    return items
+
+def install_tex_stub(directory: str) -> None:
+    """Legt ein 'pdflatex'-Programm an, das tex_stub ausführt, und stellt es im PATH an erste Stelle."""
+    stub_module_dir = os.path.dirname(os.path.abspath(tex_stub.__file__))
+    if os.name == 'nt':
+        with open(os.path.join(directory, 'pdflatex.bat'), 'w', encoding='utf-8') as f:
+            f.write(f'@"{sys.executable}" "{os.path.join(stub_module_dir, "tex_stub.py")}" %*\n')
+    else:
+        launcher = os.path.join(directory, 'pdflatex')
+        with open(launcher, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n"
+                    f"import sys\nsys.path.insert(0, {stub_module_dir!r})\n"
+                    f"import tex_stub\nsys.exit(tex_stub.main(sys.argv[1:]))\n")
+        os.chmod(launcher, os.stat(launcher).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+
+def measure(stage: str, function: Callable, results: Dict[str, Dict], verbose: bool = False):
+    """Führt eine Stufe aus und speichert Laufzeit und Spitzenverbrauch des Python-Speichers."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    if verbose:
+        value = function()
+    else:
+        # Ausgaben pro Urkunde unterdrücken, sie würden die Messung verfälschen
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            value = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results[stage] = {'sekunden': elapsed, 'speicher_spitze_mb': peak / (1024 * 1024)}
+    return value
+
+def get_max_rss_mb() -> Optional[float]:
+    """Gibt den maximalen Arbeitsspeicher des Prozesses zurück (nicht unter Windows verfügbar)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet Kilobyte, macOS Byte
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+def run_benchmark(size: int, workdir: str, args: argparse.Namespace) -> Dict:
+    """Durchläuft die Pipeline einmal mit einer synthetischen Datei der angegebenen Größe."""
+    json_file = os.path.join(workdir, f"teilnehmer_{size}.json")
+    output_dir = os.path.join(workdir, f"Urkunden_{size}")
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(synthesize_participants(size, args.seed), f, ensure_ascii=False)
+    with open(args.template, 'r', encoding='utf-8') as f:
+        template = f.read()
+    with open(args.long_name_template, 'r', encoding='utf-8') as f:
+        long_name_template = f.read()
+
+    stages: Dict[str, Dict] = {}
+    participants = measure('einlesen', lambda: read_participants(json_file), stages, args.verbose)
+
+    # Filterabfragen wie am Urkundentisch: einmal direkt, einmal über den Index
+    queries: List[Tuple[str, str]] = [(p.vorname, p.name) for p in participants[::max(1, size // 50)]]
+    measure('filtern', lambda: [filter_participants(participants, vorname=v, name=n) for v, n in queries], stages, args.verbose)
+    index = measure('index_aufbauen', lambda: ParticipantIndex(participants), stages, args.verbose)
+    measure('filtern_index', lambda: [index.filter(vorname=v, name=n) for v, n in queries], stages, args.verbose)
+
+    errors: List[str] = []
+    daemon = TexDaemon(LATEX_PREAMBLE, pool_size=args.workers) if args.tex_daemon else None
+    layout = OutputLayout(output_dir)
+    try:
+        results = measure('urkunden', lambda: generate_certificates(
+            participants, template, long_name_template, output_dir, args.min_chars_for_long_template,
+            workers=args.workers, batch_mode=args.batch_mode, batch_size=args.batch_size, engine=args.engine,
+            on_error=lambda participant, message: errors.append(message), daemon=daemon, layout=layout),
+            stages, args.verbose)
+    finally:
+        if daemon is not None:
+            daemon.close()
+    generated = [result for result in results if result]
+    master_stats: List[Dict] = []
+    measure('master_pdfs', lambda: generate_master_certificates(
+        output_dir, generated, on_master=lambda path, stats: master_stats.append(stats), layout=layout),
+        stages, args.verbose)
+
+    certificate_seconds = stages['urkunden']['sekunden']
+    report = {
+        'teilnehmer': size,
+        'urkunden': len(generated),
+        'fehler': len(errors),
+        'urkunden_pro_sekunde': len(generated) / certificate_seconds if certificate_seconds else 0.0,
+        'max_rss_mb': get_max_rss_mb(),
+        'master_mb': sum(stats['size'] for stats in master_stats) / (1024 * 1024),
+        'master_mb_gespart': sum(stats['bytes_saved'] for stats in master_stats) / (1024 * 1024),
+        'stufen': stages,
+    }
+    if not args.keep:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return report
+
+# Module, die beim Start geladen werden, und Abhängigkeiten, die sie nicht sofort laden dürfen
+STARTUP_MODULES = ['main', 'cli', 'certificate_generator', 'participant_reader']
+LAZY_DEPENDENCIES = {'main': ['PyPDF2'], 'cli': ['PyPDF2', 'tkinter'],
+                     'certificate_generator': ['PyPDF2', 'tkinter'], 'participant_reader': ['PyPDF2', 'tkinter']}
+
+def measure_import_time(module: str, repeats: int = 3) -> Tuple[float, List[str]]:
+    """
+    Misst die Importzeit eines Moduls in einem frischen Interpreter (bester von mehreren Läufen)
+    und gibt zusätzlich die dabei unerwartet geladenen schweren Abhängigkeiten zurück.
+    """
+    lazy = LAZY_DEPENDENCIES.get(module, [])
+    code = f"import sys, time; s = time.perf_counter(); import {module}; e = time.perf_counter(); " \
+           f"print(e - s); print(','.join(m for m in {lazy!r} if m in sys.modules))"
+    best = float('inf')
+    loaded: List[str] = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        seconds, modules = (result.stdout.splitlines() + [''])[:2]
+        best = min(best, float(seconds))
+        loaded = [m for m in modules.split(',') if m]
+    return best * 1000, loaded
+
+def check_import_budget(budget_ms: float) -> bool:
+    """Prüft die Importzeiten der Startmodule gegen das Budget und gibt eine Tabelle aus."""
+    ok = True
+    print(f"\nImportzeiten (Budget {budget_ms:.0f} ms)")
+    print(f"  {'Modul':<24}{'Zeit [ms]':>12}  Ergebnis")
+    for module in STARTUP_MODULES:
+        milliseconds, loaded = measure_import_time(module)
+        problems = []
+        if milliseconds > budget_ms:
+            problems.append('Budget überschritten')
+        if loaded:
+            problems.append('lädt ' + ', '.join(loaded))
+        ok = ok and not problems
+        print(f"  {module:<24}{milliseconds:>12.1f}  {'; '.join(problems) or 'ok'}")
+    return ok
+
+def print_report(report: Dict) -> None:
+    """Gibt die Messwerte eines Laufs als Tabelle aus."""
+    print(f"\n{report['teilnehmer']} Teilnehmer: {report['urkunden']} Urkunden, {report['fehler']} Fehler, "
+          f"{report['urkunden_pro_sekunde']:.1f} Urkunden/s")
+    print(f"  Master-PDFs: {report['master_mb']:.1f} MB, {report['master_mb_gespart']:.1f} MB durch gemeinsame Ressourcen gespart")
+    if report['max_rss_mb'] is not None:
+        print(f"  Maximaler Arbeitsspeicher des Prozesses: {report['max_rss_mb']:.1f} MB")
+    print(f"  {'Stufe':<16}{'Zeit [s]':>12}{'Spitze [MB]':>14}")
+    for stage, values in report['stufen'].items():
+        print(f"  {stage:<16}{values['sekunden']:>12.3f}{values['speicher_spitze_mb']:>14.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark der Urkunden-Pipeline mit synthetischen Teilnehmerdaten.')
+    parser.add_argument('--sizes', default='100,1000', help='Kommagetrennte Teilnehmerzahlen (100 bis 50000)')
+    parser.add_argument('--workers', type=int, default=config.DEFAULT_WORKERS, help='Anzahl paralleler pdflatex-Prozesse')
+    parser.add_argument('--batch-mode', choices=BATCH_MODES, default=config.DEFAULT_BATCH_MODE, help='Kompiliermodus')
+    parser.add_argument('--engine', choices=config.ENGINES, default=config.DEFAULT_ENGINE, help='Satz-Engine')
+    parser.add_argument('--batch-size', type=int, default=config.DEFAULT_BATCH_SIZE, help='Urkunden pro pdflatex-Lauf im Sammelmodus')
+    parser.add_argument('--template', default=config.DEFAULT_TEMPLATE_FILE, help='LaTeX-Vorlagendatei')
+    parser.add_argument('--long_name_template', default=config.DEFAULT_LONG_TEMPLATE_FILE, help='LaTeX-Vorlagendatei für lange Namen')
+    parser.add_argument('--min-chars-for-long-template', type=int, default=config.DEFAULT_MIN_CHARS_FOR_LONG_TEMPLATE,
+                        help='Mindestanzahl an Zeichen für die Verwendung des alternativen Templates')
+    parser.add_argument('--tex-daemon', action='store_true', help='Mit vorgewärmten pdflatex-Prozessen kompilieren')
+    parser.add_argument('--real-tex', action='store_true', help='Echtes pdflatex statt des Stubs verwenden')
+    parser.add_argument('--seed', type=int, default=0, help='Startwert für die synthetischen Daten')
+    parser.add_argument('--keep', action='store_true', help='Erzeugte Urkunden nicht löschen')
+    parser.add_argument('--verbose', action='store_true', help='Ausgaben der Pipeline nicht unterdrücken')
+    parser.add_argument('--json-report', help='Messwerte zusätzlich als JSON in diese Datei schreiben')
+    parser.add_argument('--import-budget', action='store_true',
+                        help='Nur die Importzeiten der Startmodule gegen config.IMPORT_TIME_BUDGET_MS prüfen')
+    args = parser.parse_args()
+
+    if args.import_budget:
+        sys.exit(0 if check_import_budget(config.IMPORT_TIME_BUDGET_MS) else 1)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    workdir = tempfile.mkdtemp(prefix='urkunden_benchmark_')
+    # Eigene Format- und Hintergrund-Caches, damit der Benchmark die Caches des Benutzers nicht verändert;
+    # ein mit dem Stub gesetzter Hintergrund würde sonst in echten Läufen wiederverwendet
+    config.FORMAT_CACHE_DIR = os.path.join(workdir, 'formate')
+    config.OVERLAY_CACHE_DIR = os.path.join(workdir, 'hintergruende')
+    if not args.real_tex:
+        stub_dir = os.path.join(workdir, 'bin')
+        os.makedirs(stub_dir)
+        install_tex_stub(stub_dir)
+
+    reports = []
+    try:
+        for size in sizes:
+            report = run_benchmark(size, workdir, args)
+            reports.append(report)
+            print_report(report)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"\nArbeitsverzeichnis: {workdir}")
+
+    if args.json_report:
+        with open(args.json_report, 'w', encoding='utf-8') as f:
+            json.dump({'workers': args.workers, 'batch_mode': args.batch_mode, 'engine': args.engine, 'tex_daemon': args.tex_daemon, 'stub': not args.real_tex,
+                       'laeufe': reports}, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
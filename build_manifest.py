@@ -0,0 +1,87 @@
+# build_manifest.py
+
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Set
+from participant_reader import Participant
+
+MANIFEST_FILENAME = '.urkunden_manifest.json'
+
+class BuildManifest:
+    """
+    Merkt sich im Ausgabeverzeichnis für jede erzeugte Urkunde einen Hash ihrer Eingaben,
+    damit bei einem erneuten Lauf nur geänderte Urkunden neu kompiliert werden.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.entries: Dict[str, str] = {}
+        self.current: Set[str] = set()
+        self.changed_files: List[str] = []
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            print(f"Build-Manifest '{self.path}' konnte nicht gelesen werden, alle Urkunden werden neu erzeugt: {e}")
+
+    @staticmethod
+    def compute_hash(participant: Participant, selected_template: str, preamble: str,
+                     min_chars_for_long_template: int, engine: Optional[str] = None) -> str:
+        """
+        Berechnet den Hash über Teilnehmerdaten, gewählte Vorlage, Vorspann und Zeichengrenze.
+        Eine abweichende Satz-Engine geht zusätzlich ein; ohne engine bleiben bestehende Manifeste gültig.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(dataclasses.asdict(participant), sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        parts = [selected_template, preamble, str(min_chars_for_long_template)]
+        if engine is not None:
+            parts.append(engine)
+        for part in parts:
+            digest.update(b'\0')
+            digest.update(part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _key(self, pdf_path: str) -> str:
+        return os.path.relpath(pdf_path, self.output_dir).replace(os.sep, '/')
+
+    def is_up_to_date(self, pdf_path: str, digest: str) -> bool:
+        """Prüft, ob die PDF-Datei existiert und mit denselben Eingaben erzeugt wurde."""
+        key = self._key(pdf_path)
+        with self._lock:
+            self.current.add(key)
+            return self.entries.get(key) == digest and os.path.exists(pdf_path)
+
+    def update(self, pdf_path: str, digest: str) -> None:
+        """Trägt eine neu erzeugte Urkunde ein und merkt sie sich als geändert."""
+        key = self._key(pdf_path)
+        with self._lock:
+            self.current.add(key)
+            self.entries[key] = digest
+            self.changed_files.append(pdf_path)
+
+    def prune(self) -> None:
+        """Löscht Urkunden, die in diesem Lauf nicht mehr vorkamen, z. B. von entfernten Teilnehmern."""
+        with self._lock:
+            for key in [key for key in self.entries if key not in self.current]:
+                pdf_path = os.path.join(self.output_dir, *key.split('/'))
+                if os.path.exists(pdf_path):
+                    os.remove(pdf_path)
+                    print(f"Veraltete Urkunde '{pdf_path}' wurde gelöscht.")
+                self.changed_files.append(pdf_path)
+                del self.entries[key]
+
+    def save(self) -> None:
+        """Schreibt das Manifest atomar in das Ausgabeverzeichnis."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with self._lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
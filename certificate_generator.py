@@ -1,127 +1,834 @@
 # certificate_generator.py
 
+import contextlib
+import json
 import os
 import subprocess
 import tempfile
+import threading
+import time
 import shutil
 from utilities import sanitize_filename
-from typing import Dict, Optional
-from PyPDF2 import PdfMerger
+import config
+import format_cache
+from build_manifest import BuildManifest
+from participant_reader import Participant
+from template_engine import CompiledTemplate, compile_template
+from progress import ProgressTracker
+from generation_job import GenerationJob, JobCancelled
+from tex_daemon import TexDaemon
+from pdf_overlay import get_overlay_template
+from workspace_pool import WorkspacePool, install_file
+from latex_failures import (FailureReport, LatexFailure, CATEGORY_UNKNOWN, classify_log, escape_participant,
+                            find_overfull, find_overfull_pages, read_log, should_retry_escaped,
+                            should_retry_long_template)
+from profiling import (Profiler, measure, STAGE_MERGE, STAGE_MOVE, STAGE_OVERLAY, STAGE_PDFLATEX, STAGE_RENDER,
+                       STAGE_TEMPDIR)
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-def generate_certificate(participant: Dict[str, Optional[str]], template: str, long_name_template: str,
-                         output_dir: str, min_chars_for_long_template: int) -> None:
-    """Generiert eine Urkunde für einen einzelnen Teilnehmer."""
-    altersklasse = sanitize_filename(participant['altersklasse']) or 'unbekannt'
-    gewichtsklasse = sanitize_filename(participant['gewichtsklasse']) or 'unbekannt'
+def get_output_path(participant: Participant, output_dir: str) -> str:
+    """Gibt das Zielverzeichnis output_dir/altersklasse/gewichtsklasse/ eines Teilnehmers zurück."""
+    altersklasse = sanitize_filename(participant.altersklasse) or 'unbekannt'
+    gewichtsklasse = sanitize_filename(participant.gewichtsklasse) or 'unbekannt'
+    return os.path.join(output_dir, altersklasse, gewichtsklasse)
 
-    # Ordnerstruktur erstellen: output_dir/altersklasse/gewichtsklasse/
-    output_path = os.path.join(output_dir, altersklasse, gewichtsklasse)
-    os.makedirs(output_path, exist_ok=True)
+def get_class_label(participant: Participant) -> str:
+    """Gibt Alters- und Gewichtsklasse als Anzeigetext zurück, z. B. 'MenU18 -23,0'."""
+    return f"{participant.altersklasse} {participant.gewichtsklasse}".strip()
+
+def get_certificate_path(participant: Participant, output_dir: str) -> str:
+    """Gibt den Pfad der PDF-Datei zurück, unter dem die Urkunde eines Teilnehmers gespeichert wird."""
+    pdf_filename = sanitize_filename(f"{participant.vorname}_{participant.name}.pdf")
+    return os.path.join(get_output_path(participant, output_dir), pdf_filename)
+
+class OutputLayout:
+    """
+    Verzeichnisstruktur output_dir/altersklasse/gewichtsklasse/ mit den Urkunden darin, aus den
+    Teilnehmerdaten berechnet statt durch Durchsuchen des Ausgabeordners. Jedes Verzeichnis wird pro
+    Lauf höchstens einmal angelegt; auf Netzlaufwerken spart das viele Zugriffe.
+
+    Für Master-PDFs sollten alle Teilnehmer der Veranstaltung eingetragen sein, nicht nur die gefilterten,
+    damit die Master-PDFs auch die Urkunden früherer Läufe enthalten.
+    """
+
+    def __init__(self, output_dir: str, participants: Iterable[Participant] = ()):
+        self.output_dir = output_dir
+        # Verzeichnisname der Altersklasse -> Verzeichnisname der Gewichtsklasse -> Pfade der Urkunden
+        self.classes: Dict[str, Dict[str, Set[str]]] = {}
+        self._created: Set[str] = set()
+        self._lock = threading.Lock()
+        for participant in participants:
+            self.add(participant)
+
+    def add(self, participant: Participant) -> str:
+        """Trägt die Urkunde eines Teilnehmers ein und gibt ihren Pfad zurück."""
+        pdf_path = get_certificate_path(participant, self.output_dir)
+        gewichtsklasse_path = os.path.dirname(pdf_path)
+        altersklasse = os.path.basename(os.path.dirname(gewichtsklasse_path))
+        with self._lock:
+            self.classes.setdefault(altersklasse, {}).setdefault(os.path.basename(gewichtsklasse_path), set()).add(pdf_path)
+        return pdf_path
+
+    def remove(self, pdf_path: str) -> None:
+        """Trägt eine Urkunde aus, z. B. wenn sie durch eine korrigierte Urkunde ersetzt wurde."""
+        gewichtsklasse_path = os.path.dirname(pdf_path)
+        altersklasse = os.path.basename(os.path.dirname(gewichtsklasse_path))
+        with self._lock:
+            self.classes.get(altersklasse, {}).get(os.path.basename(gewichtsklasse_path), set()).discard(pdf_path)
+
+    def ensure_directory(self, path: str) -> None:
+        """Legt ein Verzeichnis an, sofern es in diesem Lauf noch nicht angelegt wurde."""
+        with self._lock:
+            if path in self._created:
+                return
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._created.add(path)
+
+def ensure_output_path(participant: Participant, output_dir: str, layout: Optional[OutputLayout] = None) -> str:
+    """Legt das Zielverzeichnis eines Teilnehmers an, mit einem OutputLayout nur einmal pro Lauf."""
+    output_path = get_output_path(participant, output_dir)
+    if layout is None:
+        os.makedirs(output_path, exist_ok=True)
+    else:
+        layout.ensure_directory(output_path)
+    return output_path
+
+# Vorlagen werden als Text oder bereits zerlegt übergeben
+TemplateType = Union[str, CompiledTemplate]
+
+# Fester LaTeX-Vorspann, der für jede Urkunde identisch ist
+LATEX_PREAMBLE = ('\\documentclass{article}\n'
+                  '\\usepackage[a4paper, left=8cm]{geometry}\n'
+                  '\\usepackage[ngerman]{babel}\n'
+                  '\\usepackage[utf8]{inputenc}\n'
+                  '\\usepackage[T1]{fontenc}\n'
+                  '\\usepackage{graphicx}\n'
+                  '\\pagestyle{empty}\n')
+
+MASTER_FILENAME = 'master.pdf'
+MASTER_INDEX_FILENAME = '.master_index.json'
 
+# Kompiliermodi: eine pdflatex-Ausführung pro Teilnehmer, pro Gewichtsklasse oder für die ganze Veranstaltung
+BATCH_MODES = config.BATCH_MODES
+BATCH_MODE_SINGLE, BATCH_MODE_WEIGHT_CLASS, BATCH_MODE_EVENT = BATCH_MODES
+
+# Satz-Engines: LaTeX oder direktes Schreiben der PDF-Seite (pdf_overlay), bei Bedarf mit LaTeX als Rückfall
+ENGINES = config.ENGINES
+ENGINE_LATEX, ENGINE_OVERLAY = ENGINES
+
+def get_template_engine(template: CompiledTemplate, engine: str) -> str:
+    """Gibt die Satz-Engine einer Vorlage zurück; eine in der Vorlage festgelegte hat Vorrang vor der Vorgabe."""
+    return template.engine or engine
+
+def select_template(participant: Participant, template: TemplateType, long_name_template: TemplateType,
+                    min_chars_for_long_template: int) -> CompiledTemplate:
+    """Wählt abhängig von der Länge des Namens die passende (zerlegte) Vorlage aus."""
     # Gesamtlänge von Vorname und Name berechnen
-    full_name_length = len(participant['vorname'] + participant['name'])
+    full_name_length = len(participant.vorname) + len(participant.name)
 
     # Passendes Template auswählen
     if full_name_length >= min_chars_for_long_template:
-        selected_template = long_name_template
-    else:
-        selected_template = template
+        return compile_template(long_name_template)
+    return compile_template(template)
 
-    # LaTeX-Inhalt vorbereiten
-    latex_content = '\\documentclass{article}\n'
-    latex_content += '\\usepackage[a4paper, left=8cm]{geometry}\n'
-    latex_content += '\\usepackage[ngerman]{babel}\n'
-    latex_content += '\\usepackage[utf8]{inputenc}\n'
-    latex_content += '\\usepackage[T1]{fontenc}\n'
-    latex_content += '\\usepackage{graphicx}\n'
-    latex_content += '\\pagestyle{empty}\n'
-    latex_content += '\\begin{document}\n'
+def render_certificate(participant: Participant, selected_template: TemplateType) -> str:
+    """Ersetzt die Platzhalter der Vorlage durch die Daten des Teilnehmers."""
+    return compile_template(selected_template).render(participant)
+
+def get_participant_label(participant: Participant) -> str:
+    return f"{participant.vorname} {participant.name} ({get_class_label(participant)})"
 
-    # Platzhalter in der Vorlage ersetzen
-    urkunde = selected_template.replace('<<VORNAME>>', participant['vorname'])
-    urkunde = urkunde.replace('<<NAME>>', participant['name'])
-    urkunde = urkunde.replace('<<VEREIN>>', participant['verein'])
-    urkunde = urkunde.replace('<<PLATZ>>', f"{participant['platz']}" if participant['platz'] is not None else 'Teilnehmer')
-    urkunde = urkunde.replace('<<GEWICHTSKLASSE>>', participant['gewichtsklasse'])
-    urkunde = urkunde.replace('<<ALTERSKLASSE>>', participant['altersklasse'])
+# Jobname für Kompilierungen in einem eigenen temporären Verzeichnis
+DEFAULT_JOBNAME = 'urkunde'
 
-    latex_content += urkunde + '\n'
+@contextlib.contextmanager
+def scratch_directory(profiler: Optional[Profiler] = None,
+                      workspaces: Optional[WorkspacePool] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Arbeitsverzeichnis und Jobname für pdflatex. Mit einem WorkspacePool wird ein wiederverwendbares
+    Verzeichnis des Pools genutzt, sonst ein eigenes temporäres Verzeichnis angelegt und gelöscht.
+    Anlegen und Aufräumen zählen zur Stufe 'tempdir'.
+    """
+    if workspaces is not None:
+        with measure(profiler, STAGE_TEMPDIR):
+            workspace = workspaces.acquire()
+        jobname = workspace.next_jobname()
+        try:
+            yield workspace.path, jobname
+        finally:
+            with measure(profiler, STAGE_TEMPDIR):
+                workspace.clean(jobname)
+                workspaces.release(workspace)
+        return
+    with measure(profiler, STAGE_TEMPDIR):
+        tempdir = tempfile.mkdtemp()
+    try:
+        yield tempdir, DEFAULT_JOBNAME
+    finally:
+        with measure(profiler, STAGE_TEMPDIR):
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+def build_latex_document(bodies: List[str]) -> str:
+    """Setzt ein vollständiges LaTeX-Dokument zusammen, jede Urkunde auf einer eigenen Seite."""
+    latex_content = LATEX_PREAMBLE
+    latex_content += '\\begin{document}\n'
+    latex_content += '\n\\newpage\n'.join(bodies) + '\n'
     latex_content += '\\end{document}\n'
+    return latex_content
 
-    # Temporäres Verzeichnis für LaTeX-Dateien erstellen
-    with tempfile.TemporaryDirectory() as tempdir:
-        tex_filename = os.path.join(tempdir, 'urkunde.tex')
+def run_pdflatex(args: List[str], tempdir: str, env: Optional[Dict[str, str]] = None,
+                 job: Optional[GenerationJob] = None) -> None:
+    """Startet pdflatex; gehört der Aufruf zu einem GenerationJob, kann er über diesen abgebrochen werden."""
+    if job is not None:
+        job.run_process(args, cwd=tempdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    else:
+        subprocess.run(args, cwd=tempdir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
 
-        # LaTeX-Datei schreiben
-        with open(tex_filename, 'w', encoding='utf-8') as f:
-            f.write(latex_content)
+def compile_latex(latex_content: str, tempdir: str, job: Optional[GenerationJob] = None,
+                  profiler: Optional[Profiler] = None, jobname: str = DEFAULT_JOBNAME) -> Optional[str]:
+    """
+    Kompiliert ein LaTeX-Dokument im angegebenen Verzeichnis.
+    Ist der Format-Cache aktiv, wird gegen das vorkompilierte Format des Vorspanns kompiliert,
+    sodass die Pakete nicht bei jedem Lauf neu geladen werden.
+    Gibt den Pfad der erzeugten PDF-Datei zurück oder None, falls pdflatex fehlgeschlagen ist;
+    das Log liegt dann als <jobname>.log im Verzeichnis. Wird der Lauf abgebrochen, wird JobCancelled ausgelöst.
+    """
+    tex_filename = os.path.join(tempdir, jobname + '.tex')
+
+    # LaTeX-Datei schreiben
+    with measure(profiler, STAGE_TEMPDIR), open(tex_filename, 'w', encoding='utf-8') as f:
+        f.write(latex_content)
 
-        # LaTeX-Datei kompilieren
+    # LaTeX-Datei kompilieren, zuerst mit vorkompiliertem Format
+    format_name = format_cache.get_format(LATEX_PREAMBLE) if config.USE_FORMAT_CACHE else None
+    if format_name is not None:
         try:
-            subprocess.run(['pdflatex', '-interaction=nonstopmode', tex_filename],
-                           cwd=tempdir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            # Kompiliertes PDF in das Zielverzeichnis kopieren
-            pdf_source = os.path.join(tempdir, 'urkunde.pdf')
-            pdf_filename = sanitize_filename(f"{participant['vorname']}_{participant['name']}.pdf")
-            pdf_destination = os.path.join(output_path, pdf_filename)
-            shutil.move(pdf_source, pdf_destination)
-            print(f"Urkunde für {participant['vorname']} {participant['name']} wurde generiert und in '{pdf_destination}' gespeichert.")
+            with measure(profiler, STAGE_PDFLATEX):
+                run_pdflatex(['pdflatex', '-interaction=nonstopmode', f'-fmt={format_name}', tex_filename],
+                             tempdir, env=format_cache.get_environment(), job=job)
+            return os.path.join(tempdir, jobname + '.pdf')
         except subprocess.CalledProcessError:
-            print(f"Fehler beim Kompilieren der Urkunde für {participant['vorname']} {participant['name']}.")
-            # Optional: LaTeX-Logdatei ausgeben
-            log_file = os.path.join(tempdir, 'urkunde.log')
-            if os.path.exists(log_file):
-                with open(log_file, 'r', encoding='utf-8') as logf:
-                    print(logf.read())
+            # Erneuter Versuch ohne Format, falls das Format selbst die Ursache ist
+            pass
+
+    try:
+        with measure(profiler, STAGE_PDFLATEX):
+            run_pdflatex(['pdflatex', '-interaction=nonstopmode', tex_filename], tempdir, job=job)
+    except subprocess.CalledProcessError:
+        # Die Logdatei bleibt im Arbeitsverzeichnis und wird vom Aufrufer ausgewertet
+        return None
+    return os.path.join(tempdir, jobname + '.pdf')
+
+def compile_bodies(bodies: List[str], tempdir: str, job: Optional[GenerationJob] = None,
+                   daemon: Optional[TexDaemon] = None, profiler: Optional[Profiler] = None,
+                   jobname: str = DEFAULT_JOBNAME) -> Optional[str]:
+    """
+    Kompiliert Urkunden als Seiten eines Dokuments, bevorzugt mit einem vorgewärmten pdflatex-Prozess
+    des Daemons. Kann der Daemon nicht helfen, wird wie gewohnt mit compile_latex kompiliert.
+    """
+    if daemon is not None and not (job is not None and job.cancelled):
+        pdf_file = os.path.join(tempdir, jobname + '.pdf')
+        with measure(profiler, STAGE_PDFLATEX):
+            compiled = daemon.compile('\n\\newpage\n'.join(bodies), pdf_file, job)
+        if compiled:
+            return pdf_file
+    return compile_latex(build_latex_document(bodies), tempdir, job, profiler, jobname)
+
+def retry_certificate(participant: Participant, failure: LatexFailure, selected_template: CompiledTemplate,
+                      long_name_template: CompiledTemplate, tempdir: str, jobname: str, attempts: List[str],
+                      job: Optional[GenerationJob] = None, profiler: Optional[Profiler] = None) -> Optional[str]:
+    """
+    Kompiliert eine fehlgeschlagene Urkunde erneut, sofern die Fehlerklasse das sinnvoll macht: bei
+    ungültigen Zeichen mit maskierten Teilnehmerdaten, bei zu langem Text mit der Vorlage für lange Namen. Höchstens config.MAX_RETRIES Versuche, die in attempts vermerkt werden.
+    Gibt den Pfad der erzeugten PDF-Datei zurück oder None.
+    """
+    variants = []
+    if should_retry_escaped(failure):
+        variants.append(('maskiert', selected_template, escape_participant(participant)))
+    if should_retry_long_template(failure) and selected_template is not long_name_template:
+        variants.append(('lange vorlage', long_name_template, participant))
+
+    for number, (name, retry_template, retry_participant) in enumerate(variants[:config.MAX_RETRIES], start=1):
+        attempts.append(name)
+        with measure(profiler, STAGE_RENDER):
+            body = render_certificate(retry_participant, retry_template)
+        # Eigener Jobname, damit Dateien des fehlgeschlagenen Versuchs nicht stören
+        pdf_source = compile_latex(build_latex_document([body]), tempdir, job, profiler, f"{jobname}-{number}")
+        if pdf_source is not None:
+            return pdf_source
+    return None
+
+def generate_certificate(participant: Participant, template: TemplateType, long_name_template: TemplateType,
+                         output_dir: str, min_chars_for_long_template: int,
+                         job: Optional[GenerationJob] = None, daemon: Optional[TexDaemon] = None,
+                         profiler: Optional[Profiler] = None,
+                         workspaces: Optional[WorkspacePool] = None,
+                         layout: Optional[OutputLayout] = None,
+                         failures: Optional[FailureReport] = None) -> Optional[str]:
+    """
+    Generiert eine Urkunde für einen einzelnen Teilnehmer.
+    Schlägt pdflatex fehl, wird das Log ausgewertet und die Urkunde bei Bedarf erneut kompiliert
+    (siehe retry_certificate). Auch nach einem erfolgreichen Lauf wird das Log auf zu langen Text geprüft
+    und die Urkunde dann mit der Vorlage für lange Namen gesetzt; gelingt das nicht, bleibt die erste
+    Fassung erhalten. Fehlschläge und erst im erneuten Versuch erzeugte Urkunden werden im
+    FailureReport vermerkt.
+    Gibt den Pfad der erzeugten PDF-Datei zurück oder None, falls die Kompilierung fehlgeschlagen ist.
+    """
+    # Ordnerstruktur erstellen: output_dir/altersklasse/gewichtsklasse/
+    ensure_output_path(participant, output_dir, layout)
+
+    # LaTeX-Inhalt vorbereiten
+    with measure(profiler, STAGE_RENDER):
+        selected_template = select_template(participant, template, long_name_template, min_chars_for_long_template)
+        body = render_certificate(participant, selected_template)
+
+    long_name_template = compile_template(long_name_template)
+    pdf_destination = get_certificate_path(participant, output_dir)
+
+    # Arbeitsverzeichnis für LaTeX-Dateien bereitstellen
+    with scratch_directory(profiler, workspaces) as (tempdir, jobname):
+        pdf_source = compile_bodies([body], tempdir, job, daemon, profiler, jobname)
+        log_file = os.path.join(tempdir, jobname + '.log')
+        failure = None
+        if pdf_source is None:
+            failure = classify_log(read_log(log_file))
+        elif selected_template is not long_name_template:
+            # Zu langer Text ist für pdflatex nur eine Warnung
+            failure = find_overfull(read_log(log_file))
+        if failure is not None:
+            attempts = ['lange vorlage' if selected_template is long_name_template else 'standard']
+            retry_source = retry_certificate(participant, failure, selected_template, long_name_template,
+                                             tempdir, jobname, attempts, job, profiler)
+            if failures is not None:
+                failures.record(participant, pdf_destination, failure, attempts, resolved=retry_source is not None)
+            if retry_source is not None:
+                print(f"Urkunde für {participant.vorname} {participant.name} im erneuten Versuch erzeugt "
+                      f"({failure.category}): {failure.message}")
+            elif pdf_source is not None:
+                print(f"Urkunde für {participant.vorname} {participant.name} mit überstehendem Text gespeichert: "
+                      f"{failure.message}")
+            pdf_source = retry_source or pdf_source
+        if pdf_source is None:
+            print(f"Fehler beim Kompilieren der Urkunde für {participant.vorname} {participant.name} "
+                  f"({failure.category}): {failure.message}")
+            return None
+
+        # Kompiliertes PDF atomar in das Zielverzeichnis verschieben
+        with measure(profiler, STAGE_MOVE):
+            install_file(pdf_source, pdf_destination)
+        print(f"Urkunde für {participant.vorname} {participant.name} wurde generiert und in '{pdf_destination}' gespeichert.")
+        return pdf_destination
+
+def generate_certificate_overlay(participant: Participant, template: TemplateType, long_name_template: TemplateType,
+                                 output_dir: str, min_chars_for_long_template: int,
+                                 profiler: Optional[Profiler] = None,
+                                 layout: Optional[OutputLayout] = None) -> Optional[str]:
+    """
+    Schreibt die Urkunde ohne LaTeX-Lauf direkt als PDF (siehe pdf_overlay.py).
+    Gibt None zurück, wenn die Vorlage oder die Teilnehmerdaten mit LaTeX gesetzt werden müssen.
+    """
+    with measure(profiler, STAGE_OVERLAY):
+        selected_template = select_template(participant, template, long_name_template, min_chars_for_long_template)
+        overlay = get_overlay_template(selected_template.text, LATEX_PREAMBLE)
+        pdf_content = overlay.render(participant) if overlay is not None else None
+    if pdf_content is None:
+        return None
+
+    with measure(profiler, STAGE_MOVE):
+        ensure_output_path(participant, output_dir, layout)
+        pdf_destination = get_certificate_path(participant, output_dir)
+        # Über eine temporäre Datei schreiben, damit nie eine halbe Urkunde im Ausgabeverzeichnis liegt
+        temp_destination = pdf_destination + '.tmp'
+        with open(temp_destination, 'wb') as f:
+            f.write(pdf_content)
+        os.replace(temp_destination, pdf_destination)
+    print(f"Urkunde für {participant.vorname} {participant.name} wurde generiert und in '{pdf_destination}' gespeichert.")
+    return pdf_destination
+
+def generate_certificate_batch(participants: List[Participant], template: TemplateType, long_name_template: TemplateType,
+                               output_dir: str, min_chars_for_long_template: int,
+                               job: Optional[GenerationJob] = None,
+                               daemon: Optional[TexDaemon] = None,
+                               profiler: Optional[Profiler] = None,
+                               workspaces: Optional[WorkspacePool] = None,
+                               layout: Optional[OutputLayout] = None,
+                               failures: Optional[FailureReport] = None) -> List[Optional[str]]:
+    """
+    Generiert die Urkunden mehrerer Teilnehmer mit einer einzigen pdflatex-Ausführung.
+    Alle Urkunden werden als Seiten eines Dokuments kompiliert und anschließend seitenweise
+    in die einzelnen PDF-Dateien aufgeteilt. Urkunden, deren Seite laut Log überstehenden Text enthält,
+    werden einzeln mit generate_certificate erzeugt. Gibt die PDF-Pfade in der Reihenfolge der Teilnehmer zurück.
+    """
+    # PyPDF2 erst bei Bedarf laden, einzelne Urkunden kommen ohne aus
+    from PyPDF2 import PdfReader, PdfWriter
+
+    bodies = []
+    uses_long_template = []
+    compiled_long_template = compile_template(long_name_template)
+    with measure(profiler, STAGE_RENDER):
+        for participant in participants:
+            ensure_output_path(participant, output_dir, layout)
+            selected_template = select_template(participant, template, long_name_template, min_chars_for_long_template)
+            uses_long_template.append(selected_template is compiled_long_template)
+            bodies.append(render_certificate(participant, selected_template))
+
+    with scratch_directory(profiler, workspaces) as (tempdir, jobname):
+        pdf_source = compile_bodies(bodies, tempdir, job, daemon, profiler, jobname)
+        if pdf_source is None:
+            print(f"Fehler beim gemeinsamen Kompilieren von {len(participants)} Urkunden, kompiliere einzeln.")
+            return [generate_certificate(participant, template, long_name_template, output_dir,
+                                         min_chars_for_long_template, job, daemon, profiler, workspaces, layout,
+                                         failures)
+                    for participant in participants]
 
-def generate_master_certificates(output_dir: str) -> None:
+        reader = PdfReader(pdf_source)
+        if len(reader.pages) != len(participants):
+            # Mindestens eine Urkunde ist länger als eine Seite, die Zuordnung per Seite ist dann nicht möglich
+            print(f"Gemeinsames Dokument hat {len(reader.pages)} statt {len(participants)} Seiten, kompiliere einzeln.")
+            return [generate_certificate(participant, template, long_name_template, output_dir,
+                                         min_chars_for_long_template, job, daemon, profiler, workspaces, layout,
+                                         failures)
+                    for participant in participants]
+
+        overfull_pages = find_overfull_pages(read_log(os.path.join(tempdir, jobname + '.log')))
+        results = []
+        for number, (participant, page) in enumerate(zip(participants, reader.pages)):
+            if number in overfull_pages and not uses_long_template[number]:
+                results.append(generate_certificate(participant, template, long_name_template, output_dir,
+                                                    min_chars_for_long_template, job, daemon, profiler, workspaces,
+                                                    layout, failures))
+                continue
+            pdf_destination = get_certificate_path(participant, output_dir)
+            with measure(profiler, STAGE_MOVE):
+                writer = PdfWriter()
+                writer.add_page(page)
+                temp_destination = pdf_destination + '.tmp'
+                with open(temp_destination, 'wb') as f:
+                    writer.write(f)
+                os.replace(temp_destination, pdf_destination)
+            print(f"Urkunde für {participant.vorname} {participant.name} wurde generiert und in '{pdf_destination}' gespeichert.")
+            results.append(pdf_destination)
+        return results
+
+def generate_certificates(participants: List[Participant], template: TemplateType, long_name_template: TemplateType,
+                          output_dir: str, min_chars_for_long_template: int, workers: Optional[int] = None,
+                          on_error: Optional[Callable[[Participant, str], None]] = None,
+                          batch_mode: str = BATCH_MODE_SINGLE, batch_size: Optional[int] = None,
+                          manifest: Optional[BuildManifest] = None,
+                          on_result: Optional[Callable[[Participant, Optional[str]], None]] = None,
+                          on_progress: Optional[Callable[[Dict], None]] = None,
+                          job: Optional[GenerationJob] = None,
+                          daemon: Optional[TexDaemon] = None,
+                          engine: str = ENGINE_LATEX,
+                          profiler: Optional[Profiler] = None,
+                          workspaces: Optional[WorkspacePool] = None,
+                          layout: Optional[OutputLayout] = None,
+                          failures: Optional[FailureReport] = None,
+                          incremental: bool = True) -> List[Optional[str]]:
+    """
+    Generiert die Urkunden mehrerer Teilnehmer parallel mit einem Pool von Worker-Threads.
+    Die Threads warten nur auf die pdflatex-Prozesse, daher reicht ein Thread-Pool aus.
+
+    Mit batch_mode 'gewichtsklasse' oder 'veranstaltung' werden alle Urkunden einer Gewichtsklasse
+    bzw. der ganzen Veranstaltung mit einer pdflatex-Ausführung kompiliert, höchstens batch_size pro Lauf.
+
+    Mit einem BuildManifest werden Urkunden übersprungen, deren Eingaben sich seit dem letzten Lauf
+    nicht geändert haben. Das Manifest wird aktualisiert, aber nicht gespeichert. Mit incremental=False
+    wird nichts übersprungen, die erzeugten Urkunden werden aber trotzdem eingetragen, damit ein späterer
+    inkrementeller Lauf keine veralteten Einträge für überschriebene Dateien vorfindet.
+
+    Gibt eine Liste der erzeugten PDF-Pfade in der Reihenfolge der Teilnehmerliste zurück
+    (None für fehlgeschlagene Urkunden). Fehler werden pro Teilnehmer über on_error gemeldet,
+    on_result wird nach jeder kompilierten Urkunde mit deren Pfad (oder None) aufgerufen,
+    on_progress mit Fortschrittsereignissen (siehe progress.ProgressTracker).
+
+    Mit einem GenerationJob kann der Lauf abgebrochen werden; noch nicht begonnene Urkunden werden
+    dann übersprungen und bleiben None. Bereits im Journal des Jobs vermerkte Urkunden werden nicht
+    erneut erzeugt.
+
+    Mit einem TexDaemon werden die Urkunden mit vorgewärmten pdflatex-Prozessen kompiliert.
+    Mit engine 'overlay' werden die Felder auf einen einmal gesetzten Hintergrund gestempelt statt jede
+    Urkunde mit LaTeX zu kompilieren; Vorlagen und Teilnehmer, die die Overlay-Engine nicht darstellen kann,
+    werden weiterhin mit LaTeX kompiliert. engine ist die Vorgabe, eine Vorlage kann ihre eigene festlegen
+    (siehe template_engine.ENGINE_PATTERN).
+
+    Mit einem Profiler werden die Dauer der einzelnen Stufen und die Dauer pro Teilnehmer gemessen;
+    bei Sammelkompilierung erhält jeder Teilnehmer den gleichen Anteil an der gemeinsamen Aufgabe.
+
+    pdflatex arbeitet in wiederverwendeten Arbeitsverzeichnissen (ein Verzeichnis pro Worker, siehe
+    workspace_pool.WorkspacePool). Ohne workspaces wird ein Pool für diesen Lauf angelegt und am Ende gelöscht.
+
+    Die Zielverzeichnisse werden vorab einmal pro Alters- und Gewichtsklasse angelegt und die Urkunden im
+    OutputLayout eingetragen, das anschließend an generate_master_certificates übergeben werden kann.
+
+    Eine fehlerhafte Urkunde bricht den Lauf nicht ab: pdflatex-Fehler werden klassifiziert, wo sinnvoll
+    erneut versucht und im FailureReport failures vermerkt; on_error erhält Fehlerklasse und Meldung.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if workers is None or workers < 1:
+        workers = os.cpu_count() or 1
+    if batch_mode not in BATCH_MODES:
+        raise ValueError(f"Unbekannter Kompiliermodus '{batch_mode}'.")
+    if engine not in ENGINES:
+        raise ValueError(f"Unbekannte Satz-Engine '{engine}'.")
+
+    # Vorlagen einmal pro Lauf zerlegen statt für jeden Teilnehmer
+    template = compile_template(template)
+    long_name_template = compile_template(long_name_template)
+    for selected_template in (template, long_name_template):
+        if get_template_engine(selected_template, engine) == ENGINE_OVERLAY:
+            # Vorlagen vorab zerlegen, damit nicht unterstützte Vorlagen nur einmal gemeldet werden
+            get_overlay_template(selected_template.text, LATEX_PREAMBLE)
+
+    # Teilnehmer mit identischem Zielpfad würden sich gegenseitig überschreiben. Wie bei sequentieller
+    # Ausführung gewinnt der letzte Eintrag der Liste, nur dieser wird kompiliert.
+    last_index: Dict[str, int] = {}
+    for index, participant in enumerate(participants):
+        last_index[get_certificate_path(participant, output_dir)] = index
+    unique_indices = sorted(last_index.values())
+
+    results: List[Optional[str]] = [None] * len(participants)
+    if failures is None:
+        failures = FailureReport()
+
+    # Zielverzeichnisse einmal vorab anlegen statt pro Teilnehmer
+    if layout is None:
+        layout = OutputLayout(output_dir)
+    for index in unique_indices:
+        layout.add(participants[index])
+        ensure_output_path(participants[index], output_dir, layout)
+
+    # Unveränderte Urkunden überspringen
+    digests: Dict[int, str] = {}
+    if manifest is not None:
+        pending_indices = []
+        for index in unique_indices:
+            participant = participants[index]
+            selected_template = select_template(participant, template, long_name_template, min_chars_for_long_template)
+            selected_engine = get_template_engine(selected_template, engine)
+            digests[index] = BuildManifest.compute_hash(participant, selected_template.text, LATEX_PREAMBLE,
+                                                        min_chars_for_long_template,
+                                                        selected_engine if selected_engine != ENGINE_LATEX else None)
+            pdf_path = get_certificate_path(participant, output_dir)
+            if incremental and manifest.is_up_to_date(pdf_path, digests[index]):
+                results[index] = pdf_path
+            else:
+                pending_indices.append(index)
+        if incremental:
+            print(f"{len(unique_indices) - len(pending_indices)} Urkunden sind aktuell und werden übersprungen.")
+        unique_indices = pending_indices
+
+    # Beim Fortsetzen eines abgebrochenen Laufs bereits fertige Urkunden überspringen
+    if job is not None and job.completed:
+        pending_indices = []
+        for index in unique_indices:
+            pdf_path = get_certificate_path(participants[index], output_dir)
+            if job.is_completed(pdf_path):
+                results[index] = pdf_path
+                if manifest is not None:
+                    manifest.update(pdf_path, digests[index])
+            else:
+                pending_indices.append(index)
+        print(f"{len(unique_indices) - len(pending_indices)} Urkunden wurden bereits im abgebrochenen Lauf erzeugt.")
+        unique_indices = pending_indices
+
+    # Aufteilen in Aufgaben für den Pool
+    if batch_mode == BATCH_MODE_SINGLE:
+        tasks = [[index] for index in unique_indices]
+    else:
+        groups: Dict[str, List[int]] = {}
+        for index in unique_indices:
+            key = get_output_path(participants[index], output_dir) if batch_mode == BATCH_MODE_WEIGHT_CLASS else ''
+            groups.setdefault(key, []).append(index)
+        size = batch_size if batch_size and batch_size > 0 else len(participants)
+        tasks = [indices[i:i + size] for indices in groups.values() for i in range(0, len(indices), size)]
+
+    tracker = None
+    if on_progress is not None:
+        tracker = ProgressTracker(len(unique_indices), on_progress,
+                                  skipped=len(participants) - len(unique_indices))
+        on_progress(tracker.snapshot())
+
+    def report_error(participant: Participant, message: str) -> None:
+        if on_error is not None:
+            on_error(participant, message)
+
+    def compile_task(task_participants: List[Participant]) -> List[Optional[str]]:
+        task_results: List[Optional[str]] = [None] * len(task_participants)
+        pending = list(range(len(task_participants)))
+        for position in pending:
+            selected_template = select_template(task_participants[position], template, long_name_template,
+                                                min_chars_for_long_template)
+            if get_template_engine(selected_template, engine) == ENGINE_OVERLAY:
+                task_results[position] = generate_certificate_overlay(task_participants[position], template,
+                                                                      long_name_template, output_dir,
+                                                                      min_chars_for_long_template, profiler,
+                                                                      layout)
+        pending = [position for position in pending if task_results[position] is None]
+
+        # Übrige Urkunden mit LaTeX kompilieren
+        if len(pending) == 1:
+            task_results[pending[0]] = generate_certificate(task_participants[pending[0]], template, long_name_template,
+                                                            output_dir, min_chars_for_long_template, job, daemon,
+                                                            profiler, workspaces, layout, failures)
+        elif pending:
+            latex_results = generate_certificate_batch([task_participants[position] for position in pending],
+                                                       template, long_name_template, output_dir,
+                                                       min_chars_for_long_template, job, daemon, profiler,
+                                                       workspaces, layout, failures)
+            for position, result in zip(pending, latex_results):
+                task_results[position] = result
+        return task_results
+
+    def run_task(indices: List[int]) -> None:
+        if job is not None and job.cancelled:
+            return
+        task_participants = [participants[index] for index in indices]
+        start = time.perf_counter()
+        try:
+            task_results = compile_task(task_participants)
+        except JobCancelled:
+            return
+        except Exception as e:
+            for participant in task_participants:
+                failures.record(participant, get_certificate_path(participant, output_dir),
+                                LatexFailure(CATEGORY_UNKNOWN, f"{type(e).__name__}: {e}"), [], resolved=False)
+                report_error(participant, f"Fehler beim Generieren der Urkunde für {participant.vorname} {participant.name}:\n{e}")
+                if on_result is not None:
+                    on_result(participant, None)
+            if tracker is not None:
+                tracker.advance(get_class_label(task_participants[-1]), ok=False, count=len(task_participants))
+            return
+        finally:
+            if profiler is not None:
+                share = (time.perf_counter() - start) / len(task_participants)
+                for participant in task_participants:
+                    profiler.record_participant(get_participant_label(participant), share)
+        for index, participant, result in zip(indices, task_participants, task_results):
+            results[index] = result
+            if result is not None and manifest is not None:
+                manifest.update(result, digests[index])
+            if result is not None and job is not None:
+                job.mark_completed(result)
+            if result is None:
+                entry = failures.get(get_certificate_path(participant, output_dir))
+                details = f" ({entry['kategorie']}): {entry['meldung']}" if entry is not None else "."
+                report_error(participant, f"Fehler beim Kompilieren der Urkunde für {participant.vorname} {participant.name}{details}")
+            if on_result is not None:
+                on_result(participant, result)
+            if tracker is not None:
+                tracker.advance(get_class_label(participant), ok=result is not None)
+
+    owns_workspaces = workspaces is None
+    if owns_workspaces:
+        workspaces = WorkspacePool()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(run_task, indices) for indices in tasks]:
+                future.result()
+    finally:
+        if owns_workspaces:
+            workspaces.close()
+        # Nach einem Abbruch oder Fehler fehlt sonst das letzte Ereignis, die Anzeige bliebe stehen
+        if tracker is not None:
+            tracker.flush()
+
+    # Doppelte Einträge erhalten den Pfad der zuletzt kompilierten Urkunde
+    for index, participant in enumerate(participants):
+        results[index] = results[last_index[get_certificate_path(participant, output_dir)]]
+
+    return results
+
+def get_file_signature(pdf_files: List[str], output_dir: str, existing: Optional[List[str]] = None) -> List[List]:
+    """
+    Gibt für jede Datei relativen Pfad, Änderungszeit und Größe zurück, um Änderungen zu erkennen.
+    Ist existing angegeben, werden fehlende Dateien übersprungen und die vorhandenen dort angehängt.
+    """
+    signature = []
+    for pdf in pdf_files:
+        try:
+            stat = os.stat(pdf)
+        except FileNotFoundError:
+            if existing is None:
+                raise
+            continue
+        if existing is not None:
+            existing.append(pdf)
+        signature.append([os.path.relpath(pdf, output_dir).replace(os.sep, '/'), stat.st_mtime_ns, stat.st_size])
+    return signature
+
+def generate_master_certificates(output_dir: str, generated_files: Optional[Iterable[str]] = None,
+                                 on_master: Optional[Callable[[str, Dict], None]] = None,
+                                 profiler: Optional[Profiler] = None,
+                                 layout: Optional[OutputLayout] = None) -> List[str]:
     """
     Generiert eine Master-PDF-Datei für jede Gewichtsklasse und eine Master-PDF für jede Altersklasse,
-    die alle Master-PDFs der jeweiligen Gewichtsklassen enthält.
+    die alle Urkunden der jeweiligen Gewichtsklassen enthält.
+
+    Jede Urkunde wird dabei nur einmal gelesen und seitenweise direkt in beide Master-PDFs geschrieben,
+    sodass der Speicherbedarf nicht mit der Seitenzahl wächst (siehe pdf_stream.StreamingPdfWriter).
+    Eine Master-PDF wird nur neu erstellt, wenn sich ihre Urkunden (Pfad, Änderungszeit, Größe)
+    seit der letzten Erstellung geändert haben. Ist generated_files angegeben (neu erzeugte oder
+    gelöschte Urkunden), werden nur die Altersklassen dieser Dateien betrachtet.
+
+    Gleiche Schriften, Bilder und Ressourcen der Urkunden werden in jeder Master-PDF nur einmal
+    gespeichert. on_master wird für jede erstellte Master-PDF mit ihrem Pfad und einer Statistik
+    (pages, size, shared_objects, bytes_saved) aufgerufen. Mit einem Profiler wird die Dauer pro
+    Altersklasse als Stufe 'master' gemessen.
+
+    Mit einem OutputLayout werden die Urkunden den eingetragenen Teilnehmern entnommen, statt den
+    Ausgabeordner zu durchsuchen; Altersklassen, die nicht im Layout stehen, werden weiterhin durchsucht.
+    Gewichtsklassen, die im Index der Master-PDFs oder als Verzeichnis, aber nicht mehr im Layout stehen,
+    haben keine Urkunden mehr; ihre Master-PDFs werden entfernt.
+    Gibt die Pfade der neu erstellten Master-PDFs zurück.
     """
-    # Traversieren des Ausgabeordners
-    for altersklasse in os.listdir(output_dir):
+    # PyPDF2 erst beim Zusammenführen laden, das verkürzt den Programmstart
+    from PyPDF2 import PdfReader
+    from pdf_stream import StreamingPdfWriter
+
+    index_path = os.path.join(output_dir, MASTER_INDEX_FILENAME)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            master_index = json.load(f)
+    except (OSError, ValueError):
+        master_index = {}
+
+    # Verzeichnisname der Altersklasse -> Gewichtsklassen mit einer früher erstellten Master-PDF
+    indexed_classes: Dict[str, Set[str]] = {}
+    for key in master_index:
+        parts = key.split('/')
+        if len(parts) == 3 and parts[2] == MASTER_FILENAME:
+            indexed_classes.setdefault(parts[0], set()).add(parts[1])
+
+    if generated_files is None:
+        # Altersklassen aus dem Layout und dem Index, sonst Traversieren des Ausgabeordners
+        altersklassen = sorted(set(layout.classes) | set(indexed_classes)) if layout is not None \
+            else os.listdir(output_dir)
+    else:
+        altersklassen = sorted({os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(pdf))))
+                                for pdf in generated_files})
+
+    def is_current(master_pdf_path: str, signature: List[List]) -> bool:
+        key = os.path.relpath(master_pdf_path, output_dir).replace(os.sep, '/')
+        return os.path.exists(master_pdf_path) and master_index.get(key) == signature
+
+    def remove_master(master_pdf_path: str) -> None:
+        master_index.pop(os.path.relpath(master_pdf_path, output_dir).replace(os.sep, '/'), None)
+        if os.path.exists(master_pdf_path):
+            os.remove(master_pdf_path)
+
+    written = []
+    total_bytes_saved = 0
+    for altersklasse in altersklassen:
         altersklasse_path = os.path.join(output_dir, altersklasse)
-        if not os.path.isdir(altersklasse_path):
+        classes = layout.classes.get(altersklasse) if layout is not None else None
+        if classes is None and not os.path.isdir(altersklasse_path):
             continue
 
-        gewichtsklassen_masters = []  # Liste zur Speicherung der Master-PDFs der Gewichtsklassen
-
-        for gewichtsklasse in os.listdir(altersklasse_path):
+        # Urkunden je Gewichtsklasse sammeln, sortiert nach Pfad der Master-PDF und Dateiname
+        gewichtsklassen: Dict[str, List[str]] = {}
+        gewichtsklasse_signatures: Dict[str, List[List]] = {}
+        if classes is not None:
+            # Auch Gewichtsklassen, deren letzte Urkunde entfernt wurde, damit ihre Master-PDF gelöscht wird
+            names = set(classes) | indexed_classes.get(altersklasse, set())
+            if os.path.isdir(altersklasse_path):
+                with os.scandir(altersklasse_path) as entries:
+                    names.update(entry.name for entry in entries if entry.is_dir())
+        else:
+            names = os.listdir(altersklasse_path)
+        for gewichtsklasse in sorted(names, key=lambda gk: os.path.join(gk, MASTER_FILENAME)):
             gewichtsklasse_path = os.path.join(altersklasse_path, gewichtsklasse)
-            if not os.path.isdir(gewichtsklasse_path):
-                continue
+            pdf_files: List[str] = []
+            if classes is not None:
+                # Urkunden der eingetragenen Teilnehmer, die bereits erzeugt wurden
+                signature = get_file_signature(sorted(classes.get(gewichtsklasse, ())), output_dir, existing=pdf_files)
+            else:
+                if not os.path.isdir(gewichtsklasse_path):
+                    continue
 
-            # Liste aller PDF-Dateien in der Gewichtsklasse, außer 'master.pdf'
-            pdf_files = [
-                os.path.join(gewichtsklasse_path, f)
-                for f in os.listdir(gewichtsklasse_path)
-                if f.lower().endswith('.pdf') and f != 'master.pdf'
-            ]
-            pdf_files_sorted = sorted(pdf_files)  # Optional: sortieren nach Name
+                # Liste aller PDF-Dateien in der Gewichtsklasse, außer 'master.pdf'
+                pdf_files = sorted(
+                    os.path.join(gewichtsklasse_path, f)
+                    for f in os.listdir(gewichtsklasse_path)
+                    if f.lower().endswith('.pdf') and f != MASTER_FILENAME
+                )
+                signature = get_file_signature(pdf_files, output_dir)
+            if pdf_files:
+                gewichtsklassen[gewichtsklasse] = pdf_files
+                gewichtsklasse_signatures[gewichtsklasse] = signature
+            else:
+                # Alle Urkunden der Gewichtsklasse wurden entfernt, die Master-PDF ist veraltet
+                remove_master(os.path.join(gewichtsklasse_path, MASTER_FILENAME))
 
-            if not pdf_files_sorted:
-                continue
+        # Master-PDFs bestimmen, deren Urkunden sich geändert haben
+        signatures: Dict[str, List[List]] = {}
+        members: Dict[str, List[str]] = {}
+        for gewichtsklasse, pdf_files in gewichtsklassen.items():
+            master_pdf_path = os.path.join(altersklasse_path, gewichtsklasse, MASTER_FILENAME)
+            signature = gewichtsklasse_signatures[gewichtsklasse]
+            if not is_current(master_pdf_path, signature):
+                signatures[master_pdf_path] = signature
+                members[master_pdf_path] = pdf_files
+
+        file_name = "master_altersklasse" +  altersklasse + ".pdf"
+        altersklasse_master_pdf = os.path.join(altersklasse_path,file_name)
+        altersklasse_files = [pdf for pdf_files in gewichtsklassen.values() for pdf in pdf_files]
+        if not altersklasse_files:
+            remove_master(altersklasse_master_pdf)
+        else:
+            # Die Signatur der Altersklasse setzt sich aus denen der Gewichtsklassen zusammen
+            signature = [entry for gewichtsklasse in gewichtsklassen for entry in gewichtsklasse_signatures[gewichtsklasse]]
+            if not is_current(altersklasse_master_pdf, signature):
+                signatures[altersklasse_master_pdf] = signature
+                members[altersklasse_master_pdf] = altersklasse_files
+
+        if not members:
+            continue
+
+        # Jede benötigte Urkunde einmal lesen und an alle betroffenen Master-PDFs anhängen
+        merge_start = time.perf_counter()
+        writers = {master_pdf_path: StreamingPdfWriter(master_pdf_path) for master_pdf_path in members}
+        member_sets = {master_pdf_path: set(pdf_files) for master_pdf_path, pdf_files in members.items()}
+        try:
+            for pdf in altersklasse_files:
+                targets = [master_pdf_path for master_pdf_path, pdf_set in member_sets.items() if pdf in pdf_set]
+                if not targets:
+                    continue
+                reader = PdfReader(pdf)
+                for master_pdf_path in targets:
+                    writers[master_pdf_path].append(reader)
+        except Exception:
+            for writer in writers.values():
+                writer.discard()
+            raise
+
+        # Master-PDFs abschließen
+        for master_pdf_path, writer in writers.items():
+            writer.close()
+            master_index[os.path.relpath(master_pdf_path, output_dir).replace(os.sep, '/')] = signatures[master_pdf_path]
+            written.append(master_pdf_path)
+            total_bytes_saved += writer.bytes_saved
+            savings = f" ({writer.shared_objects} gemeinsame Objekte, {writer.bytes_saved / 1024:.0f} KB gespart)" \
+                if writer.shared_objects else ""
+            if master_pdf_path == altersklasse_master_pdf:
+                print(f"Master-PDF für Altersklasse {altersklasse} erstellt: {altersklasse_master_pdf}{savings}")
+            else:
+                gewichtsklasse = os.path.basename(os.path.dirname(master_pdf_path))
+                print(f"Master-PDF für {altersklasse} - {gewichtsklasse} erstellt: {master_pdf_path}{savings}")
+            if on_master is not None:
+                on_master(master_pdf_path, {'pages': writer.page_count, 'size': os.path.getsize(master_pdf_path),
+                                            'shared_objects': writer.shared_objects,
+                                            'bytes_saved': writer.bytes_saved})
+        if profiler is not None:
+            profiler.record(STAGE_MERGE, merge_start, time.perf_counter(), altersklasse)
 
-            # Erstellen einer Master-PDF-Datei für die Gewichtsklasse
-            master_pdf_path = os.path.join(gewichtsklasse_path, 'master.pdf')
-            merger = PdfMerger()
-            for pdf in pdf_files_sorted:
-                merger.append(pdf)
-            merger.write(master_pdf_path)
-            merger.close()
-            print(f"Master-PDF für {altersklasse} - {gewichtsklasse} erstellt: {master_pdf_path}")
-
-            # Hinzufügen der Master-PDF der Gewichtsklasse zur Liste für die Altersklasse
-            gewichtsklassen_masters.append(master_pdf_path)
-
-        # Erstellen einer Master-PDF für die Altersklasse, falls es Master-PDFs der Gewichtsklassen gibt
-        if gewichtsklassen_masters:
-            file_name = "master_altersklasse" +  altersklasse + ".pdf"
-            altersklasse_master_pdf = os.path.join(altersklasse_path,file_name)
-            merger_altersklasse = PdfMerger()
-            for master_pdf in sorted(gewichtsklassen_masters):  # Optional: sortieren nach Pfad
-                merger_altersklasse.append(master_pdf)
-            merger_altersklasse.write(altersklasse_master_pdf)
-            merger_altersklasse.close()
-            print(f"Master-PDF für Altersklasse {altersklasse} erstellt: {altersklasse_master_pdf}")
\ No newline at end of file
+    # Index der Master-PDFs atomar speichern
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(master_index, f, ensure_ascii=False)
+    os.replace(temp_path, index_path)
+    if total_bytes_saved:
+        print(f"Durch gemeinsame Schriften und Ressourcen {total_bytes_saved / 1024:.0f} KB in den Master-PDFs gespart.")
+    return written
@@ -0,0 +1,368 @@
+# cli.py
+#
+# Kommandozeilen-Einstieg ohne grafische Oberfläche, z. B. für den Druckserver:
+#   python -m cli --json_file competitors.json --workers 8 --incremental --json-progress
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, TextIO
+import config
+from participant_reader import iter_participants, filter_participants
+from certificate_generator import (generate_certificates, generate_master_certificates, get_certificate_path,
+                                   BATCH_MODES, LATEX_PREAMBLE, OutputLayout)
+from build_manifest import BuildManifest
+from template_engine import compile_template
+from progress import format_progress
+from generation_job import GenerationJob
+from tex_daemon import TexDaemon
+from print_spool import PrintSpool, sort_for_ceremony
+from profiling import Profiler, measure, STAGE_PARSE
+from results_watcher import ResultsWatcher
+from latex_failures import FailureReport, FAILURE_REPORT_FILENAME
+
+class ProgressPrinter:
+    """Gibt Meldungen als Text oder als JSON-Zeilen (ein Objekt pro Zeile) aus."""
+
+    def __init__(self, stream: TextIO, json_lines: bool):
+        self.stream = stream
+        self.json_lines = json_lines
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, message: Optional[str] = None, **data) -> None:
+        with self._lock:
+            if self.json_lines:
+                record: Dict = {'event': event, 'time': time.time()}
+                if message is not None:
+                    record['message'] = message
+                record.update(data)
+                self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            elif message is not None:
+                self.stream.write(message + '\n')
+            self.stream.flush()
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Generiere Urkunden für Teilnehmer ohne grafische Oberfläche.')
+    parser.add_argument('--json_file', help='Eingabedatei im JSON- oder JSONL-Format mit Teilnehmerdaten', default=config.DEFAULT_JSON_FILE)
+    parser.add_argument('--template', help='LaTeX-Vorlagendatei', default=config.DEFAULT_TEMPLATE_FILE)
+    parser.add_argument('--long_name_template', help='LaTeX-Vorlagendatei für lange Namen', default=config.DEFAULT_LONG_TEMPLATE_FILE)
+    parser.add_argument('--output_dir', help='Ausgabeverzeichnis für die Urkunden', default=config.DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--min-chars-for-long-template', type=int, default=config.DEFAULT_MIN_CHARS_FOR_LONG_TEMPLATE,
+                        help='Mindestanzahl an Zeichen für die Verwendung des alternativen Templates')
+    parser.add_argument('--vorname', help='Vorname des Teilnehmers', default=None)
+    parser.add_argument('--name', help='Nachname des Teilnehmers', default=None)
+    parser.add_argument('--altersklasse', help='Altersklasse zum Filtern', default=None)
+    parser.add_argument('--gewichtsklasse', help='Gewichtsklasse zum Filtern', default=None)
+    parser.add_argument('--workers', type=int, default=config.DEFAULT_WORKERS, help='Anzahl paralleler pdflatex-Prozesse')
+    parser.add_argument('--batch-mode', choices=BATCH_MODES, default=config.DEFAULT_BATCH_MODE,
+                        help='Eine pdflatex-Ausführung pro Teilnehmer, pro Gewichtsklasse oder für die ganze Veranstaltung')
+    parser.add_argument('--engine', choices=config.ENGINES, default=config.DEFAULT_ENGINE,
+                        help='Satz-Engine: LaTeX oder Stempeln der Felder auf einen einmal gesetzten Hintergrund (overlay); '
+                             'Vorgabe für Vorlagen ohne eigene Zeile "%% Satz-Engine: ..."')
+    parser.add_argument('--batch-size', type=int, default=config.DEFAULT_BATCH_SIZE,
+                        help='Höchstens so viele Urkunden pro pdflatex-Ausführung im Sammelmodus')
+    parser.add_argument('--incremental', action='store_true', default=config.DEFAULT_INCREMENTAL,
+                        help='Nur Urkunden mit geänderten Daten neu erzeugen')
+    parser.add_argument('--tex-daemon', action='store_true', default=config.USE_TEX_DAEMON,
+                        help='Mit vorgewärmten pdflatex-Prozessen kompilieren')
+    parser.add_argument('--resume', action='store_true',
+                        help='Abgebrochenen Lauf fortsetzen und bereits erzeugte Urkunden überspringen')
+    parser.add_argument('--print-spool', choices=config.SPOOL_LAYOUTS, default=None,
+                        help='Druckdatei pro Altersklasse in Siegerehrungsreihenfolge erstellen (Seitenanordnung)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Laufzeiten der einzelnen Stufen und pro Teilnehmer messen und als Tabelle ausgeben')
+    parser.add_argument('--profile-json', metavar='DATEI', default=None,
+                        help='Gemessene Laufzeiten als JSON speichern (schaltet --profile ein)')
+    parser.add_argument('--chrome-trace', metavar='DATEI', default=None,
+                        help='Gemessene Abschnitte als Chrome-Trace speichern, z. B. für chrome://tracing oder Perfetto '
+                             '(schaltet --profile ein)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Eingabedatei überwachen und Urkunden erzeugen, sobald Platzierungen feststehen oder sich ändern')
+    parser.add_argument('--watch-interval', type=float, default=config.WATCH_INTERVAL,
+                        help='Abstand in Sekunden, in dem die Eingabedatei im Überwachungsmodus geprüft wird')
+    parser.add_argument('--failure-report', metavar='DATEI', default=None,
+                        help='Fehlerbericht mit fehlgeschlagenen und erneut versuchten Urkunden als JSON speichern '
+                             f'(Standard: {FAILURE_REPORT_FILENAME} im Ausgabeverzeichnis, nur bei Fehlern)')
+    parser.add_argument('--no-master', action='store_true', help='Keine Master-PDFs erstellen')
+    parser.add_argument('--json-progress', action='store_true',
+                        help='Fortschritt als JSON-Zeilen auf stdout ausgeben, sonstige Ausgaben auf stderr')
+    return parser.parse_args(argv)
+
+def report_profile(args: argparse.Namespace, profiler: Optional[Profiler], progress: ProgressPrinter) -> None:
+    """Gibt die gemessenen Laufzeiten als Tabelle aus und speichert sie auf Wunsch als JSON bzw. Chrome-Trace."""
+    if profiler is None:
+        return
+    progress.emit('profile', profiler.summary(), stages=profiler.stage_totals())
+    if args.profile_json:
+        profiler.write_json(args.profile_json)
+    if args.chrome_trace:
+        profiler.write_chrome_trace(args.chrome_trace)
+
+def report_failures(args: argparse.Namespace, failures: FailureReport, progress: ProgressPrinter) -> None:
+    """
+    Speichert den Fehlerbericht, sofern Urkunden fehlgeschlagen sind oder erneut versucht wurden. Sonst wird
+    ein Bericht eines früheren Laufs gelöscht, damit er nicht für den aktuellen gehalten wird.
+    """
+    path = args.failure_report or os.path.join(args.output_dir, FAILURE_REPORT_FILENAME)
+    if not failures.entries and not args.failure_report:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    failures.write(path)
+    progress.emit('failures', f"{failures.summary()} Fehlerbericht: {path}", path=path,
+                  failed=len(failures.failed), resolved=len(failures.resolved))
+
+def run(args: argparse.Namespace, progress: ProgressPrinter) -> int:
+    """
+    Führt die Generierung aus. Gibt 0 bei Erfolg, 1 bei fehlgeschlagenen Urkunden, 2 bei Eingabefehlern
+    und 130 nach einem Abbruch mit Strg+C zurück.
+    """
+    start = time.perf_counter()
+    profiler = Profiler() if args.profile or args.profile_json or args.chrome_trace else None
+
+    # Vorlagen einlesen und zerlegen
+    try:
+        with open(args.template, 'r', encoding='utf-8') as f:
+            template = f.read()
+    except FileNotFoundError:
+        progress.emit('error', f"LaTeX-Vorlagendatei '{args.template}' nicht gefunden.")
+        return 2
+    try:
+        with open(args.long_name_template, 'r', encoding='utf-8') as f:
+            long_name_template = f.read()
+    except FileNotFoundError:
+        progress.emit('warning', f"LaTeX-Vorlagendatei für lange Namen '{args.long_name_template}' nicht gefunden. Standardvorlage wird verwendet.")
+        long_name_template = template
+    try:
+        template = compile_template(template)
+        long_name_template = compile_template(long_name_template)
+    except ValueError as e:
+        progress.emit('error', f"Ungültige LaTeX-Vorlage: {e}")
+        return 2
+
+    if args.watch:
+        return watch(args, progress, template, long_name_template)
+
+    # Teilnehmer in einem Durchgang einlesen und filtern, ohne die vollständige Liste zu halten. Alle
+    # Teilnehmer kommen ins Layout, damit die Master-PDFs auch bei Filtern vollständig sind.
+    layout = OutputLayout(args.output_dir)
+    count = 0
+
+    def read_all():
+        nonlocal count
+        for participant in iter_participants(args.json_file):
+            count += 1
+            layout.add(participant)
+            yield participant
+
+    filters = (args.vorname, args.name, args.altersklasse, args.gewichtsklasse)
+    try:
+        # Einlesen und Filtern greifen ineinander und werden gemeinsam gemessen
+        with measure(profiler, STAGE_PARSE):
+            filtered_participants = filter_participants(read_all(), vorname=args.vorname, name=args.name,
+                                                        altersklasse=args.altersklasse,
+                                                        gewichtsklasse=args.gewichtsklasse)
+    except FileNotFoundError:
+        progress.emit('error', f"Die JSON-Datei '{args.json_file}' wurde nicht gefunden.")
+        return 2
+    except ValueError as e:
+        progress.emit('error', f"Fehler beim Einlesen der JSON-Datei: {e}")
+        return 2
+    if not count:
+        progress.emit('warning', "Keine Teilnehmerdaten gefunden.")
+        return 2
+    if not filtered_participants:
+        progress.emit('warning', "Keine Teilnehmer entsprechen den Filterkriterien.")
+        return 2
+    progress.emit('start', f"{len(filtered_participants)} von {count} Teilnehmern ausgewählt.",
+                  total=len(filtered_participants))
+
+    # Urkunden generieren, für Druckdateien gleich in Siegerehrungsreihenfolge
+    # Das Manifest wird immer fortgeschrieben, übersprungen wird nur im inkrementellen Modus
+    manifest = BuildManifest(args.output_dir)
+    spool = None
+    if args.print_spool:
+        filtered_participants = sort_for_ceremony(filtered_participants)
+        spool = PrintSpool(filtered_participants, args.output_dir, args.print_spool,
+                           on_block=lambda path: progress.emit('spool', None, path=path))
+    counts = {'done': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+
+    def on_result(participant, pdf_path):
+        with counts_lock:
+            counts['done' if pdf_path else 'failed'] += 1
+            done, failed = counts['done'], counts['failed']
+        progress.emit('certificate', None, vorname=participant.vorname, name=participant.name,
+                      altersklasse=participant.altersklasse, gewichtsklasse=participant.gewichtsklasse,
+                      path=pdf_path, ok=pdf_path is not None, done=done, failed=failed)
+        if spool is not None:
+            spool.on_result(participant, pdf_path)
+
+    job = GenerationJob(args.output_dir, resume=args.resume)
+    daemon = TexDaemon(LATEX_PREAMBLE, pool_size=args.workers) if args.tex_daemon else None
+    failures = FailureReport()
+    outcome: Dict = {}
+
+    def generate():
+        try:
+            outcome['results'] = generate_certificates(
+                filtered_participants, template, long_name_template,
+                args.output_dir, args.min_chars_for_long_template,
+                workers=args.workers, batch_mode=args.batch_mode, batch_size=args.batch_size,
+                engine=args.engine, manifest=manifest, incremental=args.incremental, on_result=on_result,
+                on_error=lambda participant, message: progress.emit('error', message),
+                on_progress=lambda event: progress.emit('progress', format_progress(event), **event),
+                job=job, daemon=daemon, profiler=profiler, layout=layout, failures=failures)
+        except BaseException as e:
+            outcome['error'] = e
+
+    # Generierung im Hintergrund, damit Strg+C im Hauptthread den Lauf sauber abbrechen kann
+    worker = threading.Thread(target=generate)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.2)
+    except KeyboardInterrupt:
+        job.cancel()
+        worker.join()
+    finally:
+        job.close()
+        if daemon is not None:
+            daemon.close()
+    if 'error' in outcome:
+        raise outcome['error']
+    results = outcome.get('results', [])
+    certificates_seconds = time.perf_counter() - start
+
+    if job.cancelled:
+        # Journal bleibt erhalten, keine Master-PDFs und Druckdateien aus einem unvollständigen Lauf
+        if spool is not None:
+            spool.discard()
+        manifest.save()
+        report_profile(args, profiler, progress)
+        report_failures(args, failures, progress)
+        progress.emit('cancelled', f"Abgebrochen nach {counts['done']} Urkunden. Mit --resume fortsetzen.",
+                      generated=counts['done'], failed=counts['failed'], total=len(filtered_participants),
+                      seconds=certificates_seconds)
+        return 130
+    # Erst nach einem vollständigen Lauf, nach einer Ausnahme bleibt das Journal für --resume erhalten
+    job.finish()
+
+    # Druckdateien abschließen, auch mit den unverändert übersprungenen Urkunden
+    if spool is not None:
+        spool.finish(results)
+
+    # Master-PDFs generieren
+    masters = []
+    if args.incremental and not any(filters):
+        # Veraltete Urkunden nur löschen, wenn alle Teilnehmer ungefiltert erzeugt wurden
+        manifest.prune()
+    manifest.save()
+    if not args.no_master:
+        changed_files = manifest.changed_files if args.incremental else [result for result in results if result]
+        bytes_saved = []
+
+        def on_master(master_pdf_path, stats):
+            bytes_saved.append(stats['bytes_saved'])
+            progress.emit('master', None, path=master_pdf_path, **stats)
+
+        masters = generate_master_certificates(args.output_dir, changed_files, on_master=on_master, profiler=profiler,
+                                               layout=layout)
+        progress.emit('masters', f"{len(masters)} Master-PDFs erstellt, {sum(bytes_saved) / 1024:.0f} KB durch "
+                                 f"gemeinsame Schriften und Ressourcen gespart.",
+                      count=len(masters), bytes_saved=sum(bytes_saved))
+
+    report_profile(args, profiler, progress)
+    report_failures(args, failures, progress)
+    elapsed = time.perf_counter() - start
+    progress.emit('finished',
+                  f"{counts['done']} Urkunden erzeugt, {counts['failed']} fehlgeschlagen, "
+                  f"{len(filtered_participants) - counts['done'] - counts['failed']} unverändert in {elapsed:.1f} s.",
+                  generated=counts['done'], failed=counts['failed'], total=len(filtered_participants),
+                  certificates_seconds=certificates_seconds, seconds=elapsed)
+    return 1 if counts['failed'] else 0
+
+def watch(args: argparse.Namespace, progress: ProgressPrinter, template, long_name_template) -> int:
+    """
+    Überwacht die Eingabedatei und erzeugt nur die Urkunden der Teilnehmer, deren Platzierung endgültig
+    geworden ist oder sich geändert hat. Urkunden zurückgezogener Platzierungen werden gelöscht.
+    Fehlgeschlagene Urkunden werden beim nächsten Abfragen erneut versucht.
+    Läuft bis Strg+C und gibt dann 0 zurück.
+    """
+    # Das Manifest verhindert nach einem Neustart, dass unveränderte Urkunden erneut kompiliert werden
+    manifest = BuildManifest(args.output_dir)
+    daemon = TexDaemon(LATEX_PREAMBLE, pool_size=args.workers) if args.tex_daemon else None
+    filters = dict(vorname=args.vorname, name=args.name, altersklasse=args.altersklasse,
+                   gewichtsklasse=args.gewichtsklasse)
+
+    def on_change(changed, withdrawn):
+        changed = filter_participants(changed, **filters)
+        withdrawn = filter_participants(withdrawn, **filters)
+        changed_paths = {get_certificate_path(participant, args.output_dir) for participant in changed}
+
+        # Urkunden zurückgezogener Platzierungen löschen, sofern sie nicht gleich neu erzeugt werden. Auch
+        # bereits gelöschte zählen, damit nach einem fehlgeschlagenen Durchlauf die Master-PDFs folgen.
+        removed = []
+        for participant in withdrawn:
+            pdf_path = get_certificate_path(participant, args.output_dir)
+            if pdf_path in changed_paths:
+                continue
+            removed.append(pdf_path)
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+                progress.emit('withdrawn', f"Platzierung von {participant.vorname} {participant.name} zurückgezogen, "
+                                           f"Urkunde '{pdf_path}' gelöscht.", path=pdf_path)
+        if not changed and not removed:
+            return []
+
+        # Layout aus dem gerade gelesenen Stand, Urkunden noch nicht platzierter Teilnehmer existieren einfach nicht
+        layout = OutputLayout(args.output_dir, watcher.current.values())
+        results = []
+        if changed:
+            progress.emit('start', f"{len(changed)} Platzierungen neu oder geändert.", total=len(changed))
+            results = generate_certificates(
+                changed, template, long_name_template, args.output_dir, args.min_chars_for_long_template,
+                workers=args.workers, batch_mode=args.batch_mode, batch_size=args.batch_size, engine=args.engine,
+                manifest=manifest, on_error=lambda participant, message: progress.emit('error', message),
+                on_result=lambda participant, pdf_path: progress.emit(
+                    'certificate', None, vorname=participant.vorname, name=participant.name,
+                    altersklasse=participant.altersklasse, gewichtsklasse=participant.gewichtsklasse,
+                    path=pdf_path, ok=pdf_path is not None),
+                daemon=daemon, layout=layout)
+            manifest.save()
+        if not args.no_master:
+            masters = generate_master_certificates(args.output_dir, [result for result in results if result] + removed,
+                                                   layout=layout)
+            progress.emit('masters', f"{len(masters)} Master-PDFs aktualisiert.", count=len(masters))
+        # Dem Watcher melden, welche Urkunden beim nächsten Abfragen erneut versucht werden sollen
+        return [participant for participant, result in zip(changed, results) if result is None]
+
+    watcher = ResultsWatcher(args.json_file, on_change, interval=args.watch_interval,
+                             on_error=lambda message: progress.emit('warning', message))
+    progress.emit('watch', f"Überwache '{args.json_file}' auf neue Platzierungen, beenden mit Strg+C.",
+                  path=args.json_file)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    finally:
+        if daemon is not None:
+            daemon.close()
+    progress.emit('finished', "Überwachung beendet.")
+    return 0
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    progress = ProgressPrinter(sys.stdout, args.json_progress)
+    if args.json_progress:
+        # Ausgaben der Bibliotheksfunktionen auf stderr umleiten, damit stdout nur JSON-Zeilen enthält
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args, progress)
+    return run(args, progress)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,47 @@
 # config.py
 
+import os
+
 DEFAULT_JSON_FILE = 'competitors.json'
 DEFAULT_TEMPLATE_FILE = 'urkunde_template.tex'
 DEFAULT_LONG_TEMPLATE_FILE = 'urkunde_template_long.tex'
 DEFAULT_OUTPUT_DIR = 'Urkunden'
-DEFAULT_MIN_CHARS_FOR_LONG_TEMPLATE = 20
\ No newline at end of file
+DEFAULT_MIN_CHARS_FOR_LONG_TEMPLATE = 20
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Kompiliermodi: eine pdflatex-Ausführung pro Teilnehmer, pro Gewichtsklasse oder für die ganze Veranstaltung
+BATCH_MODES = ('einzeln', 'gewichtsklasse', 'veranstaltung')
+DEFAULT_BATCH_MODE = 'einzeln'
+DEFAULT_BATCH_SIZE = 100
+USE_FORMAT_CACHE = True
+FORMAT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'urkundenDruck', 'formate')
+DEFAULT_INCREMENTAL = False
+# Obergrenze für die Importzeit der Module beim Programmstart (siehe benchmark.py --import-budget)
+IMPORT_TIME_BUDGET_MS = 150
+
+# Vorgewärmte pdflatex-Prozesse für schnelle Einzel- und Nachdrucke (siehe tex_daemon.py)
+USE_TEX_DAEMON = False
+TEX_DAEMON_TIMEOUT = 30
+
+# Satz-Engine: LaTeX oder Stempeln der Felder auf einen einmal gesetzten Hintergrund (siehe pdf_overlay.py).
+# Vorgabe für alle Vorlagen; eine Vorlage kann mit der Zeile '% Satz-Engine: overlay' eine eigene festlegen.
+ENGINES = ('latex', 'overlay')
+DEFAULT_ENGINE = 'latex'
+# Mit TeX gesetzte Hintergründe der Vorlagen für die Overlay-Engine; lassen sich auf Rechner ohne TeX kopieren
+OVERLAY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'urkundenDruck', 'hintergruende')
+
+# Druckdateien in Siegerehrungsreihenfolge: eine Urkunde pro Blatt, mit leerer Rückseite oder zwei pro Blatt
+SPOOL_LAYOUTS = ('einfach', 'duplex', '2auf1')
+# Abstand in Sekunden, in dem die Ergebnisdatei im Überwachungsmodus geprüft wird (siehe results_watcher.py)
+WATCH_INTERVAL = 2.0
+
+# Lokaler Auftragsdienst für Nachdrucke (siehe job_service.py)
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+
+# Arbeitsverzeichnisse für pdflatex (siehe workspace_pool.py): fester Ort oder None für /dev/shm bzw. das
+# temporäre Verzeichnis des Systems
+WORKSPACE_DIR = None
+USE_TMPFS = True
+
+# Höchstzahl erneuter Versuche für eine fehlgeschlagene Urkunde (siehe latex_failures.py)
+MAX_RETRIES = 2
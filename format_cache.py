@@ -0,0 +1,92 @@
+# format_cache.py
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Dict, Optional
+import config
+
+# Verhindert, dass mehrere Worker-Threads gleichzeitig dasselbe Format erzeugen
+_lock = threading.Lock()
+_tex_version: Optional[str] = None
+_failed_formats: Dict[str, bool] = {}
+
+def get_tex_version() -> str:
+    """Gibt die erste Zeile von 'pdflatex --version' zurück (leer, falls pdflatex nicht aufrufbar ist)."""
+    global _tex_version
+    if _tex_version is None:
+        try:
+            result = subprocess.run(['pdflatex', '--version'], check=True, capture_output=True, text=True)
+            _tex_version = result.stdout.splitlines()[0] if result.stdout else ''
+        except (OSError, subprocess.CalledProcessError):
+            _tex_version = ''
+    return _tex_version
+
+def get_format_name(preamble: str) -> str:
+    """Bildet den Formatnamen aus einem Hash über Vorspann und TeX-Version."""
+    key = hashlib.sha256((get_tex_version() + '\n' + preamble).encode('utf-8')).hexdigest()[:16]
+    return f"urkunde_{key}"
+
+def get_format(preamble: str, cache_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Gibt den Namen eines vorkompilierten Formats (.fmt) für den Vorspann zurück und erzeugt es bei Bedarf.
+    Ändern sich Vorspann oder TeX-Version, ändert sich der Name und das Format wird neu erzeugt.
+    Gibt None zurück, falls das Format nicht erzeugt werden kann.
+    """
+    cache_dir = cache_dir or config.FORMAT_CACHE_DIR
+    format_name = get_format_name(preamble)
+    if os.path.exists(os.path.join(cache_dir, format_name + '.fmt')):
+        return format_name
+
+    with _lock:
+        if os.path.exists(os.path.join(cache_dir, format_name + '.fmt')):
+            return format_name
+        if _failed_formats.get(format_name):
+            return None
+        if not build_format(preamble, format_name, cache_dir):
+            _failed_formats[format_name] = True
+            return None
+    return format_name
+
+def build_format(preamble: str, format_name: str, cache_dir: str) -> bool:
+    """Erzeugt das Format mit mylatexformat und ersetzt veraltete Formate im Cache-Verzeichnis."""
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tempdir:
+        tex_filename = os.path.join(tempdir, format_name + '.tex')
+        with open(tex_filename, 'w', encoding='utf-8') as f:
+            f.write(preamble)
+            f.write('\\begin{document}\n\\end{document}\n')
+        try:
+            subprocess.run(['pdflatex', '-ini', '-interaction=nonstopmode', f'-jobname={format_name}',
+                            '&pdflatex', 'mylatexformat.ltx', format_name + '.tex'],
+                           cwd=tempdir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            print("Vorkompiliertes LaTeX-Format konnte nicht erzeugt werden, kompiliere ohne Format.")
+            return False
+
+        format_file = os.path.join(tempdir, format_name + '.fmt')
+        if not os.path.exists(format_file):
+            return False
+
+        # Alte Formate entfernen, sie passen nicht mehr zum aktuellen Vorspann
+        for filename in os.listdir(cache_dir):
+            if filename.startswith('urkunde_') and filename.endswith('.fmt'):
+                os.remove(os.path.join(cache_dir, filename))
+
+        # Über eine temporäre Datei im Zielverzeichnis kopieren, damit andere Prozesse nie ein halbes Format sehen
+        temp_destination = os.path.join(cache_dir, format_name + '.fmt.tmp')
+        shutil.copyfile(format_file, temp_destination)
+        os.replace(temp_destination, os.path.join(cache_dir, format_name + '.fmt'))
+    print(f"Vorkompiliertes LaTeX-Format '{format_name}' in '{cache_dir}' gespeichert.")
+    return True
+
+def get_environment(cache_dir: Optional[str] = None) -> Dict[str, str]:
+    """Gibt die Umgebung für pdflatex zurück, in der das Cache-Verzeichnis im Formatsuchpfad liegt."""
+    cache_dir = cache_dir or config.FORMAT_CACHE_DIR
+    env = dict(os.environ)
+    # Der abschließende Pfadtrenner hängt die Standardsuchpfade von kpathsea an
+    env['TEXFORMATS'] = cache_dir + os.pathsep + env.get('TEXFORMATS', '')
+    return env
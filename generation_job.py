@@ -0,0 +1,117 @@
+# generation_job.py
+
+import contextlib
+import json
+import os
+import subprocess
+import threading
+from typing import Iterator, List, Set
+
+JOURNAL_FILENAME = '.urkunden_job.jsonl'
+
+class JobCancelled(Exception):
+    """Wird ausgelöst, wenn ein Lauf während einer pdflatex-Ausführung abgebrochen wurde."""
+
+class GenerationJob:
+    """
+    Ein Generierungslauf, der abgebrochen und später fortgesetzt werden kann.
+
+    Laufende pdflatex-Prozesse werden registriert und beim Abbruch beendet. Jede fertige Urkunde
+    wird sofort im Journal des Ausgabeverzeichnisses vermerkt; bricht der Lauf ab oder stürzt das
+    Programm ab, bleibt das Journal erhalten und ein Lauf mit resume=True überspringt diese Urkunden.
+    """
+
+    def __init__(self, output_dir: str, resume: bool = False):
+        self.output_dir = output_dir
+        self.journal_path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.completed: Set[str] = set()
+        self._cancel_event = threading.Event()
+        self._processes: Set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+        if resume:
+            self.completed = self.read_journal()
+        os.makedirs(output_dir, exist_ok=True)
+        # Journal zum Anhängen öffnen; ohne resume wird ein altes Journal verworfen
+        self._journal = open(self.journal_path, 'a' if resume else 'w', encoding='utf-8')
+
+    def read_journal(self) -> Set[str]:
+        """Liest die im Journal vermerkten Urkunden, eine unvollständige letzte Zeile wird ignoriert."""
+        completed = set()
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        completed.add(json.loads(line)['urkunde'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def _key(self, pdf_path: str) -> str:
+        return os.path.relpath(pdf_path, self.output_dir).replace(os.sep, '/')
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        """Bricht den Lauf ab und beendet alle laufenden pdflatex-Prozesse."""
+        self._cancel_event.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+    def is_completed(self, pdf_path: str) -> bool:
+        """Prüft, ob die Urkunde in einem früheren, abgebrochenen Lauf bereits erzeugt wurde."""
+        return self._key(pdf_path) in self.completed and os.path.exists(pdf_path)
+
+    def mark_completed(self, pdf_path: str) -> None:
+        """Vermerkt eine fertige Urkunde sofort im Journal."""
+        key = self._key(pdf_path)
+        with self._lock:
+            self.completed.add(key)
+            self._journal.write(json.dumps({'urkunde': key}, ensure_ascii=False) + '\n')
+            self._journal.flush()
+
+    def run_process(self, args: List[str], **kwargs) -> None:
+        """
+        Führt einen Prozess wie subprocess.run(check=True) aus, kann aber über cancel() beendet werden.
+        Löst JobCancelled aus, wenn der Lauf abgebrochen wurde.
+        """
+        if self.cancelled:
+            raise JobCancelled()
+        process = subprocess.Popen(args, **kwargs)
+        with self.attach(process):
+            returncode = process.wait()
+        if self.cancelled:
+            raise JobCancelled()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, args)
+
+    @contextlib.contextmanager
+    def attach(self, process: subprocess.Popen) -> Iterator[None]:
+        """Registriert einen laufenden Prozess (z. B. einen vorgewärmten des TexDaemon), damit cancel() ihn beendet."""
+        with self._lock:
+            self._processes.add(process)
+        try:
+            # Abbruch zwischen Start und Registrierung nicht verpassen
+            if self.cancelled:
+                process.terminate()
+            yield
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+    def close(self) -> None:
+        """Schließt das Journal. Es bleibt erhalten, damit ein abgebrochener oder abgestürzter Lauf fortgesetzt werden kann."""
+        self._journal.close()
+
+    def finish(self) -> None:
+        """Schließt und löscht das Journal nach einem vollständigen, fehlerfreien Lauf."""
+        self.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
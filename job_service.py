@@ -0,0 +1,428 @@
+# job_service.py
+#
+# Lokaler Dienst für Nachdrucke und Sammelläufe, den sich mehrere Meldetische teilen:
+#   python -m job_service --json_file competitors.json --port 8765
+#
+#   POST /jobs               {"vorname": "Emma", "name": "Test", "nachdruck": true, "korrektur": {"name": "Tést"}}
+#   GET  /jobs               alle Aufträge
+#   GET  /jobs/<id>          Status eines Auftrags
+#   GET  /jobs/<id>/pdf?nr=0 erzeugte Urkunde eines Auftrags
+
+import argparse
+import asyncio
+import dataclasses
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import config
+from participant_reader import Participant, ParticipantIndex, read_participants
+from template_engine import CompiledTemplate, compile_template
+
+# Nachdrucke werden vor Sammelläufen bearbeitet, innerhalb einer Priorität in Reihenfolge des Eingangs
+PRIORITY_REPRINT = 0
+PRIORITY_BULK = 1
+
+JOB_STATES = ('wartend', 'läuft', 'fertig', 'fehlgeschlagen')
+JOB_WAITING, JOB_RUNNING, JOB_DONE, JOB_FAILED = JOB_STATES
+
+# Filter eines Auftrags und Felder, die bei einem Nachdruck korrigiert werden dürfen (z. B. falsch geschriebener Name)
+FILTER_FIELDS = ('vorname', 'name', 'altersklasse', 'gewichtsklasse')
+CORRECTABLE_FIELDS = ('vorname', 'name', 'verein')
+
+HTTP_STATUS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY_SIZE = 64 * 1024
+
+class ServiceError(Exception):
+    """Fehler einer Anfrage, der mit dem angegebenen HTTP-Status beantwortet wird."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class Job:
+    """Ein Auftrag: die ausgewählten Teilnehmer, ihr Fortschritt und die erzeugten Urkunden."""
+
+    def __init__(self, job_id: int, participants: List[Participant], priority: int, description: str):
+        self.id = job_id
+        self.participants = participants
+        self.priority = priority
+        self.description = description
+        self.state = JOB_WAITING
+        self.results: List[Optional[str]] = [None] * len(participants)
+        self.done = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.pending_chunks = 0
+        # Korrekturnachdruck: Position -> Pfad der Urkunde des unkorrigierten Eintrags der Exportdatei
+        self.replaces: Dict[int, str] = {}
+        self.submitted = time.time()
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'status': self.state, 'nachdruck': self.priority == PRIORITY_REPRINT,
+                'beschreibung': self.description, 'total': len(self.participants), 'done': self.done,
+                'failed': self.failed, 'errors': self.errors[-10:], 'submitted': self.submitted,
+                'finished': self.finished,
+                'files': [os.path.basename(result) if result else None for result in self.results]}
+
+class JobService:
+    """
+    Nimmt Aufträge entgegen und erzeugt die Urkunden nacheinander mit generate_certificates.
+
+    Die Teilnehmer werden einmal in einen ParticipantIndex geladen und nur neu eingelesen, wenn sich
+    die Exportdatei geändert hat; Einlesen und Dateizugriffe laufen im Executor, damit die Ereignisschleife
+    währenddessen die Anfragen der anderen Meldetische beantwortet. Sammelläufe werden pro Gewichtsklasse in Teilaufträge zerlegt, damit
+    ein Nachdruck, der während eines großen Laufs eingeht, nach der laufenden Gewichtsklasse an die Reihe kommt.
+
+    Eine Korrektur (z. B. eines falsch geschriebenen Namens) gilt nach dem erfolgreichen Nachdruck für alle
+    weiteren Aufträge dieses Dienstes, bis die Exportdatei selbst korrigiert ist; die Urkunde mit dem alten
+    Namen wird gelöscht und aus den Master-PDFs entfernt.
+    """
+
+    def __init__(self, json_file: str, template: CompiledTemplate, long_name_template: CompiledTemplate,
+                 output_dir: str, min_chars_for_long_template: int, workers: int = config.DEFAULT_WORKERS,
+                 engine: str = config.DEFAULT_ENGINE, masters: bool = True):
+        self.json_file = json_file
+        self.template = template
+        self.long_name_template = long_name_template
+        self.output_dir = output_dir
+        self.min_chars_for_long_template = min_chars_for_long_template
+        self.workers = workers
+        self.engine = engine
+        self.masters = masters
+        self.jobs: Dict[int, Job] = {}
+        self._job_ids = itertools.count(1)
+        self._sequence = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._index: Optional[ParticipantIndex] = None
+        self._index_key: Optional[Tuple] = None
+        self._layout = None
+        # Pfad der Urkunde eines Eintrags der Exportdatei -> korrigierter Teilnehmer
+        self._corrections: Dict[str, Participant] = {}
+        self._lock = threading.Lock()
+        # Verhindert, dass mehrere Threads des Executors die Exportdatei gleichzeitig neu einlesen
+        self._index_lock = threading.Lock()
+
+    def load_index(self) -> ParticipantIndex:
+        """
+        Gibt den Teilnehmerindex zurück und liest die Exportdatei nur nach einer Änderung neu ein.
+        Blockiert beim Neueinlesen, im Dienst daher nur aus einem Thread des Executors aufrufen.
+        """
+        with self._index_lock:
+            try:
+                stat = os.stat(self.json_file)
+                key = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                key = None
+            if self._index is None or key is None or key != self._index_key:
+                from certificate_generator import OutputLayout
+                index = ParticipantIndex(read_participants(self.json_file))
+                # Verzeichnisse aller Teilnehmer, damit Master-PDFs ohne Durchsuchen des Ausgabeordners entstehen
+                self._layout = OutputLayout(self.output_dir, [self.get_corrected(participant)
+                                                              for participant in index.participants])
+                self._index = index
+                self._index_key = key
+            return self._index
+
+    def get_corrected(self, participant: Participant) -> Participant:
+        """Gibt einen Eintrag der Exportdatei mit den bisher nachgedruckten Korrekturen zurück."""
+        from certificate_generator import get_certificate_path
+        with self._lock:
+            return self._corrections.get(get_certificate_path(participant, self.output_dir), participant)
+
+    async def submit(self, request: Dict) -> Job:
+        """
+        Legt einen Auftrag an. request enthält die Filter vorname, name, altersklasse und gewichtsklasse,
+        'nachdruck' für einen bevorzugten Nachdruck und optional 'korrektur' mit geänderten Feldern.
+        """
+        # Erst prüfen, dann leere Filter entfernen; sonst würden z. B. 0 oder false zu "alle Teilnehmer"
+        if any(request.get(field) is not None and not isinstance(request.get(field), str) for field in FILTER_FIELDS):
+            raise ServiceError(400, f"Die Filter {', '.join(FILTER_FIELDS)} müssen Zeichenketten sein.")
+        filters = {field: request.get(field) or None for field in FILTER_FIELDS}
+        reprint = request.get('nachdruck', False)
+        if not isinstance(reprint, bool):
+            raise ServiceError(400, "'nachdruck' muss true oder false sein.")
+        corrections = request.get('korrektur') or {}
+        if not isinstance(corrections, dict) or any(field not in CORRECTABLE_FIELDS for field in corrections):
+            raise ServiceError(400, f"Korrigierbar sind nur die Felder {', '.join(CORRECTABLE_FIELDS)}.")
+        if any(not isinstance(value, str) for value in corrections.values()):
+            raise ServiceError(400, "Korrigierte Felder müssen Zeichenketten sein.")
+
+        loop = asyncio.get_running_loop()
+        participants, replaces = await loop.run_in_executor(None, self._select, filters, corrections)
+
+        priority = PRIORITY_REPRINT if reprint else PRIORITY_BULK
+        description = ', '.join(f"{field}={value}" for field, value in filters.items() if value) or 'alle'
+        job = Job(next(self._job_ids), participants, priority, description)
+        job.replaces = replaces
+        self.jobs[job.id] = job
+
+        # Sammelläufe pro Gewichtsklasse einreihen, Nachdrucke als ein Teilauftrag
+        chunks: Dict[Tuple[str, str], List[int]] = {}
+        for position, participant in enumerate(participants):
+            key = (participant.altersklasse, participant.gewichtsklasse) if not reprint else ('', '')
+            chunks.setdefault(key, []).append(position)
+        job.pending_chunks = len(chunks)
+        for positions in chunks.values():
+            self._queue.put_nowait((priority, next(self._sequence), job, positions))
+        return job
+
+    def _select(self, filters: Dict[str, Optional[str]],
+                corrections: Dict[str, str]) -> Tuple[List[Participant], Dict[int, str]]:
+        """
+        Wählt die Teilnehmer eines Auftrags aus und wendet Korrekturen an (läuft im Executor). Gibt die
+        Teilnehmer und für einen Korrekturnachdruck den Pfad der zu ersetzenden Urkunde zurück.
+        """
+        from certificate_generator import get_certificate_path
+
+        found = self.load_index().filter(**filters)
+        if not found:
+            raise ServiceError(404, "Keine Teilnehmer entsprechen den Filterkriterien.")
+        # Bereits korrigierte Teilnehmer nicht wieder mit dem alten Namen drucken
+        participants = [self.get_corrected(participant) for participant in found]
+        replaces = {}
+        if corrections:
+            if len(participants) != 1:
+                raise ServiceError(409, f"Korrekturen sind nur für genau einen Teilnehmer möglich, "
+                                        f"gefunden: {len(participants)}.")
+            participants = [dataclasses.replace(participants[0], **corrections)]
+            replaces[0] = get_certificate_path(found[0], self.output_dir)
+        return participants, replaces
+
+    def _generate(self, job: Job, positions: List[int]) -> List[Optional[str]]:
+        # Läuft in einem Thread des Executors, damit die Ereignisschleife weiter Anfragen beantwortet
+        from certificate_generator import generate_certificates
+        from build_manifest import BuildManifest
+
+        def on_result(participant: Participant, pdf_path: Optional[str]) -> None:
+            with self._lock:
+                job.done += 1
+                if pdf_path is None:
+                    job.failed += 1
+
+        def on_error(participant: Participant, message: str) -> None:
+            with self._lock:
+                job.errors.append(message)
+
+        # Nachdrucke werden immer neu erzeugt, aber im Manifest eingetragen, damit inkrementelle Läufe sie kennen
+        manifest = BuildManifest(self.output_dir)
+        results = generate_certificates([job.participants[position] for position in positions], self.template,
+                                        self.long_name_template, self.output_dir, self.min_chars_for_long_template,
+                                        workers=self.workers, engine=self.engine, on_result=on_result,
+                                        on_error=on_error, layout=self._layout, manifest=manifest, incremental=False)
+        manifest.save()
+        for position, result in zip(positions, results):
+            if result is not None and position in job.replaces:
+                self._apply_correction(job.replaces[position], job.participants[position], result)
+        return results
+
+    def _apply_correction(self, original_path: str, corrected: Participant, pdf_path: str) -> None:
+        """
+        Übernimmt eine nachgedruckte Korrektur für alle weiteren Aufträge. Urkunden mit dem alten Namen
+        (auch aus einer früheren Korrektur) werden aus dem Layout ausgetragen und gelöscht, damit die
+        Master-PDF den Teilnehmer nur einmal enthält.
+        """
+        from certificate_generator import get_certificate_path
+
+        with self._lock:
+            previous = self._corrections.get(original_path)
+            self._corrections[original_path] = corrected
+        stale_paths = {original_path}
+        if previous is not None:
+            stale_paths.add(get_certificate_path(previous, self.output_dir))
+        stale_paths.discard(pdf_path)
+        for stale_path in stale_paths:
+            self._layout.remove(stale_path)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+                print(f"Urkunde '{stale_path}' wurde durch die korrigierte Urkunde '{pdf_path}' ersetzt.")
+
+    def _update_masters(self, job: Job) -> None:
+        from certificate_generator import generate_master_certificates
+        generate_master_certificates(self.output_dir, [result for result in job.results if result], layout=self._layout)
+
+    async def worker(self) -> None:
+        """Arbeitet die Warteschlange ab, immer den Teilauftrag mit der höchsten Priorität zuerst."""
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, sequence, job, positions = await self._queue.get()
+            try:
+                job.state = JOB_RUNNING
+                try:
+                    results = await loop.run_in_executor(None, self._generate, job, positions)
+                    for position, result in zip(positions, results):
+                        job.results[position] = result
+                except Exception as e:
+                    with self._lock:
+                        job.errors.append(f"Fehler beim Generieren: {e}")
+                        job.failed += len(positions)
+                job.pending_chunks -= 1
+                if job.pending_chunks == 0:
+                    if self.masters and any(job.results):
+                        try:
+                            await loop.run_in_executor(None, self._update_masters, job)
+                        except Exception as e:
+                            job.errors.append(f"Fehler beim Erstellen der Master-PDFs: {e}")
+                    job.state = JOB_FAILED if job.failed or not any(job.results) else JOB_DONE
+                    job.finished = time.time()
+            finally:
+                self._queue.task_done()
+
+    def get_job(self, job_id: str) -> Job:
+        job = self.jobs.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            raise ServiceError(404, f"Auftrag '{job_id}' nicht gefunden.")
+        return job
+
+    async def handle(self, method: str, target: str, body: bytes) -> Tuple[int, str, bytes]:
+        """Beantwortet eine Anfrage, gibt Status, Content-Type und Inhalt zurück."""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        if parts[:1] != ['jobs'] or len(parts) > 3 or (len(parts) == 3 and parts[2] != 'pdf'):
+            raise ServiceError(404, f"Unbekannter Pfad '{url.path}'.")
+
+        if len(parts) == 1:
+            if method == 'POST':
+                try:
+                    request = json.loads(body.decode('utf-8') or '{}')
+                except ValueError as e:
+                    raise ServiceError(400, f"Ungültiges JSON: {e}")
+                if not isinstance(request, dict):
+                    raise ServiceError(400, "Der Auftrag muss ein JSON-Objekt sein.")
+                return json_response(202, (await self.submit(request)).to_dict())
+            if method == 'GET':
+                return json_response(200, [job.to_dict() for job in self.jobs.values()])
+            raise ServiceError(405, f"Methode {method} wird nicht unterstützt.")
+
+        if method != 'GET':
+            raise ServiceError(405, f"Methode {method} wird nicht unterstützt.")
+        job = self.get_job(parts[1])
+        if len(parts) == 2:
+            return json_response(200, job.to_dict())
+
+        # PDF einer Urkunde des Auftrags ausliefern
+        number = parse_qs(url.query).get('nr', ['0'])[0]
+        if not number.isdigit() or int(number) >= len(job.results):
+            raise ServiceError(404, f"Urkunde Nr. {number} gehört nicht zu Auftrag {job.id}.")
+        pdf_path = job.results[int(number)]
+        content = await asyncio.get_running_loop().run_in_executor(None, read_file, pdf_path) if pdf_path else None
+        if content is None:
+            raise ServiceError(409, f"Urkunde Nr. {number} von Auftrag {job.id} ist noch nicht erzeugt ({job.state}).")
+        return 200, 'application/pdf', content
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Liest eine HTTP/1.1-Anfrage, beantwortet sie und schließt die Verbindung."""
+        try:
+            try:
+                request_line = (await reader.readline()).decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1')
+                    if line in ('\r\n', '\n', ''):
+                        break
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                if len(request_line) != 3:
+                    raise ServiceError(400, "Ungültige Anfragezeile.")
+                length = int(headers.get('content-length', '0') or 0)
+                if length > MAX_BODY_SIZE:
+                    raise ServiceError(413, "Anfrage zu groß.")
+                body = await reader.readexactly(length) if length else b''
+                status, content_type, content = await self.handle(request_line[0].upper(), request_line[1], body)
+            except ServiceError as e:
+                status, content_type, content = json_response(e.status, {'error': str(e)})
+            except (ValueError, asyncio.IncompleteReadError):
+                status, content_type, content = json_response(400, {'error': "Ungültige Anfrage."})
+            except Exception as e:
+                # Der Meldetisch soll auch bei einem unerwarteten Fehler eine Antwort erhalten
+                status, content_type, content = json_response(500, {'error': f"{type(e).__name__}: {e}"})
+            writer.write(f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+                         f"Content-Type: {content_type}\r\nContent-Length: {len(content)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + content)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int, workers: int = 1) -> None:
+        """Startet den HTTP-Server und die Worker und läuft, bis die Aufgabe abgebrochen wird."""
+        self._queue = asyncio.PriorityQueue()
+        index = self.load_index()
+        worker_tasks = [asyncio.create_task(self.worker()) for _ in range(max(workers, 1))]
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Auftragsdienst läuft auf http://{host}:{port}/jobs ({len(index)} Teilnehmer).")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in worker_tasks:
+                task.cancel()
+
+def read_file(path: str) -> Optional[bytes]:
+    """Liest eine Datei; gibt None zurück, falls sie (noch) nicht existiert."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def json_response(status: int, data) -> Tuple[int, str, bytes]:
+    return status, 'application/json; charset=utf-8', json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Lokaler Auftragsdienst für Urkunden und Nachdrucke.')
+    parser.add_argument('--json_file', help='Eingabedatei im JSON- oder JSONL-Format mit Teilnehmerdaten', default=config.DEFAULT_JSON_FILE)
+    parser.add_argument('--template', help='LaTeX-Vorlagendatei', default=config.DEFAULT_TEMPLATE_FILE)
+    parser.add_argument('--long_name_template', help='LaTeX-Vorlagendatei für lange Namen', default=config.DEFAULT_LONG_TEMPLATE_FILE)
+    parser.add_argument('--output_dir', help='Ausgabeverzeichnis für die Urkunden', default=config.DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--min-chars-for-long-template', type=int, default=config.DEFAULT_MIN_CHARS_FOR_LONG_TEMPLATE,
+                        help='Mindestanzahl an Zeichen für die Verwendung des alternativen Templates')
+    parser.add_argument('--workers', type=int, default=config.DEFAULT_WORKERS, help='Anzahl paralleler pdflatex-Prozesse pro Auftrag')
+    parser.add_argument('--engine', choices=config.ENGINES, default=config.DEFAULT_ENGINE,
+                        help='Satz-Engine: LaTeX oder Stempeln der Felder auf einen einmal gesetzten Hintergrund (overlay); '
+                             'Vorgabe für Vorlagen ohne eigene Zeile "%% Satz-Engine: ..."')
+    parser.add_argument('--host', default=config.SERVICE_HOST,
+                        help='Adresse des Dienstes; 0.0.0.0, damit andere Meldetische im Netz zugreifen können')
+    parser.add_argument('--port', type=int, default=config.SERVICE_PORT, help='Port des Dienstes')
+    parser.add_argument('--no-master', action='store_true', help='Master-PDFs nach einem Auftrag nicht aktualisieren')
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        with open(args.template, 'r', encoding='utf-8') as f:
+            template = f.read()
+    except FileNotFoundError:
+        print(f"LaTeX-Vorlagendatei '{args.template}' nicht gefunden.")
+        return 2
+    try:
+        with open(args.long_name_template, 'r', encoding='utf-8') as f:
+            long_name_template = f.read()
+    except FileNotFoundError:
+        print(f"LaTeX-Vorlagendatei für lange Namen '{args.long_name_template}' nicht gefunden. Standardvorlage wird verwendet.")
+        long_name_template = template
+    try:
+        template = compile_template(template)
+        long_name_template = compile_template(long_name_template)
+    except ValueError as e:
+        print(f"Ungültige LaTeX-Vorlage: {e}")
+        return 2
+
+    service = JobService(args.json_file, template, long_name_template, args.output_dir,
+                         args.min_chars_for_long_template, workers=args.workers, engine=args.engine,
+                         masters=not args.no_master)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
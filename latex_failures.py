@@ -0,0 +1,190 @@
+# latex_failures.py
+
+import dataclasses
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set
+from participant_reader import Participant
+
+FAILURE_REPORT_FILENAME = 'fehlerbericht.json'
+
+# Fehlerklassen: ungültige Zeichen in den Daten, fehlendes LaTeX-Paket, zu langer Text, Sonstiges
+FAILURE_CATEGORIES = ('zeichen', 'paket', 'ueberlauf', 'unbekannt')
+CATEGORY_CHARACTERS, CATEGORY_PACKAGE, CATEGORY_OVERFULL, CATEGORY_UNKNOWN = FAILURE_CATEGORIES
+
+# Die erste passende Fehlermeldung im Log bestimmt die Klasse
+ERROR_PATTERNS = [
+    (CATEGORY_PACKAGE, re.compile(r"^! LaTeX Error: File `[^']+' not found")),
+    (CATEGORY_CHARACTERS, re.compile(r"^! (?:Package inputenc Error: (?:Unicode character|Invalid UTF-8)"
+                                     r"|Missing \$ inserted|Undefined control sequence|Misplaced alignment tab"
+                                     r"|You can't use `macro parameter character #'|Text line contains an invalid character"
+                                     r"|Double superscript|Double subscript)")),
+]
+OVERFULL_PATTERN = re.compile(r'^Overfull \\[hv]box')
+# Ausgegebene Seiten erscheinen im Log als [1], [2{...}] usw.
+SHIPOUT_PATTERN = re.compile(r'(?<![^\s\]])\[\d+')
+
+# Zeilen nach der Fehlermeldung, die in den Bericht übernommen werden (enthalten die Zeilennummer)
+CONTEXT_LINES = 3
+
+# Sonderzeichen von LaTeX und ihre Darstellung als Text
+LATEX_SPECIAL_CHARACTERS = {
+    '\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#', '_': r'\_',
+    '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}',
+}
+
+@dataclasses.dataclass
+class LatexFailure:
+    """Ergebnis der Auswertung eines LaTeX-Logs: Fehlerklasse, Fehlermeldung und Ausschnitt des Logs."""
+    category: str
+    message: str
+    excerpt: str = ''
+
+def classify_log(log_text: Optional[str]) -> LatexFailure:
+    """Ordnet einen fehlgeschlagenen pdflatex-Lauf anhand seines Logs einer Fehlerklasse zu."""
+    if not log_text:
+        return LatexFailure(CATEGORY_UNKNOWN, "Keine LaTeX-Logdatei vorhanden.")
+    lines = log_text.splitlines()
+    first_error = None
+    for number, line in enumerate(lines):
+        if not line.startswith('! '):
+            continue
+        excerpt = '\n'.join(lines[number:number + 1 + CONTEXT_LINES])
+        for category, pattern in ERROR_PATTERNS:
+            if pattern.match(line):
+                return LatexFailure(category, line[2:].strip(), excerpt)
+        if first_error is None:
+            first_error = LatexFailure(CATEGORY_UNKNOWN, line[2:].strip(), excerpt)
+    if first_error is not None:
+        return first_error
+    overfull = find_overfull(log_text)
+    if overfull is not None:
+        return overfull
+    return LatexFailure(CATEGORY_UNKNOWN, "pdflatex ist ohne erkennbare Fehlermeldung fehlgeschlagen.",
+                        '\n'.join(lines[-CONTEXT_LINES:]))
+
+def find_overfull(log_text: Optional[str]) -> Optional[LatexFailure]:
+    """
+    Sucht im Log nach zu langem Text. pdflatex meldet ihn nur als Warnung und endet erfolgreich,
+    daher muss auch das Log eines erfolgreichen Laufs geprüft werden.
+    """
+    lines = log_text.splitlines() if log_text else []
+    for number, line in enumerate(lines):
+        if OVERFULL_PATTERN.match(line):
+            return LatexFailure(CATEGORY_OVERFULL, line.strip(), '\n'.join(lines[number:number + 1 + CONTEXT_LINES]))
+    return None
+
+def find_overfull_pages(log_text: Optional[str]) -> Set[int]:
+    """
+    Gibt die Seiten (ab 0) eines Dokuments mit mehreren Urkunden zurück, auf denen Text übersteht. Eine
+    Warnung gehört zur nächsten ausgegebenen Seite, gezählt werden die Seitenmarken davor.
+    """
+    pages = set()
+    shipped = 0
+    for line in log_text.splitlines() if log_text else []:
+        if OVERFULL_PATTERN.match(line):
+            pages.add(shipped)
+        else:
+            shipped += len(SHIPOUT_PATTERN.findall(line))
+    return pages
+
+def read_log(log_file: str) -> Optional[str]:
+    try:
+        with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def escape_latex(text: str) -> str:
+    """
+    Macht Text für LaTeX unschädlich: Sonderzeichen werden maskiert, Zeichen außerhalb von Latin-1
+    (die inputenc nicht kennt) durch ihren Grundbuchstaben ersetzt oder entfernt.
+    """
+    parts = []
+    for character in text:
+        if character in LATEX_SPECIAL_CHARACTERS:
+            parts.append(LATEX_SPECIAL_CHARACTERS[character])
+        elif ord(character) < 256:
+            parts.append(character)
+        else:
+            base = ''.join(c for c in unicodedata.normalize('NFKD', character) if ord(c) < 128)
+            parts.append(base)
+    return ''.join(parts)
+
+def escape_participant(participant: Participant) -> Participant:
+    """Gibt einen Teilnehmer mit maskierten Textfeldern für einen erneuten Versuch zurück."""
+    return dataclasses.replace(participant, name=escape_latex(participant.name),
+                               vorname=escape_latex(participant.vorname), verein=escape_latex(participant.verein),
+                               altersklasse=escape_latex(participant.altersklasse),
+                               gewichtsklasse=escape_latex(participant.gewichtsklasse))
+
+def should_retry_escaped(failure: LatexFailure) -> bool:
+    return failure.category == CATEGORY_CHARACTERS
+
+def should_retry_long_template(failure: LatexFailure) -> bool:
+    # Nur bei zu langem Text hilft die Vorlage für lange Namen; ein fehlendes Paket oder ein unbekannter
+    # Fehler träfe sie genauso, ein weiterer Versuch würde nur Zeit kosten
+    return failure.category == CATEGORY_OVERFULL
+
+class FailureReport:
+    """
+    Sammelt fehlgeschlagene und erst nach einem weiteren Versuch erzeugte Urkunden mit Fehlerklasse,
+    Fehlermeldung und Ausschnitt des LaTeX-Logs. Threadsicher; wird als JSON gespeichert, damit nach einem
+    unbeaufsichtigten Lauf nur die betroffenen Urkunden nachgearbeitet werden müssen.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, participant: Participant, pdf_path: str, failure: LatexFailure,
+               attempts: List[str], resolved: bool) -> None:
+        """Vermerkt eine Urkunde; attempts nennt die Versuche, resolved ob einer davon erfolgreich war."""
+        entry = {'vorname': participant.vorname, 'name': participant.name,
+                 'altersklasse': participant.altersklasse, 'gewichtsklasse': participant.gewichtsklasse,
+                 'urkunde': pdf_path, 'kategorie': failure.category, 'meldung': failure.message,
+                 'log': failure.excerpt, 'versuche': attempts, 'behoben': resolved, 'zeit': time.time()}
+        with self._lock:
+            self.entries[pdf_path] = entry
+
+    def get(self, pdf_path: str) -> Optional[Dict]:
+        with self._lock:
+            return self.entries.get(pdf_path)
+
+    @property
+    def failed(self) -> List[Dict]:
+        with self._lock:
+            return [entry for entry in self.entries.values() if not entry['behoben']]
+
+    @property
+    def resolved(self) -> List[Dict]:
+        with self._lock:
+            return [entry for entry in self.entries.values() if entry['behoben']]
+
+    def summary(self) -> str:
+        """Kurzfassung, z. B. '2 Urkunden fehlgeschlagen (zeichen: 1, paket: 1), 3 nach erneutem Versuch erzeugt'."""
+        counts: Dict[str, int] = {}
+        failed = self.failed
+        for entry in failed:
+            counts[entry['kategorie']] = counts.get(entry['kategorie'], 0) + 1
+        details = ', '.join(f"{category}: {count}" for category, count in sorted(counts.items()))
+        text = f"{len(failed)} Urkunden fehlgeschlagen" + (f" ({details})" if details else "")
+        return text + f", {len(self.resolved)} nach erneutem Versuch erzeugt."
+
+    def write(self, path: str) -> None:
+        """Speichert den Bericht atomar als JSON, fehlgeschlagene Urkunden zuerst."""
+        with self._lock:
+            entries = sorted(self.entries.values(), key=lambda entry: (entry['behoben'], entry['urkunde']))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fehlgeschlagen': sum(not entry['behoben'] for entry in entries),
+                       'behoben': sum(entry['behoben'] for entry in entries), 'urkunden': entries},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
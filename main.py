@@ -1,18 +1,33 @@
 # main.py
 
+import os
 import threading
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import messagebox, ttk
 from argparse import Namespace
-from participant_reader import read_participants, filter_participants
-from certificate_generator import generate_certificate, generate_master_certificates
 import config
 import queue
+from progress import format_progress
+
+# Höchstzahl an Nachrichten, die check_queue pro Aufruf verarbeitet
+QUEUE_BATCH_SIZE = 200
+# Auswahl im Menü der Druckdateien, wenn keine erstellt werden sollen
+SPOOL_OFF = 'aus'
+# Höchstzahl an Fehlermeldungen, die in der Zusammenfassung nach einem Lauf aufgeführt werden
+MAX_LISTED_ERRORS = 10
 
 class Application(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Urkunden Generator")
+        # Index der zuletzt geladenen Teilnehmerdatei, wird für alle Filterabfragen wiederverwendet
+        self.participant_index = None
+        self.participant_index_key = None
+        # Laufender Generierungsauftrag, kann über den Abbrechen-Button beendet werden
+        self.job = None
+        # Vorgewärmte pdflatex-Prozesse bleiben zwischen den Läufen erhalten, damit Nachdrucke sofort fertig sind
+        self.tex_daemon = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.create_widgets()
         self.queue = queue.Queue()
         self.check_queue()
@@ -33,10 +48,20 @@ class Application(tk.Tk):
         self.start_button = tk.Button(self.bottom_frame, text="Urkunden generieren", command=self.start_generation)
         self.start_button.pack(side=tk.LEFT, padx=10, pady=10)
 
+        # Abbrechen-Button, nur während einer Generierung aktiv
+        self.cancel_button = tk.Button(self.bottom_frame, text="Abbrechen", command=self.cancel_generation, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=10, pady=10)
+
         # Statuslabel
         self.status_label = tk.Label(self.bottom_frame, text="", fg="green")
         self.status_label.pack(side=tk.LEFT, padx=10, pady=10)
 
+        # Fortschrittsbalken mit Durchsatz und Restzeit
+        self.progress_bar = ttk.Progressbar(self.bottom_frame, orient=tk.HORIZONTAL, length=200, mode='determinate')
+        self.progress_bar.pack(side=tk.LEFT, padx=10, pady=10)
+        self.progress_label = tk.Label(self.bottom_frame, text="")
+        self.progress_label.pack(side=tk.LEFT, padx=10, pady=10)
+
     def add_content_widgets(self):
         # Standardwerte für Pfade aus config.py
         default_json = config.DEFAULT_JSON_FILE
@@ -104,6 +129,67 @@ class Application(tk.Tk):
         self.min_chars_entry.insert(0, str(config.DEFAULT_MIN_CHARS_FOR_LONG_TEMPLATE))
         row += 1
 
+        # Anzahl paralleler pdflatex-Prozesse
+        self.workers_label = tk.Label(self.main_frame, text="Parallele pdflatex-Prozesse:")
+        self.workers_label.grid(row=row, column=0, padx=10, pady=(10, 0), sticky="w")
+        row += 1
+
+        self.workers_entry = tk.Entry(self.main_frame)
+        self.workers_entry.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        self.workers_entry.insert(0, str(config.DEFAULT_WORKERS))
+        row += 1
+
+        # Satz-Engine: LaTeX oder direktes Schreiben der PDF-Seiten ohne TeX
+        self.engine_label = tk.Label(self.main_frame, text="Satz-Engine:")
+        self.engine_label.grid(row=row, column=0, padx=10, pady=(10, 0), sticky="w")
+        row += 1
+
+        self.engine_var = tk.StringVar(value=config.DEFAULT_ENGINE)
+        self.engine_menu = tk.OptionMenu(self.main_frame, self.engine_var, *config.ENGINES)
+        self.engine_menu.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        row += 1
+
+        # Kompiliermodus: einzeln, pro Gewichtsklasse oder für die ganze Veranstaltung
+        self.batch_mode_label = tk.Label(self.main_frame, text="LaTeX-Kompilierung:")
+        self.batch_mode_label.grid(row=row, column=0, padx=10, pady=(10, 0), sticky="w")
+        row += 1
+
+        self.batch_mode_var = tk.StringVar(value=config.DEFAULT_BATCH_MODE)
+        self.batch_mode_menu = tk.OptionMenu(self.main_frame, self.batch_mode_var, *config.BATCH_MODES)
+        self.batch_mode_menu.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        row += 1
+
+        # Druckdateien pro Altersklasse in Siegerehrungsreihenfolge
+        self.spool_label = tk.Label(self.main_frame, text="Druckdateien (Siegerehrungsreihenfolge):")
+        self.spool_label.grid(row=row, column=0, padx=10, pady=(10, 0), sticky="w")
+        row += 1
+
+        self.spool_var = tk.StringVar(value=SPOOL_OFF)
+        self.spool_menu = tk.OptionMenu(self.main_frame, self.spool_var, SPOOL_OFF, *config.SPOOL_LAYOUTS)
+        self.spool_menu.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        row += 1
+
+        # Nur Urkunden mit geänderten Daten neu erzeugen
+        self.incremental_var = tk.BooleanVar(value=config.DEFAULT_INCREMENTAL)
+        self.incremental_check = tk.Checkbutton(self.main_frame, text="Nur geänderte Urkunden neu erzeugen",
+                                                variable=self.incremental_var)
+        self.incremental_check.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        row += 1
+
+        # pdflatex-Prozesse vorwärmen
+        self.tex_daemon_var = tk.BooleanVar(value=config.USE_TEX_DAEMON)
+        self.tex_daemon_check = tk.Checkbutton(self.main_frame, text="pdflatex vorwärmen (schnelle Nachdrucke)",
+                                               variable=self.tex_daemon_var)
+        self.tex_daemon_check.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        row += 1
+
+        # Abgebrochenen Lauf fortsetzen, bereits erzeugte Urkunden werden übersprungen
+        self.resume_var = tk.BooleanVar(value=False)
+        self.resume_check = tk.Checkbutton(self.main_frame, text="Abgebrochenen Lauf fortsetzen",
+                                           variable=self.resume_var)
+        self.resume_check.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        row += 1
+
         # Button zum Einblenden der Filter
         self.show_filters = False
         self.filter_button = tk.Button(self.main_frame, text="Filter einblenden", command=self.toggle_filters)
@@ -153,24 +239,28 @@ class Application(tk.Tk):
         self.gewichtsklasse_entry.grid(row=3, column=1, padx=5, pady=5, sticky="w")
 
     def browse_json(self):
+        from tkinter import filedialog
         filename = filedialog.askopenfilename(filetypes=[("JSON-Dateien", "*.json")])
         if filename:
             self.json_entry.delete(0, tk.END)
             self.json_entry.insert(0, filename)
 
     def browse_template(self):
+        from tkinter import filedialog
         filename = filedialog.askopenfilename(filetypes=[("TeX-Dateien", "*.tex")])
         if filename:
             self.template_entry.delete(0, tk.END)
             self.template_entry.insert(0, filename)
 
     def browse_long_template(self):
+        from tkinter import filedialog
         filename = filedialog.askopenfilename(filetypes=[("TeX-Dateien", "*.tex")])
         if filename:
             self.long_template_entry.delete(0, tk.END)
             self.long_template_entry.insert(0, filename)
 
     def browse_output_dir(self):
+        from tkinter import filedialog
         dirname = filedialog.askdirectory()
         if dirname:
             self.output_entry.delete(0, tk.END)
@@ -180,6 +270,8 @@ class Application(tk.Tk):
         # Button deaktivieren und Status anzeigen
         self.start_button.config(state=tk.DISABLED, text="Generiere...")
         self.status_label.config(text="Generiere PDFs...")
+        self.progress_bar.config(value=0, maximum=1)
+        self.progress_label.config(text="")
         self.update_idletasks()
 
         # Eingaben sammeln
@@ -189,21 +281,53 @@ class Application(tk.Tk):
             long_name_template=self.long_template_entry.get(),
             output_dir=self.output_entry.get(),
             min_chars_for_long_template=int(self.min_chars_entry.get()),
+            workers=int(self.workers_entry.get()),
+            batch_mode=self.batch_mode_var.get(),
+            engine=self.engine_var.get(),
+            print_spool=self.spool_var.get() if self.spool_var.get() != SPOOL_OFF else None,
+            incremental=self.incremental_var.get(),
+            resume=self.resume_var.get(),
+            tex_daemon=self.tex_daemon_var.get(),
             vorname=self.vorname_entry.get() if self.show_filters and self.vorname_entry.get() else None,
             name=self.name_entry.get() if self.show_filters and self.name_entry.get() else None,
             altersklasse=self.altersklasse_entry.get() if self.show_filters and self.altersklasse_entry.get() else None,
             gewichtsklasse=self.gewichtsklasse_entry.get() if self.show_filters and self.gewichtsklasse_entry.get() else None,
         )
 
+        self.cancel_button.config(state=tk.NORMAL)
+
         # Starten des Worker-Threads
         self.worker_thread = threading.Thread(target=self.generate_certificates_in_thread)
         self.worker_thread.start()
 
+    def load_participant_index(self, json_file):
+        """Gibt den Teilnehmerindex der Datei zurück und liest sie nur neu ein, wenn sie sich geändert hat."""
+        from participant_reader import read_participants, ParticipantIndex
+        try:
+            stat = os.stat(json_file)
+            key = (os.path.abspath(json_file), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            key = None
+        if key is None or key != self.participant_index_key:
+            self.participant_index = ParticipantIndex(read_participants(json_file))
+            self.participant_index_key = key
+        return self.participant_index
+
     def generate_certificates_in_thread(self):
         try:
+            # Generierungsmodule erst im Worker-Thread laden, damit das Fenster sofort erscheint
+            from certificate_generator import generate_certificates, generate_master_certificates
+            from build_manifest import BuildManifest
+            from template_engine import compile_template
+            from generation_job import GenerationJob
+            from tex_daemon import TexDaemon
+            from certificate_generator import LATEX_PREAMBLE, OutputLayout
+            from print_spool import PrintSpool, sort_for_ceremony
+            from latex_failures import FailureReport, FAILURE_REPORT_FILENAME
+
             # Teilnehmerdaten einlesen
-            participants = read_participants(self.args.json_file)
-            if not participants:
+            participant_index = self.load_participant_index(self.args.json_file)
+            if not participant_index:
                 self.queue.put(('warning', "Keine Teilnehmerdaten gefunden."))
                 self.queue.put(('finished', None))
                 return
@@ -224,30 +348,111 @@ class Application(tk.Tk):
                 self.queue.put(('warning', f"LaTeX-Vorlagendatei für lange Namen '{self.args.long_name_template}' nicht gefunden. Standardvorlage wird verwendet."))
                 long_name_template = template
 
+            # Vorlagen einmal zerlegen und auf unbekannte Platzhalter prüfen
+            try:
+                template = compile_template(template)
+                long_name_template = compile_template(long_name_template)
+            except ValueError as e:
+                self.queue.put(('error', f"Ungültige LaTeX-Vorlage:\n{e}"))
+                self.queue.put(('finished', None))
+                return
+
             # Teilnehmer filtern
-            filtered_participants = filter_participants(participants,
-                                                        vorname=self.args.vorname,
-                                                        name=self.args.name,
-                                                        altersklasse=self.args.altersklasse,
-                                                        gewichtsklasse=self.args.gewichtsklasse)
+            filtered_participants = participant_index.filter(vorname=self.args.vorname,
+                                                             name=self.args.name,
+                                                             altersklasse=self.args.altersklasse,
+                                                             gewichtsklasse=self.args.gewichtsklasse)
             if not filtered_participants:
                 self.queue.put(('warning', "Keine Teilnehmer entsprechen den Filterkriterien."))
                 self.queue.put(('finished', None))
                 return
 
-            # Urkunden generieren
-            for participant in filtered_participants:
-                try:
-                    generate_certificate(participant, template, long_name_template,
-                                         self.args.output_dir, self.args.min_chars_for_long_template)
-                except Exception as e:
-                    self.queue.put(('error', f"Fehler beim Generieren der Urkunde für {participant['vorname']} {participant['name']}:\n{e}"))
+            # Verzeichnisse und Urkunden aller Teilnehmer, damit die Master-PDFs auch bei Filtern vollständig sind
+            layout = OutputLayout(self.args.output_dir, participant_index.participants)
+
+            # Bei inkrementellem Lauf nur geänderte Urkunden erzeugen
+            # Das Manifest wird immer fortgeschrieben, übersprungen wird nur im inkrementellen Modus
+            manifest = BuildManifest(self.args.output_dir)
+
+            # Druckdateien in Siegerehrungsreihenfolge; dann auch in dieser Reihenfolge generieren
+            spool = None
+            if self.args.print_spool:
+                filtered_participants = sort_for_ceremony(filtered_participants)
+                spool = PrintSpool(filtered_participants, self.args.output_dir, self.args.print_spool)
+
+            # Urkunden parallel generieren, Fehler pro Teilnehmer an die GUI melden
+            self.job = GenerationJob(self.args.output_dir, resume=self.args.resume)
+            daemon = None
+            if self.args.tex_daemon:
+                if self.tex_daemon is None or not self.tex_daemon.available:
+                    self.tex_daemon = TexDaemon(LATEX_PREAMBLE, pool_size=self.args.workers)
+                daemon = self.tex_daemon
+            elif self.tex_daemon is not None:
+                self.tex_daemon.close()
+                self.tex_daemon = None
+            failures = FailureReport()
+            # Fehler pro Urkunde sammeln und am Ende in einer Meldung zeigen statt in je einem Dialog
+            errors = []
+            try:
+                results = generate_certificates(filtered_participants, template, long_name_template,
+                                      self.args.output_dir, self.args.min_chars_for_long_template,
+                                      workers=self.args.workers,
+                                      batch_mode=self.args.batch_mode,
+                                      engine=self.args.engine,
+                                      batch_size=config.DEFAULT_BATCH_SIZE,
+                                      manifest=manifest,
+                                      incremental=self.args.incremental,
+                                      on_error=lambda participant, message: errors.append(message),
+                                      on_progress=lambda event: self.queue.put(('progress', event)),
+                                      on_result=spool.on_result if spool is not None else None,
+                                      job=self.job, daemon=daemon, layout=layout, failures=failures)
+            finally:
+                self.job.close()
+                # Fehlerbericht für die Nacharbeit, nur wenn es etwas zu berichten gibt; ein Bericht eines
+                # früheren Laufs würde sonst für diesen gehalten
+                failure_report_path = os.path.join(self.args.output_dir, FAILURE_REPORT_FILENAME)
+                if failures.entries:
+                    failures.write(failure_report_path)
+                elif os.path.exists(failure_report_path):
+                    os.remove(failure_report_path)
+            failure_summary = f"{failures.summary()}\nFehlerbericht: {failure_report_path}" if failures.entries else ""
+
+            # Nach einem Abbruch keine Master-PDFs erstellen, das Journal bleibt für die Fortsetzung erhalten
+            if self.job.cancelled:
+                if spool is not None:
+                    spool.discard()
+                manifest.save()
+                self.queue.put(('warning', "Generierung abgebrochen. Mit \"Abgebrochenen Lauf fortsetzen\" "
+                                           "werden beim nächsten Start nur die fehlenden Urkunden erzeugt."
+                                           + (f"\n\n{failure_summary}" if failure_summary else "")))
+                return
+            # Erst nach einem vollständigen Lauf, nach einer Ausnahme bleibt das Journal für die Fortsetzung erhalten
+            self.job.finish()
 
-            # Master-PDFs generieren
-            generate_master_certificates(self.args.output_dir)
+            if spool is not None:
+                spool.finish(results)
 
-            # Generierung abgeschlossen
-            self.queue.put(('info', "Urkunden wurden erfolgreich generiert!"))
+            # Master-PDFs generieren
+            if self.args.incremental:
+                # Veraltete Urkunden nur löschen, wenn alle Teilnehmer ungefiltert erzeugt wurden
+                if not any((self.args.vorname, self.args.name, self.args.altersklasse, self.args.gewichtsklasse)):
+                    manifest.prune()
+                manifest.save()
+                generate_master_certificates(self.args.output_dir, manifest.changed_files, layout=layout)
+            else:
+                manifest.save()
+                generate_master_certificates(self.args.output_dir, [result for result in results if result],
+                                             layout=layout)
+
+            # Generierung abgeschlossen, bei fehlgeschlagenen Urkunden nicht als Erfolg melden
+            if failures.failed or errors:
+                listed = errors[:MAX_LISTED_ERRORS]
+                if len(errors) > len(listed):
+                    listed.append(f"... und {len(errors) - len(listed)} weitere.")
+                self.queue.put(('partial', '\n\n'.join(part for part in ('\n'.join(listed), failure_summary) if part)))
+            else:
+                self.queue.put(('info', "Urkunden wurden erfolgreich generiert!"
+                                        + (f"\n\n{failure_summary}" if failure_summary else "")))
         except Exception as e:
             self.queue.put(('error', f"Es ist ein Fehler aufgetreten:\n{e}"))
         finally:
@@ -255,14 +460,28 @@ class Application(tk.Tk):
             self.queue.put(('finished', None))
 
     def check_queue(self):
+        # Nachrichten gesammelt abarbeiten; von mehreren Fortschrittsereignissen wird nur das letzte angezeigt,
+        # damit hohe Ereignisraten die Tk-Hauptschleife nicht ausbremsen
+        latest_progress = None
+        handled = 0
         try:
-            while True:
+            while handled < QUEUE_BATCH_SIZE:
                 msg_type, content = self.queue.get_nowait()
+                handled += 1
+                if msg_type == 'progress':
+                    latest_progress = content
+                    continue
+                if latest_progress is not None:
+                    self.show_progress(latest_progress)
+                    latest_progress = None
                 if msg_type == 'warning':
                     messagebox.showwarning("Warnung", content)
                 elif msg_type == 'error':
                     messagebox.showerror("Fehler", content)
                     self.status_label.config(text="Fehler bei der Generierung.", fg="red")
+                elif msg_type == 'partial':
+                    self.status_label.config(text="Generierung mit Fehlern abgeschlossen.", fg="red")
+                    messagebox.showwarning("Nicht alle Urkunden erzeugt", content)
                 elif msg_type == 'info':
                     self.status_label.config(text="Generierung abgeschlossen.", fg="green")
                     messagebox.showinfo("Erfolg", content)
@@ -270,10 +489,32 @@ class Application(tk.Tk):
                     self.finish_generation()
         except queue.Empty:
             pass
-        self.after(100, self.check_queue)
+        if latest_progress is not None:
+            self.show_progress(latest_progress)
+        # Liegen noch Nachrichten an, früher erneut nachsehen
+        self.after(10 if handled >= QUEUE_BATCH_SIZE else 100, self.check_queue)
+
+    def show_progress(self, event):
+        self.progress_bar.config(maximum=max(event['total'], 1), value=event['done'])
+        self.progress_label.config(text=format_progress(event))
+
+    def cancel_generation(self):
+        if self.job is not None:
+            self.job.cancel()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Breche ab...", fg="red")
+
+    def on_close(self):
+        if self.job is not None:
+            self.job.cancel()
+        if self.tex_daemon is not None:
+            self.tex_daemon.close()
+        self.destroy()
 
     def finish_generation(self):
         self.start_button.config(state=tk.NORMAL, text="Urkunden generieren")
+        self.cancel_button.config(state=tk.DISABLED)
+        self.job = None
         # Optional: Reset des Statuslabels, falls gewünscht
         # self.status_label.config(text="", fg="green")
 
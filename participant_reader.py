@@ -2,58 +2,248 @@
 
 import json
 import re
-from typing import List, Dict, Optional
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
-def read_participants(json_file: str, encoding: str = 'utf-8') -> List[Dict[str, Optional[str]]]:
+# Größe der Blöcke, in denen die Exportdatei gelesen wird
+READ_CHUNK_SIZE = 64 * 1024
+
+def iter_json_items(f: TextIO, jsonl: bool = False) -> Iterator[Dict]:
+    """
+    Liest die Einträge einer JSON-Datei nacheinander, ohne die ganze Datei auf einmal zu parsen.
+    Unterstützt ein JSON-Array von Objekten sowie JSON Lines (ein Objekt pro Zeile).
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_CHUNK_SIZE)
+    eof = not buffer
+    pos = 0
+
+    def skip_whitespace() -> None:
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            buffer, pos = f.read(READ_CHUNK_SIZE), 0
+            eof = not buffer
+
+    skip_whitespace()
+    if pos >= len(buffer):
+        # Leere Datei
+        return
+    if not jsonl and buffer[pos] != '[':
+        jsonl = True
+
+    if jsonl:
+        # JSON Lines: jede nicht-leere Zeile ist ein Objekt
+        rest = buffer[pos:]
+        while True:
+            *complete, rest = rest.split('\n')
+            for line in complete:
+                if line.strip():
+                    yield json.loads(line)
+            if eof:
+                break
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            rest += chunk
+        if rest.strip():
+            yield json.loads(rest)
+        return
+
+    # JSON-Array: öffnende Klammer überspringen und Objekt für Objekt dekodieren
+    pos += 1
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unerwartetes Dateiende im JSON-Array.")
+        if buffer[pos] == ']':
+            # Wie json.load: nach dem Array ist nur noch Leerraum erlaubt
+            pos += 1
+            skip_whitespace()
+            if pos < len(buffer):
+                raise ValueError(f"Unerwartete Daten nach dem JSON-Array: {buffer[pos:pos + 20]!r}")
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # Ein Objekt am Pufferende könnte unvollständig gelesen sein (z. B. eine Zahl)
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+        yield item
+        pos = end
+        skip_whitespace()
+        # Nach einem Objekt muss ein Komma oder das Ende des Arrays folgen
+        if pos >= len(buffer):
+            raise ValueError("Unerwartetes Dateiende im JSON-Array.")
+        if buffer[pos] == ',':
+            pos += 1
+            skip_whitespace()
+            if pos < len(buffer) and buffer[pos] == ']':
+                raise ValueError("Komma vor ']' im JSON-Array.")
+        elif buffer[pos] != ']':
+            raise ValueError(f"Komma oder ']' erwartet, gefunden: {buffer[pos]!r}.")
+
+@dataclass
+class Participant:
+    """Ein Teilnehmer mit den Daten, die auf der Urkunde erscheinen."""
+    __slots__ = ('name', 'vorname', 'verein', 'altersklasse', 'gewichtsklasse', 'platz')
+    name: str
+    vorname: str
+    verein: str
+    altersklasse: str
+    gewichtsklasse: str
+    platz: Optional[int]
+
+# 'category' parsen, wobei '-' oder '+' zur Gewichtsklasse gehören
+CATEGORY_PATTERN = re.compile(r'^(.+?)([-+].+)$')
+
+@lru_cache(maxsize=1024)
+def parse_category(category: str) -> Tuple[str, str]:
+    """
+    Zerlegt eine Kategorie wie 'MenU18 -23,0' in Alters- und Gewichtsklasse.
+    Pro Veranstaltung gibt es nur wenige Kategorien, daher wird das Ergebnis zwischengespeichert.
+    """
+    category = category.strip()
+    match = CATEGORY_PATTERN.match(category)
+    if match:
+        return match.group(1).strip(), match.group(2).strip()
+    # Falls kein Match, versuchen wir es mit einem Leerzeichen als Trennzeichen
+    category_parts = category.split(' ', 1)
+    if len(category_parts) == 2:
+        return category_parts[0].strip(), category_parts[1].strip()
+    return category, ''
+
+def normalize_participant(item: Dict) -> Participant:
+    """Wandelt einen Eintrag der Exportdatei in einen Teilnehmer um."""
+    pos = str(item.get('pos', '0')).strip()
+    altersklasse, gewichtsklasse = parse_category(item.get('category', ''))
+    return Participant(
+        name=item.get('last', '').strip().capitalize(),
+        vorname=item.get('first', '').strip().capitalize(),
+        verein=item.get('club', '').strip(),
+        altersklasse=altersklasse,
+        gewichtsklasse=gewichtsklasse,
+        platz=int(pos) if pos.isdigit() else None
+    )
+
+def iter_participants(json_file: str, encoding: str = 'utf-8') -> Iterator[Participant]:
+    """
+    Liest Teilnehmerdaten aus einer JSON- oder JSONL-Datei und gibt sie einzeln zurück,
+    sobald sie gelesen sind. Dateien mit der Endung '.jsonl' werden immer als JSON Lines gelesen.
+    """
+    with open(json_file, 'r', encoding=encoding) as f:
+        for item in iter_json_items(f, jsonl=json_file.lower().endswith('.jsonl')):
+            yield normalize_participant(item)
+
+def read_participants(json_file: str, encoding: str = 'utf-8') -> List[Participant]:
     """Liest Teilnehmerdaten aus einer JSON-Datei und gibt eine Liste von Teilnehmern zurück."""
     participants = []
     try:
-        with open(json_file, 'r', encoding=encoding) as f:
-            data = json.load(f)
-            for item in data:
-                participant = {
-                    'name': item.get('last', '').strip().capitalize(),
-                    'vorname': item.get('first', '').strip().capitalize(),
-                    'verein': item.get('club', '').strip(),
-                    'altersklasse': '',
-                    'gewichtsklasse': '',
-                    'platz': int(str(item.get('pos', '0')).strip()) if str(item.get('pos', '0')).strip().isdigit() else None
-                }
-                category = item.get('category', '').strip()
-                # 'category' parsen, wobei '-' oder '+' zur Gewichtsklasse gehören
-                match = re.match(r'^(.+?)([-+].+)$', category)
-                if match:
-                    participant['altersklasse'] = match.group(1).strip()
-                    participant['gewichtsklasse'] = match.group(2).strip()
-                else:
-                    # Falls kein Match, versuchen wir es mit einem Leerzeichen als Trennzeichen
-                    category_parts = category.split(' ', 1)
-                    if len(category_parts) == 2:
-                        participant['altersklasse'] = category_parts[0].strip()
-                        participant['gewichtsklasse'] = category_parts[1].strip()
-                    else:
-                        participant['altersklasse'] = category.strip()
-                        participant['gewichtsklasse'] = ''
-                participants.append(participant)
+        for participant in iter_participants(json_file, encoding):
+            participants.append(participant)
     except FileNotFoundError:
         print(f"Die JSON-Datei '{json_file}' wurde nicht gefunden.")
+    except ValueError as e:
+        # Ungültiges oder unvollständiges JSON: wie bisher keine Teilnehmer zurückgeben
+        print(f"Fehler beim Einlesen der JSON-Datei: {e}")
+        participants = []
     except Exception as e:
         print(f"Fehler beim Einlesen der JSON-Datei: {e}")
     return participants
 
-def filter_participants(participants: List[Dict[str, Optional[str]]],
+def filter_participants(participants: Iterable[Participant],
                         vorname: Optional[str] = None,
                         name: Optional[str] = None,
                         altersklasse: Optional[str] = None,
-                        gewichtsklasse: Optional[str] = None) -> List[Dict[str, Optional[str]]]:
-    """Filtert die Teilnehmerliste nach den angegebenen Kriterien."""
-    filtered = participants
-    if vorname:
-        filtered = [p for p in filtered if p['vorname'].lower() == vorname.lower()]
-    if name:
-        filtered = [p for p in filtered if p['name'].lower() == name.lower()]
-    if altersklasse:
-        filtered = [p for p in filtered if p['altersklasse'] == altersklasse]
-    if gewichtsklasse:
-        filtered = [p for p in filtered if p['gewichtsklasse'] == gewichtsklasse]
-    return filtered
\ No newline at end of file
+                        gewichtsklasse: Optional[str] = None) -> List[Participant]:
+    """
+    Filtert die Teilnehmer nach den angegebenen Kriterien.
+    Die Teilnehmer werden in einem Durchlauf geprüft, daher kann auch direkt iter_participants übergeben werden.
+    """
+    vorname = vorname.lower() if vorname else None
+    name = name.lower() if name else None
+    return [p for p in participants
+            if (not vorname or p.vorname.lower() == vorname)
+            and (not name or p.name.lower() == name)
+            and (not altersklasse or p.altersklasse == altersklasse)
+            and (not gewichtsklasse or p.gewichtsklasse == gewichtsklasse)]
+
+class ParticipantIndex:
+    """
+    Index über eine geladene Teilnehmerliste für wiederholte Filterabfragen.
+    Wird einmal pro geladener Datei erstellt; jede Abfrage schlägt nur in Hash-Tabellen nach,
+    statt die ganze Liste zu durchlaufen.
+    """
+
+    def __init__(self, participants: Iterable[Participant]):
+        self.participants: List[Participant] = list(participants)
+        self.by_vorname: Dict[str, List[int]] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        self.by_altersklasse: Dict[str, List[int]] = {}
+        self.by_gewichtsklasse: Dict[str, List[int]] = {}
+        self.by_full_name: Dict[str, List[int]] = {}
+        for index, participant in enumerate(self.participants):
+            self.by_vorname.setdefault(participant.vorname.casefold(), []).append(index)
+            self.by_name.setdefault(participant.name.casefold(), []).append(index)
+            self.by_altersklasse.setdefault(participant.altersklasse, []).append(index)
+            self.by_gewichtsklasse.setdefault(participant.gewichtsklasse, []).append(index)
+            self.by_full_name.setdefault(f"{participant.vorname} {participant.name}".casefold(), []).append(index)
+        # Sortierte Namen für die Präfixsuche per Binärsuche
+        self.sorted_full_names: List[str] = sorted(self.by_full_name)
+        self.sorted_names: List[str] = sorted(self.by_name)
+
+    def __len__(self) -> int:
+        return len(self.participants)
+
+    def filter(self, vorname: Optional[str] = None, name: Optional[str] = None,
+               altersklasse: Optional[str] = None, gewichtsklasse: Optional[str] = None) -> List[Participant]:
+        """Filtert wie filter_participants, aber über die Hash-Tabellen des Index."""
+        candidates = []
+        if vorname:
+            candidates.append(self.by_vorname.get(vorname.casefold(), []))
+        if name:
+            candidates.append(self.by_name.get(name.casefold(), []))
+        if altersklasse:
+            candidates.append(self.by_altersklasse.get(altersklasse, []))
+        if gewichtsklasse:
+            candidates.append(self.by_gewichtsklasse.get(gewichtsklasse, []))
+        if not candidates:
+            return list(self.participants)
+
+        # Mit der kleinsten Kandidatenliste beginnen und die übrigen als Mengen schneiden
+        candidates.sort(key=len)
+        matches = set(candidates[0])
+        for indices in candidates[1:]:
+            matches.intersection_update(indices)
+        return [self.participants[index] for index in sorted(matches)]
+
+    def search(self, text: str, substring: bool = False) -> List[Participant]:
+        """
+        Sucht Teilnehmer, deren 'Vorname Name' oder Nachname mit dem Text beginnt,
+        mit substring=True auch Teilnehmer, deren Name den Text enthält.
+        """
+        text = text.strip().casefold()
+        if not text:
+            return []
+        matches = set()
+        if substring:
+            for full_name, indices in self.by_full_name.items():
+                if text in full_name:
+                    matches.update(indices)
+        else:
+            for sorted_keys, table in ((self.sorted_full_names, self.by_full_name), (self.sorted_names, self.by_name)):
+                position = bisect_left(sorted_keys, text)
+                while position < len(sorted_keys) and sorted_keys[position].startswith(text):
+                    matches.update(table[sorted_keys[position]])
+                    position += 1
+        return [self.participants[index] for index in sorted(matches)]
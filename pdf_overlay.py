@@ -0,0 +1,611 @@
+# pdf_overlay.py
+#
+# Erzeugt Urkunden ohne LaTeX-Lauf pro Teilnehmer: Eine Vorlage aus dem einfachen Befehlsumfang von
+# urkunde_template.tex (center, \vspace, Schriftgrößen, \textbf, \scalebox) wird einmal in Textblöcke
+# und Abstände zerlegt. Die festen Teile setzt TeX einmal als Hintergrund (TexOverlayTemplate), dabei
+# werden die Positionen der Platzhalterzeilen vermerkt und deren Schriften eingebettet; pro Teilnehmer
+# werden nur noch die Felder in dieser Schrift auf den Hintergrund gestempelt. Der Hintergrund wird
+# zwischengespeichert und kann so auch auf Rechnern ohne TeX verwendet werden.
+#
+# Ist weder TeX noch ein gespeicherter Hintergrund vorhanden, wird die ganze Vorlage in Helvetica
+# (PDF-Standardschrift, kein Einbetten nötig) nach dem Seitenlayout von LATEX_PREAMBLE gesetzt
+# (OverlayTemplate).
+
+import contextlib
+import hashlib
+import importlib.util
+import os
+import re
+import shutil
+import string
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+import config
+from participant_reader import Participant
+from template_engine import CompiledTemplate, compile_template
+
+# Laufweiten der Standardschriften in 1/1000 Schriftgröße für WinAnsiEncoding (cp1252), Zeichen 32-126
+_HELVETICA_ASCII = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+_HELVETICA_BOLD_ASCII = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584]
+# Zeichen 128-159 (nicht belegte Codes erhalten die Breite des Aufzählungspunkts)
+_HELVETICA_WINDOWS = [
+    556, 350, 222, 556, 333, 1000, 556, 556, 333, 1000, 667, 333, 1000, 350, 611, 350,
+    350, 222, 222, 333, 333, 350, 556, 1000, 333, 1000, 500, 333, 944, 350, 500, 667]
+_HELVETICA_BOLD_WINDOWS = [
+    556, 350, 278, 556, 500, 1000, 556, 556, 333, 1000, 667, 333, 1000, 350, 611, 350,
+    350, 278, 278, 500, 500, 350, 556, 1000, 333, 1000, 556, 333, 944, 350, 500, 667]
+# Zeichen 160-255 (Latin-1, u. a. Umlaute und ß)
+_HELVETICA_LATIN = [
+    278, 333, 556, 556, 556, 556, 260, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+    400, 584, 333, 333, 333, 556, 537, 278, 333, 333, 365, 556, 834, 834, 834, 611,
+    667, 667, 667, 667, 667, 667, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278,
+    722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 500, 556, 556, 556, 556, 278, 278, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 584, 611, 556, 556, 556, 556, 500, 556, 500]
+_HELVETICA_BOLD_LATIN = [
+    278, 333, 556, 556, 556, 556, 280, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+    400, 584, 333, 333, 333, 611, 556, 278, 333, 333, 365, 556, 834, 834, 834, 611,
+    722, 722, 722, 722, 722, 722, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278,
+    722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 556, 556, 556, 556, 556, 278, 278, 278, 278,
+    611, 611, 611, 611, 611, 611, 611, 584, 611, 611, 611, 611, 611, 556, 611, 556]
+
+def _width_table(ascii_widths: List[int], windows_widths: List[int], latin_widths: List[int]) -> List[int]:
+    return [0] * 32 + ascii_widths + [350] + windows_widths + latin_widths
+
+# Ressourcenname, PostScript-Name und Laufweiten je Schriftschnitt (False = normal, True = fett)
+FONTS = {
+    False: ('F1', 'Helvetica', _width_table(_HELVETICA_ASCII, _HELVETICA_WINDOWS, _HELVETICA_LATIN)),
+    True: ('F2', 'Helvetica-Bold', _width_table(_HELVETICA_BOLD_ASCII, _HELVETICA_BOLD_WINDOWS, _HELVETICA_BOLD_LATIN)),
+}
+# Ober- und Unterlänge der Helvetica in Schriftgröße
+ASCENT = 0.718
+DESCENT = 0.207
+
+# Längeneinheiten in PDF-Punkten (bp)
+UNITS = {'bp': 1.0, 'pt': 72 / 72.27, 'mm': 72 / 25.4, 'cm': 72 / 2.54, 'in': 72.0}
+
+# Seitenlayout wie in LATEX_PREAMBLE: a4paper, left=8cm; geometry setzt den rechten Rand gleich
+# dem linken und oben und unten je 15 % der Seitenhöhe
+PAGE_WIDTH = 21.0 * UNITS['cm']
+PAGE_HEIGHT = 29.7 * UNITS['cm']
+TEXT_LEFT = 8.0 * UNITS['cm']
+TEXT_WIDTH = PAGE_WIDTH - 2 * TEXT_LEFT
+TEXT_TOP = 0.15 * PAGE_HEIGHT
+# Zeilenabstände der Klasse article mit 10pt: \topskip, \baselineskip und \lineskip
+TOPSKIP = 10 * UNITS['pt']
+BASELINESKIP = 12 * UNITS['pt']
+LINESKIP = 1 * UNITS['pt']
+
+# Schriftgrößen der Klasse article mit 10pt
+FONT_SIZES = {'small': 9.0, 'normalsize': 10.0, 'large': 12.0, 'Large': 14.4, 'LARGE': 17.28,
+              'huge': 20.74, 'Huge': 24.88}
+
+_SIZE = r'\\(' + '|'.join(FONT_SIZES) + r')(?![A-Za-z])'
+_INNER = r'\s*(?:' + _SIZE + r'\s*)?(?:\\textbf\{([^{}\\%]*)\}|([^{}\\%]*?))\s*'
+TOKEN_PATTERNS = [
+    ('paragraph', re.compile(r'[ \t]*\n(?:[ \t]*\n)+')),
+    ('space', re.compile(r'\s+')),
+    ('comment', re.compile(r'%[^\n]*')),
+    ('center', re.compile(r'\\(?:begin|end)\{center\}')),
+    ('vspace', re.compile(r'\\vspace(\*?)\{\s*([\d.]+)\s*(' + '|'.join(UNITS) + r')\s*\}')),
+    ('scalebox', re.compile(r'\\scalebox\{\s*([\d.]+)\s*\}\{' + _INNER + r'\}')),
+    ('group', re.compile(r'\{' + _INNER + r'\}')),
+    ('bold', re.compile(r'\\textbf\{([^{}\\%]*)\}')),
+    ('text', re.compile(r'[^\\{}%\s]+')),
+]
+
+@dataclass
+class TextRun:
+    """Text einer Zeile mit Schriftgröße (bereits skaliert) und Schnitt."""
+    text: str
+    size: float
+    bold: bool
+    # Mit \scalebox gesetzte Boxen können nicht umbrochen werden
+    breakable: bool = True
+    # Größenbefehl und Skalierung wie in der Vorlage, Anfang und Ende der Zeile im Vorlagentext
+    font_size: str = 'normalsize'
+    scale: float = 1.0
+    start: int = 0
+    end: int = 0
+
+@dataclass
+class VSpace:
+    length: float
+    # \vspace* bleibt auch am Seitenanfang erhalten
+    keep: bool
+
+@dataclass
+class Paragraph:
+    """Absatzende (Leerzeile)."""
+
+def parse_template(text: str) -> List[Union[TextRun, VSpace, Paragraph]]:
+    """
+    Zerlegt den Vorlagentext in Zeilen, Abstände und Absatzenden.
+    Löst ValueError aus, wenn die Vorlage Befehle außerhalb des unterstützten Umfangs enthält.
+    """
+    if '\\begin{center}' not in text:
+        raise ValueError("Nur Vorlagen mit center-Umgebung werden unterstützt.")
+    elements: List[Union[TextRun, VSpace, Paragraph]] = []
+    words: List[str] = []
+    style: Optional[Tuple[float, bool, bool, str, float]] = None
+    start = end = 0
+
+    def add_words(content: str, size: float, bold: bool, breakable: bool, font_size: str, scale: float,
+                  match: re.Match) -> None:
+        nonlocal style, start, end
+        if style is not None and style != (size, bold, breakable, font_size, scale):
+            raise ValueError("Unterschiedliche Schriften in einer Zeile werden nicht unterstützt.")
+        if style is None:
+            start = match.start()
+        style = (size, bold, breakable, font_size, scale)
+        end = match.end()
+        words.extend(content.replace('~', ' ').split())
+
+    def flush() -> None:
+        nonlocal style
+        if words:
+            elements.append(TextRun(' '.join(words), *style, start, end))
+        words.clear()
+        style = None
+
+    position = 0
+    while position < len(text):
+        for kind, pattern in TOKEN_PATTERNS:
+            match = pattern.match(text, position)
+            if match:
+                break
+        else:
+            snippet = text[position:position + 30].split('\n')[0]
+            raise ValueError(f"Nicht unterstützter LaTeX-Befehl: '{snippet}'")
+        position = match.end()
+
+        if kind == 'paragraph':
+            flush()
+            elements.append(Paragraph())
+        elif kind == 'vspace':
+            flush()
+            elements.append(VSpace(float(match.group(2)) * UNITS[match.group(3)], bool(match.group(1))))
+        elif kind == 'scalebox':
+            font_size = match.group(2) or 'normalsize'
+            scale = float(match.group(1))
+            add_words(match.group(3) if match.group(3) is not None else match.group(4),
+                      FONT_SIZES[font_size] * scale, match.group(3) is not None, False, font_size, scale, match)
+        elif kind == 'group':
+            font_size = match.group(1) or 'normalsize'
+            add_words(match.group(2) if match.group(2) is not None else match.group(3),
+                      FONT_SIZES[font_size], match.group(2) is not None, True, font_size, 1.0, match)
+        elif kind == 'bold':
+            add_words(match.group(1), FONT_SIZES['normalsize'], True, True, 'normalsize', 1.0, match)
+        elif kind == 'text':
+            add_words(match.group(0), FONT_SIZES['normalsize'], False, True, 'normalsize', 1.0, match)
+    flush()
+    return elements
+
+def encode_text(text: str) -> Optional[bytes]:
+    """Kodiert den Text in WinAnsiEncoding, gibt None zurück, falls ein Zeichen nicht darstellbar ist."""
+    try:
+        return text.encode('cp1252')
+    except UnicodeEncodeError:
+        return None
+
+def text_width(encoded: bytes, size: float, bold: bool) -> float:
+    """Breite eines kodierten Textes in PDF-Punkten."""
+    widths = FONTS[bold][2]
+    return sum(widths[code] for code in encoded) * size / 1000
+
+def wrap_text(text: str, size: float, bold: bool, breakable: bool) -> Optional[List[Tuple[bytes, float]]]:
+    """
+    Bricht einen Text wie TeX an Leerzeichen in Zeilen der Textbreite um und gibt die kodierten Zeilen
+    mit ihrer Breite zurück. Gibt None zurück, falls ein Zeichen nicht darstellbar ist.
+    """
+    encoded = encode_text(' '.join(text.replace('~', ' ').split()))
+    if encoded is None:
+        return None
+    width = text_width(encoded, size, bold)
+    if not breakable or width <= TEXT_WIDTH:
+        return [(encoded, width)]
+
+    lines: List[Tuple[bytes, float]] = []
+    space = text_width(b' ', size, bold)
+    current, current_width = b'', 0.0
+    for word in encoded.split(b' '):
+        word_width = text_width(word, size, bold)
+        if current and current_width + space + word_width > TEXT_WIDTH:
+            lines.append((current, current_width))
+            current, current_width = word, word_width
+        elif current:
+            current, current_width = current + b' ' + word, current_width + space + word_width
+        else:
+            current, current_width = word, word_width
+    if current:
+        lines.append((current, current_width))
+    return lines
+
+def escape_pdf_string(encoded: bytes) -> bytes:
+    return encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+def finish_pdf(header: bytes, offsets: Dict[int, int], objects: List[Tuple[int, bytes]], root: int) -> bytes:
+    """
+    Hängt Objekte an einen für alle Urkunden gleichen Dateianfang an und schreibt Querverweistabelle und
+    Trailer. offsets enthält die Dateipositionen der Objekte im Dateianfang.
+    """
+    output = bytearray(header)
+    offsets = dict(offsets)
+    for number, obj in objects:
+        offsets[number] = len(output)
+        output += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    size = max(offsets) + 1
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        output += b"%010d 00000 n \n" % offsets[number]
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, root, xref)
+    return bytes(output)
+
+def show_text(encoded: bytes, size: float, bold: bool, baseline: float, line_width: float) -> bytes:
+    """Gibt den Inhaltsstrom-Befehl für eine Zeile zurück, zentriert im Textbereich wie in der center-Umgebung."""
+    if line_width <= TEXT_WIDTH:
+        x = TEXT_LEFT + (TEXT_WIDTH - line_width) / 2
+    else:
+        # Überbreite Box: TeX setzt sie an den linken Rand und lässt sie rechts überstehen
+        x = TEXT_LEFT
+    resource = FONTS[bold][0]
+    return (b"BT /%s %.2f Tf %.2f %.2f Td (" % (resource.encode('ascii'), size, x, PAGE_HEIGHT - baseline)
+            + escape_pdf_string(encoded) + b") Tj ET\n")
+
+@dataclass
+class OverlayBlock:
+    """Ein Textblock der Vorlage: feste, bereits umbrochene Zeilen oder eine Zeile mit Platzhaltern."""
+    size: float
+    bold: bool
+    breakable: bool
+    lines: Optional[List[Tuple[bytes, float]]]
+    template: Optional[CompiledTemplate]
+
+class OverlayTemplate:
+    """
+    Eine für das direkte Schreiben von PDF-Seiten zerlegte Vorlage, gesetzt in Helvetica (ohne TeX).
+
+    Feste Texte werden beim Zerlegen einmal kodiert, gemessen und umbrochen, die für alle Urkunden
+    gleichen PDF-Objekte einmal geschrieben. Pro Teilnehmer werden nur die Platzhalterzeilen
+    gemessen und die Grundlinien mit den Abstandsregeln von TeX fortgeschrieben, da ein umbrochener
+    Name die folgenden Zeilen verschiebt. Enthält eine Platzhalterzeile ein in WinAnsiEncoding
+    nicht darstellbares Zeichen, gibt render() None zurück und die Urkunde muss mit LaTeX erzeugt werden.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.blocks: List[Union[OverlayBlock, VSpace]] = []
+        for element in parse_template(text):
+            if isinstance(element, VSpace):
+                self.blocks.append(element)
+            elif isinstance(element, TextRun):
+                run_template = compile_template(element.text)
+                if run_template.placeholders:
+                    self.blocks.append(OverlayBlock(element.size, element.bold, element.breakable, None, run_template))
+                    continue
+                lines = wrap_text(element.text, element.size, element.bold, element.breakable)
+                if lines is None:
+                    raise ValueError(f"Text '{element.text}' ist in WinAnsiEncoding nicht darstellbar.")
+                self.blocks.append(OverlayBlock(element.size, element.bold, element.breakable, lines, None))
+        self._header, self._offsets = self._build_header()
+
+    def _build_header(self) -> Tuple[bytes, Dict[int, int]]:
+        """Schreibt die für alle Urkunden gleichen Objekte 1-5 (Katalog, Seitenbaum, Seite, Schriften) einmal vor."""
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT),
+        ]
+        for bold in (False, True):
+            objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                           % FONTS[bold][1].encode('ascii'))
+        header = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = {}
+        for number, obj in enumerate(objects, start=1):
+            offsets[number] = len(header)
+            header += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+        return bytes(header), offsets
+
+    def layout(self, participant: Participant) -> Optional[bytes]:
+        """Setzt die Zeilen der Urkunde und gibt den Inhaltsstrom zurück (None, falls nicht darstellbar)."""
+        commands: List[bytes] = []
+        previous_baseline: Optional[float] = None
+        previous_depth = 0.0
+        pending_space = 0.0
+        keep_space = False
+        for block in self.blocks:
+            if isinstance(block, VSpace):
+                # Ein \vspace ohne Stern entfällt am Seitenanfang
+                if previous_baseline is not None or block.keep:
+                    pending_space += block.length
+                    keep_space = keep_space or block.keep
+                continue
+
+            lines = block.lines
+            if lines is None:
+                lines = wrap_text(block.template.render(participant), block.size, block.bold, block.breakable)
+                if lines is None:
+                    return None
+            height = block.size * ASCENT
+            for encoded, line_width in lines:
+                if previous_baseline is None:
+                    # Erste Zeile der Seite: \topskip, bei \vspace* vor einem leeren Absatz davor
+                    baseline = TEXT_TOP + (TOPSKIP + pending_space + height if keep_space else max(TOPSKIP, height))
+                else:
+                    baseline = previous_baseline + pending_space + max(BASELINESKIP, previous_depth + height + LINESKIP)
+                commands.append(show_text(encoded, block.size, block.bold, baseline, line_width))
+                previous_baseline = baseline
+                previous_depth = block.size * DESCENT
+                pending_space = 0.0
+                keep_space = False
+        return b''.join(commands)
+
+    def render(self, participant: Participant) -> Optional[bytes]:
+        """Gibt die Urkunde als einseitiges PDF zurück oder None, wenn sie mit LaTeX erzeugt werden muss."""
+        content = self.layout(participant)
+        if content is None:
+            return None
+        stream = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        return finish_pdf(self._header, self._offsets, [(6, stream)], 1)
+
+# Zeichen, die in Platzhalterzeilen auf einen TeX-Hintergrund gestempelt werden können, mit ihrem Code in der
+# T1-Kodierung (fontenc) der TeX-Schriften; ab 0xC0 entspricht T1 weitgehend Latin-1. TeX-Sonderzeichen und das
+# von babel aktive " fehlen, solche Namen werden wie bisher mit LaTeX gesetzt.
+T1_ENCODING: Dict[str, int] = {character: ord(character) for character in
+                               string.ascii_letters + string.digits + "!'()*+,-./:;=?@[]"}
+for _first, _characters in ((0x80, 'ĂĄĆČĎĚĘĞĹĽŁŃŇŊŐŔŘŚŠŞŤŢŰŮŸŹŽŻ'), (0xA0, 'ăąćčďěęğĺľłńňŋőŕřśšşťţűůÿźžż'),
+                            (0xC0, 'ÀÁÂÃÄÅÆÇÈÉÊËÌÍÎÏÐÑÒÓÔÕÖŒØÙÚÛÜÝÞ'), (0xE0, 'àáâãäåæçèéêëìíîïðñòóôõöœøùúûüýþß')):
+    T1_ENCODING.update((character, _first + offset) for offset, character in enumerate(_characters))
+
+# TeX-Positionen (\pdflastxpos, \pdflastypos, \dimen) in sp -> PDF-Punkte
+SP = 72 / 72.27 / 65536
+
+# Zusätze zum Vorspann für den Hintergrund: \UrkundenFeld setzt statt einer Platzhalterzeile eine leere Zeile
+# mit fester Höhe (wie die Overlay-Engine ohne TeX) und schreibt beim Ausgeben der Seite Seitenzahl, Position
+# (Mitte der Zeile auf der Grundlinie) und Zeilenbreite nach <jobname>.felder. \UrkundenMuster setzt auf einer
+# eigenen Seite alle Zeichen von T1_ENCODING in der Schrift des Feldes, damit sie eingebettet werden, und
+# vermerkt den Wortabstand (\fontdimen2) der Schrift.
+BACKGROUND_MACROS = r"""
+\newwrite\UrkundenFelder
+\immediate\openout\UrkundenFelder=\jobname.felder
+\newcommand\UrkundenFeld[3]{\leavevmode\scalebox{#3}{#2\vphantom{Hg}}\pdfsavepos
+  \edef\UrkundenPosition{\write\UrkundenFelder{feld #1 \noexpand\number\noexpand\value{page}
+    \noexpand\the\noexpand\pdflastxpos\space\noexpand\the\noexpand\pdflastypos\space\number\linewidth}}%
+  \UrkundenPosition}
+\newcommand\UrkundenMuster[3]{\newpage\noindent\hbox{#2\immediate\write\UrkundenFelder{schrift #1 \number\fontdimen2\font}#3}}
+"""
+
+def get_field_runs(elements: List[Union[TextRun, VSpace, Paragraph]]) -> List[TextRun]:
+    """Gibt die Zeilen der Vorlage zurück, die Platzhalter enthalten."""
+    return [element for element in elements
+            if isinstance(element, TextRun) and compile_template(element.text).placeholders]
+
+def get_font_switch(run: TextRun) -> str:
+    return '\\' + run.font_size + ('\\bfseries' if run.bold else '')
+
+def build_background_document(text: str, runs: List[TextRun], preamble: str) -> str:
+    """Setzt das LaTeX-Dokument für den Hintergrund zusammen: Vorlage ohne Platzhalterzeilen, dann die Musterseiten."""
+    parts = [preamble, BACKGROUND_MACROS, '\\begin{document}\n']
+    position = 0
+    for number, run in enumerate(runs):
+        parts.append(text[position:run.start])
+        parts.append(f"\\UrkundenFeld{{{number}}}{{{get_font_switch(run)}}}{{{run.scale:g}}}")
+        position = run.end
+    parts.append(text[position:] + '\n')
+    sample = ''.join(f"\\char{code}" for code in sorted(set(T1_ENCODING.values())))
+    for number, run in enumerate(runs):
+        parts.append(f"\\UrkundenMuster{{{number}}}{{{get_font_switch(run)}}}{{{sample}}}\n")
+    parts.append('\\end{document}\n')
+    return ''.join(parts)
+
+# Verhindert, dass mehrere Worker-Threads gleichzeitig denselben Hintergrund erzeugen
+_lock = threading.Lock()
+
+def get_background(document: str, cache_dir: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """
+    Gibt die Pfade von Hintergrund-PDF und Positionsdatei zurück und setzt den Hintergrund bei Bedarf mit
+    pdflatex. Der Name hängt nur vom Dokument ab, ein gespeicherter Hintergrund kann daher auf Rechner ohne
+    TeX kopiert werden. Gibt None zurück, falls der Hintergrund nicht erzeugt werden kann.
+    """
+    cache_dir = cache_dir or config.OVERLAY_CACHE_DIR
+    name = 'hintergrund_' + hashlib.sha256(document.encode('utf-8')).hexdigest()[:16]
+    pdf_path = os.path.join(cache_dir, name + '.pdf')
+    positions_path = os.path.join(cache_dir, name + '.felder')
+    with _lock:
+        if os.path.exists(pdf_path) and os.path.exists(positions_path):
+            return pdf_path, positions_path
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory() as tempdir:
+            with open(os.path.join(tempdir, name + '.tex'), 'w', encoding='utf-8') as f:
+                f.write(document)
+            try:
+                subprocess.run(['pdflatex', '-interaction=nonstopmode', name + '.tex'], cwd=tempdir, check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except (OSError, subprocess.CalledProcessError):
+                return None
+            # Positionsdatei zuerst, die PDF-Datei zeigt einen vollständigen Hintergrund an. Fehlt eine der
+            # Dateien, obwohl pdflatex erfolgreich war (z. B. ein anderes Programm unter diesem Namen), gibt
+            # es keinen Hintergrund
+            try:
+                for extension, destination in (('.felder', positions_path), ('.pdf', pdf_path)):
+                    shutil.copyfile(os.path.join(tempdir, name + extension), destination + '.tmp')
+                    os.replace(destination + '.tmp', destination)
+            except OSError:
+                with contextlib.suppress(OSError):
+                    os.remove(positions_path)
+                return None
+    print(f"Hintergrund der Vorlage in '{pdf_path}' gespeichert.")
+    return pdf_path, positions_path
+
+def read_positions(positions_path: str) -> Tuple[Dict[int, Tuple[int, float, float, float]], Dict[int, float]]:
+    """Liest Seite, Position und Zeilenbreite der Felder sowie den Wortabstand ihrer Schriften (in PDF-Punkten)."""
+    positions: Dict[int, Tuple[int, float, float, float]] = {}
+    spaces: Dict[int, float] = {}
+    with open(positions_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            values = line.split()
+            if values and values[0] == 'feld':
+                positions[int(values[1])] = (int(values[2]), int(values[3]) * SP, int(values[4]) * SP,
+                                             int(values[5]) * SP)
+            elif values and values[0] == 'schrift':
+                spaces[int(values[1])] = int(values[2]) * SP
+    return positions, spaces
+
+TF_PATTERN = re.compile(rb'/([^\s/]+)\s+([\d.]+)\s+Tf')
+
+@dataclass
+class TexField:
+    """Eine Platzhalterzeile auf dem TeX-Hintergrund mit der Schrift, in der sie gestempelt wird."""
+    template: CompiledTemplate
+    breakable: bool
+    # Mitte der Zeile auf der Grundlinie und Zeilenbreite
+    x: float
+    y: float
+    line_width: float
+    resource: bytes
+    # Schriftgröße (bereits skaliert), Breite der Zeichen je Schriftgröße und Wortabstand
+    size: float
+    widths: Dict[int, float]
+    space: float
+
+class TexOverlayTemplate:
+    """
+    Eine Vorlage, deren feste Teile einmal mit TeX als Hintergrund gesetzt wurden.
+
+    Der Hintergrund wird einmal als Form-XObject mit den eingebetteten Schriften der Felder an den Anfang
+    der PDF-Datei geschrieben. Pro Teilnehmer werden nur die Platzhalterzeilen in der TeX-Schrift an die
+    von TeX vermerkten Positionen gesetzt (ohne Unterschneidung und Ligaturen). Gibt render() None zurück
+    (Zeichen außerhalb von T1_ENCODING oder eine Zeile, die TeX umbrechen würde), muss die Urkunde mit
+    LaTeX erzeugt werden; sie sieht dann gleich aus, da dieselben Schriften verwendet werden.
+    """
+
+    def __init__(self, text: str, runs: List[TextRun], pdf_path: str, positions_path: str):
+        # PyPDF2 erst bei Bedarf laden, die Overlay-Engine ohne TeX kommt ohne aus
+        from PyPDF2 import PdfReader
+        from pdf_stream import StreamingPdfWriter
+
+        self.text = text
+        positions, spaces = read_positions(positions_path)
+        reader = PdfReader(pdf_path)
+        if len(reader.pages) != len(runs) + 1 or any(positions.get(number, (0,))[0] != 1 for number in range(len(runs))):
+            raise ValueError("Der Hintergrund der Vorlage ist länger als eine Seite.")
+
+        writer = StreamingPdfWriter()
+        background, _, _ = writer.add_form(reader.pages[0])
+        fonts = []
+        self.fields: List[TexField] = []
+        for number, run in enumerate(runs):
+            # Die Musterseite enthält nur die Schrift des Feldes
+            sample_page = reader.pages[number + 1]
+            match = TF_PATTERN.search(sample_page.get_contents().get_data())
+            if match is None or number not in spaces:
+                raise ValueError("Die Schrift eines Platzhalters fehlt im Hintergrund.")
+            font_reference = sample_page['/Resources']['/Font'].raw_get('/' + match.group(1).decode('ascii'))
+            font = font_reference.get_object()
+            matrix = font.get('/FontMatrix')
+            unit = float(matrix[0]) if matrix is not None else 0.001
+            widths = {int(font['/FirstChar']) + code: float(width) * unit
+                      for code, width in enumerate(font['/Widths']) if float(width) > 0}
+            fonts.append(writer.add_object(font_reference))
+            _, x, y, line_width = positions[number]
+            self.fields.append(TexField(compile_template(run.text), run.breakable, x, y, line_width,
+                                        b"U%d" % (number + 1), float(match.group(2)) * run.scale, widths,
+                                        spaces[number] * run.scale))
+
+        self._header, self._offsets, self._pages_number = writer.snapshot()
+        self._media_box = b" ".join(b"%.2f" % float(value) for value in reader.pages[0].mediabox)
+        self._resources = (b"<< /XObject << /Hg %d 0 R >> /Font << " % background
+                           + b" ".join(b"/U%d %d 0 R" % (number, font) for number, font in enumerate(fonts, start=1))
+                           + b" >> >>")
+        self._next_number = max(max(self._offsets), self._pages_number) + 1
+
+    def layout(self, participant: Participant) -> Optional[bytes]:
+        """Gibt den Inhaltsstrom mit Hintergrund und Feldern zurück (None, falls nicht darstellbar)."""
+        commands = [b"q /Hg Do Q\n"]
+        for field in self.fields:
+            words = []
+            for word in field.template.render(participant).replace('~', ' ').split():
+                codes = [T1_ENCODING.get(character) for character in word]
+                if None in codes or any(code not in field.widths for code in codes):
+                    return None
+                words.append(bytes(codes))
+            if not words:
+                continue
+            width = (sum(field.widths[code] for word in words for code in word) * field.size
+                     + field.space * (len(words) - 1))
+            if width <= field.line_width:
+                x = field.x - width / 2
+            elif field.breakable:
+                # TeX würde die Zeile umbrechen und alles Folgende verschieben
+                return None
+            else:
+                # Überbreite Box: TeX setzt sie an den linken Rand und lässt sie rechts überstehen
+                x = field.x - field.line_width / 2
+            # Wortabstände als Verschiebung im TJ-Operator, in 1/1000 der Schriftgröße
+            gap = b" %.1f " % (-field.space / field.size * 1000)
+            commands.append(b"BT /%s %.4f Tf %.2f %.2f Td [" % (field.resource, field.size, x, field.y)
+                            + gap.join(b"(" + escape_pdf_string(word) + b")" for word in words) + b"] TJ ET\n")
+        return b''.join(commands)
+
+    def render(self, participant: Participant) -> Optional[bytes]:
+        """Gibt die Urkunde als einseitiges PDF zurück oder None, wenn sie mit LaTeX erzeugt werden muss."""
+        content = self.layout(participant)
+        if content is None:
+            return None
+        content_number, page_number, catalog_number = range(self._next_number, self._next_number + 3)
+        return finish_pdf(self._header, self._offsets, [
+            (content_number, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"),
+            (page_number, b"<< /Type /Page /Parent %d 0 R /MediaBox [%s] /Resources %s /Contents %d 0 R >>"
+             % (self._pages_number, self._media_box, self._resources, content_number)),
+            (self._pages_number, b"<< /Type /Pages /Kids [%d 0 R] /Count 1 >>" % page_number),
+            (catalog_number, b"<< /Type /Catalog /Pages %d 0 R >>" % self._pages_number),
+        ], catalog_number)
+
+def load_tex_overlay_template(text: str, preamble: str) -> Optional[TexOverlayTemplate]:
+    """
+    Setzt den Hintergrund einer Vorlage mit TeX oder lädt ihn aus dem Zwischenspeicher. Gibt None zurück,
+    wenn weder TeX noch ein gespeicherter Hintergrund oder PyPDF2 verfügbar ist.
+    Löst ValueError aus, wenn die Vorlage nur mit LaTeX gesetzt werden kann.
+    """
+    runs = get_field_runs(parse_template(text))
+    if importlib.util.find_spec('PyPDF2') is None:
+        return None
+    background = get_background(build_background_document(text, runs, preamble))
+    if background is None:
+        return None
+    return TexOverlayTemplate(text, runs, *background)
+
+@lru_cache(maxsize=16)
+def get_overlay_template(text: str, preamble: str) -> Optional[Union[TexOverlayTemplate, OverlayTemplate]]:
+    """
+    Zerlegt eine Vorlage für die Overlay-Engine: mit TeX-Hintergrund, ohne TeX in Helvetica.
+    Gibt None zurück, wenn sie nur mit LaTeX gesetzt werden kann.
+    """
+    try:
+        overlay = load_tex_overlay_template(text, preamble)
+        if overlay is not None:
+            return overlay
+        print("Hintergrund der Vorlage konnte nicht mit TeX gesetzt werden, die Overlay-Engine setzt sie in Helvetica.")
+        return OverlayTemplate(text)
+    except ValueError as e:
+        print(f"Vorlage wird mit LaTeX gesetzt, die Overlay-Engine unterstützt sie nicht: {e}")
+        return None
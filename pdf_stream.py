@@ -0,0 +1,237 @@
+# pdf_stream.py
+
+import hashlib
+import io
+import os
+import zlib
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# Quellobjekt (Objektnummer, Generation) -> Objektnummer in der Ausgabedatei
+ObjectMapping = Dict[Tuple[int, int], int]
+
+class StreamingPdfWriter:
+    """
+    Schreibt eine PDF-Datei seitenweise: Jede angehängte Seite wird mit allen von ihr referenzierten
+    Objekten sofort in die Ausgabedatei geschrieben, statt wie PdfMerger alle Seiten bis zum Schluss
+    im Speicher zu halten. Im Speicher bleiben nur Dateipositionen, Seitennummern und die Hashes
+    bereits geschriebener Objekte.
+
+    Identische Objekte werden anhand des Hashes ihrer Darstellung erkannt und nur einmal geschrieben.
+    Da referenzierte Objekte vor dem verweisenden Objekt geschrieben und dabei bereits zusammengelegt
+    werden, verweisen gleiche Schriften, Schriftbeschreibungen und Ressourcen-Dictionaries verschiedener
+    Urkunden auf dieselben Objekte und werden dadurch selbst identisch (wie in einem Merkle-Baum).
+    So wird z. B. dieselbe eingebettete Schrift oder dasselbe Logo nur einmal pro Master-PDF gespeichert.
+    Seiten werden nie zusammengelegt. shared_objects und bytes_saved geben die Einsparung an.
+
+    Die Datei entsteht unter einem temporären Namen und ersetzt das Ziel erst in close().
+    Ohne path wird in den Speicher geschrieben, der Anfang einer Datei kann dann mit snapshot()
+    als Vorlage für viele gleichartige Dateien übernommen werden (siehe pdf_overlay.py).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.temp_path = path + '.tmp' if path is not None else None
+        self._file = open(self.temp_path, 'wb') if path is not None else io.BytesIO()
+        self._file.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets: Dict[int, int] = {}
+        self._object_count = 0
+        self._hashes: Dict[bytes, int] = {}
+        self.shared_objects = 0
+        self.bytes_saved = 0
+        self._page_numbers: List[int] = []
+        # Der Seitenbaum wird erst in close() geschrieben, seine Nummer wird aber in jeder Seite gebraucht
+        self._pages_number = self._allocate()
+
+    def _allocate(self) -> int:
+        self._object_count += 1
+        return self._object_count
+
+    def _write_object(self, number: int, data: bytes) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % number)
+        self._file.write(data)
+        self._file.write(b"\nendobj\n")
+
+    def _store(self, data: bytes) -> int:
+        """Schreibt ein Objekt und gibt seine Nummer zurück; ein identisches Objekt wird wiederverwendet."""
+        key = hashlib.sha256(data).digest()
+        number = self._hashes.get(key)
+        if number is not None:
+            self.shared_objects += 1
+            self.bytes_saved += len(data)
+            return number
+        number = self._allocate()
+        self._write_object(number, data)
+        self._hashes[key] = number
+        return number
+
+    @staticmethod
+    def _serialize(obj) -> bytes:
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def _copy(self, obj, mapping: ObjectMapping, in_progress: Set[Tuple[int, int]]):
+        """Kopiert ein direktes Objekt und schreibt dabei alle referenzierten Objekte in die Ausgabedatei."""
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+
+        if isinstance(obj, IndirectObject):
+            return self._copy_reference(obj, mapping, in_progress)
+        if isinstance(obj, StreamObject):
+            copy = StreamObject()
+            # Die Daten werden unverändert (weiterhin komprimiert) übernommen, die Länge setzt write_to_stream
+            copy._data = obj._data
+            for key, value in obj.items():
+                if key != '/Length':
+                    copy[NameObject(key)] = self._copy(value, mapping, in_progress)
+            return copy
+        if isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+            for key, value in obj.items():
+                copy[NameObject(key)] = self._copy(value, mapping, in_progress)
+            return copy
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value, mapping, in_progress) for value in obj)
+        return obj
+
+    def _copy_reference(self, reference, mapping: ObjectMapping, in_progress: Set[Tuple[int, int]]):
+        """Schreibt ein indirektes Objekt der Quelle (einmal pro Quelle) und gibt die neue Referenz zurück."""
+        from PyPDF2.generic import IndirectObject
+
+        key = (reference.idnum, reference.generation)
+        if key not in mapping and key in in_progress:
+            # Zyklische Referenz: Nummer vorab vergeben, das Objekt wird nach dem Kopieren dort geschrieben
+            mapping[key] = self._allocate()
+        if key in mapping:
+            return IndirectObject(mapping[key], 0, None)
+
+        in_progress.add(key)
+        obj = reference.get_object()
+        data = self._serialize(self._copy(obj, mapping, in_progress))
+        in_progress.discard(key)
+        if key in mapping:
+            # Objekte in Zyklen haben ihre Nummer schon vergeben und werden nicht zusammengelegt
+            self._write_object(mapping[key], data)
+        else:
+            mapping[key] = self._store(data)
+        return IndirectObject(mapping[key], 0, None)
+
+    def append(self, reader) -> None:
+        """Hängt alle Seiten eines PdfReader an und schreibt sie sofort."""
+        from PyPDF2.generic import DictionaryObject, IndirectObject, NameObject
+
+        mapping: ObjectMapping = {}
+        in_progress: Set[Tuple[int, int]] = set()
+        pages = list(reader.pages)
+        # Alle Seiten erhalten ihre Nummer vorab, damit Verweise auf Seiten (z. B. aus Annotationen) auf sie zeigen
+        numbers = [self._allocate() for _ in pages]
+        for page, number in zip(pages, numbers):
+            if page.indirect_ref is not None:
+                mapping[(page.indirect_ref.idnum, page.indirect_ref.generation)] = number
+        for page, number in zip(pages, numbers):
+            # Ohne /Parent kopieren, sonst würde der ganze Seitenbaum der Quelle mitgeschrieben
+            copy = DictionaryObject()
+            for key, value in page.items():
+                if key != '/Parent':
+                    copy[NameObject(key)] = self._copy(value, mapping, in_progress)
+            copy[NameObject('/Parent')] = IndirectObject(self._pages_number, 0, None)
+            self._write_object(number, self._serialize(copy))
+            self._page_numbers.append(number)
+
+    def add_object(self, reference) -> int:
+        """Schreibt ein indirektes Objekt einer Quelldatei samt allen referenzierten Objekten, gibt seine Nummer zurück."""
+        return self._copy_reference(reference, {}, set()).idnum
+
+    def snapshot(self) -> Tuple[bytes, Dict[int, int], int]:
+        """
+        Gibt bei Ausgabe in den Speicher die bisher geschriebenen Bytes, die Dateipositionen der geschriebenen
+        Objekte und die Nummer des noch nicht geschriebenen Seitenbaums zurück.
+        """
+        return self._file.getvalue(), dict(self._offsets), self._pages_number
+
+    def _write_page(self, media_box: Sequence[float], content: bytes, xobjects: Dict[str, int]) -> None:
+        resources = b""
+        if xobjects:
+            resources = b" /Resources << /XObject << " + b" ".join(
+                b"/%s %d 0 R" % (name.encode('ascii'), number) for name, number in xobjects.items()) + b" >> >>"
+        content_number = self._store(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        number = self._allocate()
+        self._write_object(number, b"<< /Type /Page /Parent %d 0 R /MediaBox [%s] /Contents %d 0 R%s >>"
+                           % (self._pages_number, b" ".join(b"%.2f" % value for value in media_box),
+                              content_number, resources))
+        self._page_numbers.append(number)
+
+    def append_blank_page(self, media_box: Sequence[float]) -> None:
+        """Hängt eine leere Seite an, z. B. als Rückseite beim Duplexdruck."""
+        self._write_page(media_box, b"", {})
+
+    def add_form(self, page) -> Tuple[int, float, float]:
+        """
+        Schreibt eine Seite als Form-XObject, das auf anderen Seiten platziert werden kann.
+        Gibt Objektnummer, Breite und Höhe zurück.
+        """
+        from PyPDF2.generic import ArrayObject, FloatObject, NameObject, StreamObject
+
+        contents = page.get('/Contents')
+        contents = contents.get_object() if contents is not None else None
+        if contents is None:
+            data = b""
+        elif isinstance(contents, ArrayObject):
+            data = b"\n".join(part.get_object().get_data() for part in contents)
+        else:
+            data = contents.get_data()
+        box = [float(value) for value in page.mediabox]
+
+        mapping: ObjectMapping = {}
+        in_progress: Set[Tuple[int, int]] = set()
+        form = StreamObject()
+        form._data = zlib.compress(data)
+        form[NameObject('/Filter')] = NameObject('/FlateDecode')
+        form[NameObject('/Type')] = NameObject('/XObject')
+        form[NameObject('/Subtype')] = NameObject('/Form')
+        form[NameObject('/BBox')] = self._copy(page.mediabox, mapping, in_progress)
+        if box[0] or box[1]:
+            # Untere linke Ecke der Seite in den Ursprung verschieben
+            form[NameObject('/Matrix')] = ArrayObject(FloatObject(value) for value in (1, 0, 0, 1, -box[0], -box[1]))
+        if '/Resources' in page:
+            form[NameObject('/Resources')] = self._copy(page.raw_get('/Resources'), mapping, in_progress)
+        return self._store(self._serialize(form)), box[2] - box[0], box[3] - box[1]
+
+    def append_imposed_page(self, media_box: Sequence[float],
+                            placements: Sequence[Tuple[int, float, float, float]]) -> None:
+        """Hängt eine Seite an, auf der Form-XObjects (Nummer, Skalierung, x, y) platziert werden."""
+        xobjects = {}
+        commands = []
+        for position, (number, scale, x, y) in enumerate(placements, start=1):
+            name = f"Fm{position}"
+            xobjects[name] = number
+            commands.append(b"q %.4f 0 0 %.4f %.2f %.2f cm /%s Do Q" % (scale, scale, x, y, name.encode('ascii')))
+        self._write_page(media_box, b"\n".join(commands), xobjects)
+
+    def discard(self) -> None:
+        """Bricht das Schreiben ab und entfernt die temporäre Datei."""
+        self._file.close()
+        if self.temp_path is not None and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_numbers)
+
+    def close(self) -> None:
+        """Schreibt Seitenbaum, Katalog und Querverweistabelle und ersetzt die Zieldatei."""
+        kids = b" ".join(b"%d 0 R" % number for number in self._page_numbers)
+        self._write_object(self._pages_number, b"<< /Type /Pages /Kids [" + kids
+                           + b"] /Count %d >>" % len(self._page_numbers))
+        catalog_number = self._allocate()
+        self._write_object(catalog_number, b"<< /Type /Catalog /Pages %d 0 R >>" % self._pages_number)
+
+        xref = self._file.tell()
+        self._file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (self._object_count + 1))
+        for number in range(1, self._object_count + 1):
+            self._file.write(b"%010d 00000 n \n" % self._offsets[number])
+        self._file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                         % (self._object_count + 1, catalog_number, xref))
+        self._file.close()
+        if self.path is not None:
+            os.replace(self.temp_path, self.path)
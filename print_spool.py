@@ -0,0 +1,228 @@
+# print_spool.py
+
+import os
+import queue
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+from participant_reader import Participant
+from utilities import sanitize_filename
+
+# Seitenanordnung der Druckdateien: eine Urkunde pro Blatt, mit leerer Rückseite für Duplexdrucker
+# oder zwei verkleinerte Urkunden nebeneinander auf einem Querformatblatt
+SPOOL_LAYOUTS = config.SPOOL_LAYOUTS
+SPOOL_LAYOUT_SIMPLE, SPOOL_LAYOUT_DUPLEX, SPOOL_LAYOUT_TWO_UP = SPOOL_LAYOUTS
+
+SPOOL_FILENAME = 'druck_{}.pdf'
+
+WEIGHT_CLASS_PATTERN = re.compile(r'^\s*([+-]?)\s*(\d+)(?:[.,](\d+))?')
+
+def weight_class_key(gewichtsklasse: str) -> Tuple:
+    """Sortiert Gewichtsklassen wie bei der Siegerehrung: aufsteigend nach Gewicht, offene Klassen (+) zuletzt."""
+    match = WEIGHT_CLASS_PATTERN.match(gewichtsklasse)
+    if not match:
+        return (2, 0.0, gewichtsklasse)
+    weight = float(f"{match.group(2)}.{match.group(3) or 0}")
+    return (1 if match.group(1) == '+' else 0, weight, gewichtsklasse)
+
+def ceremony_sort_key(participant: Participant) -> Tuple:
+    """Reihenfolge der Siegerehrung: Altersklasse, Gewichtsklasse, Platz (ohne Platz zuletzt), Name."""
+    return (participant.altersklasse, weight_class_key(participant.gewichtsklasse),
+            participant.platz is None, participant.platz or 0, participant.name, participant.vorname)
+
+def sort_for_ceremony(participants: List[Participant]) -> List[Participant]:
+    return sorted(participants, key=ceremony_sort_key)
+
+def get_spool_path(altersklasse: str, output_dir: str) -> str:
+    return os.path.join(output_dir, SPOOL_FILENAME.format(sanitize_filename(altersklasse) or 'unbekannt'))
+
+class SpoolBlock:
+    """Druckdatei eines Siegerehrungsblocks (einer Altersklasse) mit den Urkunden in Ehrungsreihenfolge."""
+
+    def __init__(self, altersklasse: str, path: str):
+        self.altersklasse = altersklasse
+        self.path = path
+        self.positions: List[int] = []
+        self.cursor = 0
+        self.writer = None
+        # Beim 2-auf-1-Druck wartet die linke Urkunde auf ihre rechte Nachbarin
+        self.pending_form: Optional[Tuple[int, float, float]] = None
+        self.pages = 0
+        # closed: Abschluss wurde an den Schreib-Thread übergeben, failed: Schreiben ist fehlgeschlagen
+        self.closed = False
+        self.failed = False
+
+class PrintSpool:
+    """
+    Erstellt pro Siegerehrungsblock (Altersklasse) eine Druckdatei mit allen Urkunden in der
+    Reihenfolge der Ehrung, nach Gewichtsklasse und Platz sortiert.
+
+    Die Urkunden werden angehängt, sobald sie fertig sind und alle vorherigen Urkunden des Blocks
+    geschrieben wurden; on_result kann direkt an generate_certificates übergeben werden. Werden die
+    Teilnehmer in Ehrungsreihenfolge generiert (sort_for_ceremony), ist die Druckdatei des ersten
+    Blocks fertig und kann gedruckt werden, während die folgenden Blöcke noch erzeugt werden.
+    on_block wird mit dem Pfad jeder fertigen Druckdatei aufgerufen.
+
+    Die Worker-Threads schreiben unter der Sperre nur die Reihenfolge fort; Lesen und Anhängen der
+    PDF-Dateien übernimmt ein eigener Schreib-Thread, sodass kein Worker auf das Schreiben wartet.
+    """
+
+    def __init__(self, participants: List[Participant], output_dir: str, layout: str = SPOOL_LAYOUT_SIMPLE,
+                 on_block: Optional[Callable[[str], None]] = None):
+        if layout not in SPOOL_LAYOUTS:
+            raise ValueError(f"Unbekannte Seitenanordnung '{layout}'.")
+        self.participants = participants
+        self.layout = layout
+        self.on_block = on_block
+        self.results: Dict[int, Optional[str]] = {}
+        self.completed: List[str] = []
+        self._lock = threading.Lock()
+        # Aufträge an den Schreib-Thread: Block, anzuhängende Urkunden, Block abschließen; None beendet ihn
+        self._queue: queue.Queue = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._discarded = False
+
+        self.blocks: Dict[str, SpoolBlock] = {}
+        self._block_of: Dict[int, SpoolBlock] = {}
+        self._position_of: Dict[int, int] = {}
+        for position in sorted(range(len(participants)), key=lambda position: ceremony_sort_key(participants[position])):
+            participant = participants[position]
+            block = self.blocks.get(participant.altersklasse)
+            if block is None:
+                block = SpoolBlock(participant.altersklasse, get_spool_path(participant.altersklasse, output_dir))
+                self.blocks[participant.altersklasse] = block
+            block.positions.append(position)
+            self._block_of[position] = block
+            self._position_of[id(participant)] = position
+
+    def on_result(self, participant: Participant, pdf_path: Optional[str]) -> None:
+        """Meldet eine fertige (oder fehlgeschlagene) Urkunde und schreibt den Block so weit wie möglich fort."""
+        position = self._position_of.get(id(participant))
+        if position is None:
+            return
+        with self._lock:
+            self.results[position] = pdf_path
+            self._advance(self._block_of[position], final=False)
+
+    def finish(self, results: List[Optional[str]]) -> List[str]:
+        """
+        Übernimmt die Ergebnisse aller Teilnehmer (auch übersprungene, unveränderte Urkunden),
+        schließt alle Druckdateien ab und gibt ihre Pfade zurück, sobald der Schreib-Thread fertig ist.
+        """
+        with self._lock:
+            for position, pdf_path in enumerate(results):
+                self.results.setdefault(position, pdf_path)
+            for block in self.blocks.values():
+                self._advance(block, final=True)
+        self._stop_writer()
+        return self.completed
+
+    def discard(self) -> None:
+        """Verwirft unvollständige Druckdateien, z. B. nach einem Abbruch."""
+        with self._lock:
+            self._discarded = True
+        self._stop_writer()
+        for block in self.blocks.values():
+            if block.writer is not None:
+                block.writer.discard()
+                block.writer = None
+
+    def _advance(self, block: SpoolBlock, final: bool) -> None:
+        """Schreibt die Reihenfolge eines Blocks fort (unter der Sperre) und übergibt fertige Urkunden dem Schreib-Thread."""
+        pdf_paths = []
+        while block.cursor < len(block.positions) and block.positions[block.cursor] in self.results:
+            pdf_path = self.results[block.positions[block.cursor]]
+            block.cursor += 1
+            if pdf_path is not None:
+                pdf_paths.append(pdf_path)
+        close = not block.closed and (block.cursor == len(block.positions) or final)
+        if not pdf_paths and not close:
+            return
+        block.closed = block.closed or close
+        if self._writer_thread is None:
+            self._writer_thread = threading.Thread(target=self._write_blocks, name='druckdateien', daemon=True)
+            self._writer_thread.start()
+        self._queue.put((block, pdf_paths, close))
+
+    def _stop_writer(self) -> None:
+        """Wartet, bis der Schreib-Thread alle Aufträge erledigt hat, und beendet ihn."""
+        with self._lock:
+            thread, self._writer_thread = self._writer_thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join()
+
+    def _write_blocks(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            block, pdf_paths, close = item
+            if self._discarded or block.failed:
+                continue
+            try:
+                for pdf_path in pdf_paths:
+                    self._append(block, pdf_path)
+                if close:
+                    self._close(block)
+            except Exception as e:
+                # Ein fehlerhafter Block soll die Druckdateien der übrigen Altersklassen nicht verhindern
+                print(f"Druckdatei für Altersklasse {block.altersklasse} konnte nicht erstellt werden: {e}")
+                block.failed = True
+                if block.writer is not None:
+                    block.writer.discard()
+                    block.writer = None
+
+    def _append(self, block: SpoolBlock, pdf_path: str) -> None:
+        from PyPDF2 import PdfReader
+        from pdf_stream import StreamingPdfWriter
+
+        if not os.path.exists(pdf_path):
+            return
+        if block.writer is None:
+            block.writer = StreamingPdfWriter(block.path)
+        reader = PdfReader(pdf_path)
+        if self.layout == SPOOL_LAYOUT_TWO_UP:
+            for page in reader.pages:
+                self._add_two_up(block, block.writer.add_form(page))
+        else:
+            block.writer.append(reader)
+            if self.layout == SPOOL_LAYOUT_DUPLEX:
+                # Leere Rückseite, damit jede Urkunde auf einem eigenen Blatt beginnt
+                for page in reader.pages:
+                    block.writer.append_blank_page([float(value) for value in page.mediabox])
+
+    def _add_two_up(self, block: SpoolBlock, form: Tuple[int, float, float]) -> None:
+        if block.pending_form is None:
+            block.pending_form = form
+        else:
+            self._write_sheet(block, [block.pending_form, form])
+            block.pending_form = None
+
+    def _write_sheet(self, block: SpoolBlock, forms: List[Tuple[int, float, float]]) -> None:
+        """Setzt zwei Seiten nebeneinander auf ein Querformatblatt in der Größe der ersten Seite."""
+        _, width, height = forms[0]
+        sheet_width, sheet_height = height, width
+        placements = []
+        for slot, (number, form_width, form_height) in enumerate(forms):
+            scale = min(sheet_width / 2 / form_width, sheet_height / form_height)
+            x = slot * sheet_width / 2 + (sheet_width / 2 - form_width * scale) / 2
+            y = (sheet_height - form_height * scale) / 2
+            placements.append((number, scale, x, y))
+        block.writer.append_imposed_page([0, 0, sheet_width, sheet_height], placements)
+
+    def _close(self, block: SpoolBlock) -> None:
+        if block.writer is None:
+            return
+        if block.pending_form is not None:
+            self._write_sheet(block, [block.pending_form])
+            block.pending_form = None
+        block.pages = block.writer.page_count
+        block.writer.close()
+        block.writer = None
+        self.completed.append(block.path)
+        print(f"Druckdatei für Altersklasse {block.altersklasse} erstellt: {block.path} ({block.pages} Seiten)")
+        if self.on_block is not None:
+            self.on_block(block.path)
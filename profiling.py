@@ -0,0 +1,142 @@
+# profiling.py
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import ContextManager, Dict, List, Optional
+
+# Stufen der Pipeline, in der Reihenfolge der Zusammenfassung
+STAGE_PARSE = 'einlesen'
+STAGE_FILTER = 'filtern'
+STAGE_RENDER = 'vorlage'
+STAGE_TEMPDIR = 'tempdir'
+STAGE_PDFLATEX = 'pdflatex'
+STAGE_OVERLAY = 'overlay'
+STAGE_MOVE = 'verschieben'
+STAGE_MERGE = 'master'
+STAGES = (STAGE_PARSE, STAGE_FILTER, STAGE_RENDER, STAGE_TEMPDIR, STAGE_PDFLATEX, STAGE_OVERLAY, STAGE_MOVE,
+          STAGE_MERGE)
+
+class Span:
+    """Ein gemessener Abschnitt: Stufe, Beginn und Dauer in Sekunden seit Start des Profilers, Thread."""
+
+    __slots__ = ('stage', 'start', 'duration', 'thread', 'label')
+
+    def __init__(self, stage: str, start: float, duration: float, thread: int, label: Optional[str]):
+        self.stage = stage
+        self.start = start
+        self.duration = duration
+        self.thread = thread
+        self.label = label
+
+class Profiler:
+    """
+    Sammelt Laufzeiten der einzelnen Stufen (Einlesen, Filtern, Vorlage, tempdir, pdflatex, Verschieben,
+    Master-PDFs) und die Dauer pro Teilnehmer. Die Messungen sind threadsicher und können als Tabelle
+    ausgegeben oder als JSON bzw. Chrome-Trace (chrome://tracing, Perfetto) gespeichert werden.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        # Dauer pro Teilnehmer; bei Sammelkompilierung der Anteil an der gemeinsamen Aufgabe
+        self.participants: List[Dict] = []
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _thread_number(self) -> int:
+        # Kleine fortlaufende Nummern statt Thread-IDs, damit der Trace lesbar bleibt
+        ident = threading.get_ident()
+        number = self._threads.get(ident)
+        if number is None:
+            number = self._threads[ident] = len(self._threads) + 1
+        return number
+
+    def record(self, stage: str, start: float, end: float, label: Optional[str] = None) -> None:
+        """Vermerkt einen Abschnitt mit Zeitpunkten aus time.perf_counter()."""
+        with self._lock:
+            self.spans.append(Span(stage, start - self.origin, end - start, self._thread_number(), label))
+
+    @contextlib.contextmanager
+    def stage(self, stage: str, label: Optional[str] = None):
+        """Misst die Dauer des with-Blocks als Abschnitt der angegebenen Stufe."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.perf_counter(), label)
+
+    def record_participant(self, label: str, seconds: float) -> None:
+        with self._lock:
+            self.participants.append({'label': label, 'seconds': seconds})
+
+    def stage_totals(self) -> Dict[str, Dict]:
+        """Gibt pro Stufe Anzahl, Gesamt-, Mittel- und Höchstdauer in Sekunden zurück."""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span.stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += span.duration
+            entry['max'] = max(entry['max'], span.duration)
+        for entry in totals.values():
+            entry['mean'] = entry['total'] / entry['count']
+        order = {stage: position for position, stage in enumerate(STAGES)}
+        return dict(sorted(totals.items(), key=lambda item: (order.get(item[0], len(order)), item[0])))
+
+    def summary(self, slowest: int = 5) -> str:
+        """
+        Tabelle der Stufen mit Anzahl, Summe, Mittelwert, Maximum und Anteil an der Summe aller Stufen,
+        dazu die langsamsten Teilnehmer. Stufen laufen parallel in mehreren Threads, die Summen
+        können daher die Gesamtlaufzeit übersteigen.
+        """
+        totals = self.stage_totals()
+        overall = sum(entry['total'] for entry in totals.values())
+        lines = [f"{'Stufe':<12} {'Anzahl':>7} {'Summe s':>9} {'Mittel ms':>10} {'Max ms':>9} {'Anteil':>7}"]
+        for stage, entry in totals.items():
+            share = entry['total'] / overall if overall else 0.0
+            lines.append(f"{stage:<12} {entry['count']:>7} {entry['total']:>9.2f} {entry['mean'] * 1000:>10.1f} "
+                         f"{entry['max'] * 1000:>9.1f} {share:>7.1%}")
+        with self._lock:
+            participants = sorted(self.participants, key=lambda entry: entry['seconds'], reverse=True)
+        if participants:
+            mean = sum(entry['seconds'] for entry in participants) / len(participants)
+            lines.append(f"{len(participants)} Teilnehmer, im Mittel {mean * 1000:.1f} ms pro Urkunde; langsamste:")
+            for entry in participants[:slowest]:
+                lines.append(f"  {entry['seconds'] * 1000:>9.1f} ms  {entry['label']}")
+        return '\n'.join(lines)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = [{'stage': span.stage, 'start': span.start, 'duration': span.duration,
+                      'thread': span.thread, 'label': span.label} for span in self.spans]
+            participants = list(self.participants)
+        return {'stages': self.stage_totals(), 'participants': participants, 'spans': spans}
+
+    def write_json(self, path: str) -> None:
+        """Speichert Stufensummen, Teilnehmerdauern und alle Abschnitte als JSON."""
+        _write_atomic(path, self.to_dict())
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Speichert alle Abschnitte im Trace-Event-Format von Chrome (ein Balken pro Abschnitt und Thread)."""
+        with self._lock:
+            events = [{'name': span.stage if span.label is None else f"{span.stage} {span.label}",
+                       'cat': span.stage, 'ph': 'X', 'pid': os.getpid(), 'tid': span.thread,
+                       'ts': round(span.start * 1e6), 'dur': round(span.duration * 1e6)}
+                      for span in self.spans]
+        _write_atomic(path, {'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+def _write_atomic(path: str, data: Dict) -> None:
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def measure(profiler: Optional[Profiler], stage: str, label: Optional[str] = None) -> ContextManager:
+    """Wie Profiler.stage, ohne Profiler ein wirkungsloser Kontext."""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(stage, label)
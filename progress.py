@@ -0,0 +1,80 @@
+# progress.py
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+class ProgressTracker:
+    """
+    Zählt fertige Urkunden und meldet strukturierte Fortschrittsereignisse
+    (erledigt/gesamt, Urkunden pro Sekunde, geschätzte Restzeit, aktuelle Klasse).
+    Ereignisse werden höchstens alle min_interval Sekunden gemeldet, das letzte immer; nach einem Abbruch
+    meldet flush() den tatsächlichen Stand.
+    """
+
+    def __init__(self, total: int, callback: Callable[[Dict], None], skipped: int = 0, min_interval: float = 0.1):
+        self.total = total
+        self.skipped = skipped
+        self.callback = callback
+        self.min_interval = min_interval
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last_emit = 0.0
+        # Stand des zuletzt gemeldeten Ereignisses
+        self._emitted = (0, 0)
+        self._lock = threading.Lock()
+
+    def advance(self, current: Optional[str] = None, ok: bool = True, count: int = 1) -> None:
+        """Meldet count fertige Urkunden, current beschreibt die gerade bearbeitete Klasse."""
+        with self._lock:
+            self.done += count
+            if not ok:
+                self.failed += count
+            now = time.perf_counter()
+            finished = self.done >= self.total
+            if not finished and now - self._last_emit < self.min_interval:
+                return
+            self._last_emit = now
+            self._emitted = (self.done, self.failed)
+            event = self.snapshot(now, current)
+        self.callback(event)
+
+    def flush(self) -> None:
+        """Meldet den aktuellen Stand, falls er wegen min_interval noch nicht gemeldet wurde."""
+        with self._lock:
+            if self._emitted == (self.done, self.failed):
+                return
+            self._emitted = (self.done, self.failed)
+            event = self.snapshot()
+        self.callback(event)
+
+    def snapshot(self, now: Optional[float] = None, current: Optional[str] = None) -> Dict:
+        """Gibt den aktuellen Stand als Ereignis zurück."""
+        elapsed = (now or time.perf_counter()) - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        return {
+            'done': self.done,
+            'failed': self.failed,
+            'total': self.total,
+            'skipped': self.skipped,
+            'elapsed': elapsed,
+            'rate': rate,
+            'eta': remaining / rate if rate > 0 else None,
+            'current': current,
+        }
+
+def format_progress(event: Dict) -> str:
+    """Formatiert ein Fortschrittsereignis für die Anzeige."""
+    text = f"{event['done']}/{event['total']} Urkunden"
+    if event['rate']:
+        text += f", {event['rate']:.1f}/s"
+    if event['eta'] is not None and event['done'] < event['total']:
+        minutes, seconds = divmod(int(event['eta']), 60)
+        text += f", noch ca. {minutes}:{seconds:02d} min"
+    if event['current']:
+        text += f" ({event['current']})"
+    if event['failed']:
+        text += f", {event['failed']} Fehler"
+    return text
@@ -0,0 +1,136 @@
+# results_watcher.py
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from participant_reader import Participant, iter_json_items, normalize_participant
+
+# Identität eines Eintrags der Exportdatei: ix, Vorname, Nachname und Kategorie
+ParticipantKey = Tuple[str, str, str, str]
+
+def get_participant_key(item: Dict) -> ParticipantKey:
+    """Gibt die Identität eines Eintrags zurück; ix allein reicht nicht, es kommt im Export mehrfach vor."""
+    return (str(item.get('ix', '')).strip(), item.get('first', '').strip().casefold(),
+            item.get('last', '').strip().casefold(), ' '.join(item.get('category', '').split()))
+
+def read_snapshot(json_file: str, encoding: str = 'utf-8') -> Dict[ParticipantKey, Participant]:
+    """
+    Liest die Exportdatei als Zuordnung Identität -> Teilnehmer. Anders als read_participants werden
+    Fehler nicht abgefangen, damit eine gerade geschriebene, unvollständige Datei erkannt wird.
+    """
+    snapshot = {}
+    with open(json_file, 'r', encoding=encoding) as f:
+        for item in iter_json_items(f, jsonl=json_file.lower().endswith('.jsonl')):
+            snapshot[get_participant_key(item)] = normalize_participant(item)
+    return snapshot
+
+def is_final(participant: Optional[Participant]) -> bool:
+    """Eine Platzierung gilt als endgültig, sobald der Export einen Platz größer 0 enthält."""
+    return participant is not None and participant.platz is not None and participant.platz > 0
+
+def diff_snapshots(previous: Dict[ParticipantKey, Participant],
+                   current: Dict[ParticipantKey, Participant]) -> Tuple[List[Participant], List[Participant]]:
+    """
+    Vergleicht zwei Stände der Exportdatei. Gibt die Teilnehmer zurück, deren Platzierung endgültig
+    geworden ist oder deren Daten sich bei endgültiger Platzierung geändert haben, sowie die Teilnehmer,
+    deren endgültige Platzierung zurückgenommen wurde oder die aus dem Export entfernt wurden.
+    """
+    changed = [participant for key, participant in current.items()
+               if is_final(participant) and previous.get(key) != participant]
+    withdrawn = [participant for key, participant in previous.items()
+                 if is_final(participant) and not is_final(current.get(key))]
+    return changed, withdrawn
+
+class ResultsWatcher:
+    """
+    Überwacht die Exportdatei der Ergebnisse durch Abfragen von Änderungszeit und Größe.
+    Nach jeder Änderung wird die Datei neu gelesen und mit dem vorherigen Stand verglichen;
+    on_change erhält die neu oder geändert platzierten und die zurückgezogenen Teilnehmer.
+    Eine Datei, die beim Lesen noch unvollständig ist, wird beim nächsten Abfragen erneut gelesen.
+
+    snapshot ist der zuletzt erfolgreich verarbeitete Stand, current der zuletzt gelesene. Ein neuer Stand
+    wird erst übernommen, wenn on_change ohne Fehler zurückkehrt; sonst werden dieselben Änderungen beim
+    nächsten Abfragen erneut gemeldet. on_change kann die Teilnehmer aus changed zurückgeben, deren Urkunde
+    nicht erzeugt wurde; für sie bleibt der alte Stand stehen, sie werden beim nächsten Abfragen erneut
+    gemeldet, auch wenn sich die Datei nicht geändert hat.
+
+    Der erste Stand wird mit einem leeren Stand verglichen, zu Beginn werden also alle bereits
+    endgültig platzierten Teilnehmer gemeldet.
+    """
+
+    def __init__(self, json_file: str,
+                 on_change: Callable[[List[Participant], List[Participant]], Optional[Iterable[Participant]]],
+                 interval: float = 2.0, on_error: Optional[Callable[[str], None]] = None):
+        self.json_file = json_file
+        self.on_change = on_change
+        self.on_error = on_error
+        self.interval = interval
+        self.snapshot: Dict[ParticipantKey, Participant] = {}
+        self.current: Dict[ParticipantKey, Participant] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        # Teilnehmer, deren Urkunde beim letzten Mal nicht erzeugt wurde
+        self.failed: Set[ParticipantKey] = set()
+        self._stop_event = threading.Event()
+
+    def _report_error(self, message: str) -> None:
+        if self.on_error is not None:
+            self.on_error(message)
+
+    def poll(self) -> bool:
+        """Prüft die Datei einmal und ruft on_change bei Änderungen auf. Gibt True zurück, wenn etwas gemeldet wurde."""
+        try:
+            stat = os.stat(self.json_file)
+        except FileNotFoundError:
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature and not self.failed:
+            return False
+        if signature != self._signature:
+            try:
+                self.current = read_snapshot(self.json_file)
+            except (OSError, ValueError) as e:
+                # Vermutlich wird der Export gerade geschrieben; Stand nicht übernehmen und erneut versuchen
+                self._report_error(f"Exportdatei '{self.json_file}' konnte nicht gelesen werden: {e}")
+                return False
+        current = self.current
+        changed, withdrawn = diff_snapshots(self.snapshot, current)
+        failed_participants = None
+        if changed or withdrawn:
+            failed_participants = self.on_change(changed, withdrawn)
+        # Erst nach erfolgreicher Verarbeitung übernehmen, fehlgeschlagene Teilnehmer mit ihrem alten Stand
+        failed_ids = {id(participant) for participant in failed_participants or ()}
+        snapshot = dict(current)
+        self.failed = set()
+        for key, participant in current.items():
+            if id(participant) in failed_ids:
+                self.failed.add(key)
+                if key in self.snapshot:
+                    snapshot[key] = self.snapshot[key]
+                else:
+                    del snapshot[key]
+        self._signature = signature
+        self.snapshot = snapshot
+        return bool(changed or withdrawn)
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    def stop(self) -> None:
+        """Beendet run(), auch aus einem anderen Thread."""
+        self._stop_event.set()
+
+    def run(self) -> None:
+        """
+        Fragt die Datei im Abstand von interval Sekunden ab, bis stop() aufgerufen wird.
+        Fehler in on_change werden über on_error gemeldet, die Überwachung läuft weiter.
+        """
+        while not self.stopped:
+            start = time.perf_counter()
+            try:
+                self.poll()
+            except Exception as e:
+                self._report_error(f"Änderungen der Exportdatei konnten nicht verarbeitet werden, "
+                                   f"neuer Versuch beim nächsten Abfragen: {type(e).__name__}: {e}")
+            self._stop_event.wait(max(self.interval - (time.perf_counter() - start), 0.0))
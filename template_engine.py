@@ -0,0 +1,73 @@
+# template_engine.py
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, Optional, Union
+import config
+from participant_reader import Participant
+
+# Platzhalter haben die Form <<NAME>>. Alles, was wie ein Platzhalter aussieht (<< direkt gefolgt von einem
+# Buchstaben), wird geprüft, damit Tippfehler wie <<Name>> oder <<VORNAME >> auffallen. Guillemets als Text
+# daher mit Leerzeichen (<< Text >>) oder als \guillemotleft{} bzw. \guillemotright{} schreiben.
+PLACEHOLDER_PATTERN = re.compile(r'<<(\w[^<>]*)>>')
+
+# Eine Vorlage kann ihre Satz-Engine mit einer Kommentarzeile wie '% Satz-Engine: overlay' selbst festlegen
+ENGINE_PATTERN = re.compile(r'^[ \t]*%[ \t]*Satz-Engine:[ \t]*(\S+)', re.MULTILINE | re.IGNORECASE)
+
+# Berechnung des eingesetzten Textes je Platzhalter
+FIELDS: Dict[str, Callable[[Participant], str]] = {
+    'VORNAME': lambda participant: participant.vorname,
+    'NAME': lambda participant: participant.name,
+    'VEREIN': lambda participant: participant.verein,
+    'PLATZ': lambda participant: f"{participant.platz}" if participant.platz is not None else 'Teilnehmer',
+    'GEWICHTSKLASSE': lambda participant: participant.gewichtsklasse,
+    'ALTERSKLASSE': lambda participant: participant.altersklasse,
+}
+
+class CompiledTemplate:
+    """
+    Eine einmal zerlegte Vorlage aus festen Textabschnitten und Platzhaltern.
+    Eine Urkunde wird mit einem einzigen join erzeugt, statt die Vorlage für jeden Platzhalter zu kopieren.
+    engine ist die in der Vorlage festgelegte Satz-Engine oder None, wenn die Vorgabe des Laufs gilt.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.literals: List[str] = []
+        self.slots: List[str] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.slots.append(match.group(1))
+            position = match.end()
+        self.literals.append(text[position:])
+
+        unknown = sorted(set(self.slots) - set(FIELDS))
+        if unknown:
+            raise ValueError(f"Unbekannte Platzhalter in der Vorlage: {', '.join('<<' + name + '>>' for name in unknown)} "
+                             f"(erlaubt: {', '.join('<<' + name + '>>' for name in FIELDS)})")
+        self.placeholders: FrozenSet[str] = frozenset(self.slots)
+
+        match = ENGINE_PATTERN.search(text)
+        self.engine: Optional[str] = match.group(1).lower() if match else None
+        if self.engine is not None and self.engine not in config.ENGINES:
+            raise ValueError(f"Unbekannte Satz-Engine '{match.group(1)}' in der Vorlage (erlaubt: {', '.join(config.ENGINES)})")
+
+    def render(self, participant: Participant) -> str:
+        """Setzt die Daten des Teilnehmers ein; nur tatsächlich verwendete Felder werden berechnet."""
+        values = {name: FIELDS[name](participant) for name in self.placeholders}
+        parts = [self.literals[0]]
+        for name, literal in zip(self.slots, self.literals[1:]):
+            parts.append(values[name])
+            parts.append(literal)
+        return ''.join(parts)
+
+@lru_cache(maxsize=16)
+def _compile_text(text: str) -> CompiledTemplate:
+    return CompiledTemplate(text)
+
+def compile_template(template: Union[str, CompiledTemplate]) -> CompiledTemplate:
+    """Zerlegt eine Vorlage; bereits zerlegte Vorlagen und bekannte Texte werden wiederverwendet."""
+    if isinstance(template, CompiledTemplate):
+        return template
+    return _compile_text(template)
@@ -0,0 +1,145 @@
+# tex_daemon.py
+
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import List, Optional
+import config
+from generation_job import GenerationJob
+
+JOBNAME = 'urkunde'
+
+class WarmTexProcess:
+    """
+    Ein pdflatex-Prozess, der Vorspann und \\begin{document} bereits über stdin erhalten hat.
+    TeX lädt die Pakete sofort und wartet dann im scrollmode auf die nächste Eingabezeile,
+    bis der Inhalt der Urkunde geschickt wird. Jeder Prozess erzeugt genau ein PDF.
+    """
+
+    def __init__(self, preamble: str, base_dir: str):
+        self.workdir = tempfile.mkdtemp(prefix='warm_', dir=base_dir)
+        self.process: Optional[subprocess.Popen] = None
+        try:
+            # Ohne Dateiname liest pdflatex die erste Zeile vom Terminal; beginnt sie mit '\', ist sie TeX-Eingabe
+            self.process = subprocess.Popen(['pdflatex', '-interaction=scrollmode', '-halt-on-error',
+                                             f'-jobname={JOBNAME}'],
+                                            cwd=self.workdir, stdin=subprocess.PIPE,
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.process.stdin.write((preamble + '\\begin{document}\n').encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError:
+            self.discard()
+            raise
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def compile(self, body: str, timeout: float) -> Optional[str]:
+        """Schickt den Inhalt und beendet das Dokument. Gibt den Pfad des PDFs zurück oder None."""
+        try:
+            self.process.stdin.write((body + '\n\\end{document}\n').encode('utf-8'))
+            self.process.stdin.close()
+            returncode = self.process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+            return None
+        pdf_file = os.path.join(self.workdir, JOBNAME + '.pdf')
+        if returncode != 0 or not os.path.exists(pdf_file):
+            return None
+        return pdf_file
+
+    def discard(self) -> None:
+        """Beendet den Prozess, falls er noch läuft, und löscht sein Arbeitsverzeichnis."""
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
+        if self.process is not None and not self.process.stdin.closed:
+            self.process.stdin.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class TexDaemon:
+    """
+    Hält einen Vorrat vorgewärmter pdflatex-Prozesse, damit eine Urkunde nicht auf Prozessstart
+    und das Laden der Pakete warten muss. Für jeden verbrauchten Prozess wird sofort ein neuer
+    gestartet, der sich im Hintergrund vorbereitet.
+
+    Lässt sich pdflatex nicht starten oder beendet sich ein Prozess schon vor seinem Einsatz
+    (z. B. wegen eines Fehlers im Vorspann), wird der Daemon als nicht verfügbar markiert;
+    compile() gibt dann False zurück und der Aufrufer kompiliert wie gewohnt mit einem eigenen Prozess.
+    """
+
+    def __init__(self, preamble: str, pool_size: int = 1, timeout: Optional[float] = None):
+        self.preamble = preamble
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout or config.TEX_DAEMON_TIMEOUT
+        self.available = True
+        self.base_dir = tempfile.mkdtemp(prefix='urkunden_daemon_')
+        self._idle: List[WarmTexProcess] = []
+        self._lock = threading.Lock()
+        with self._lock:
+            self._fill()
+
+    def _spawn(self) -> Optional[WarmTexProcess]:
+        try:
+            return WarmTexProcess(self.preamble, self.base_dir)
+        except OSError:
+            print("pdflatex-Prozesse konnten nicht vorgewärmt werden, kompiliere ohne Daemon.")
+            self.available = False
+            return None
+
+    def _fill(self) -> None:
+        while self.available and len(self._idle) < self.pool_size:
+            process = self._spawn()
+            if process is not None:
+                self._idle.append(process)
+
+    def _acquire(self) -> Optional[WarmTexProcess]:
+        with self._lock:
+            process = self._idle.pop(0) if self._idle else None
+            if process is not None and not process.is_alive():
+                process.discard()
+                print("Vorgewärmter pdflatex-Prozess wurde vorzeitig beendet, kompiliere ohne Daemon.")
+                self.available = False
+                process = None
+            elif process is None and self.available:
+                # Mehr gleichzeitige Anfragen als vorgewärmte Prozesse: kalt starten
+                process = self._spawn()
+            self._fill()
+            return process
+
+    def compile(self, body: str, pdf_destination: str, job: Optional[GenerationJob] = None) -> bool:
+        """
+        Kompiliert den Inhalt zwischen \\begin{document} und \\end{document} und verschiebt
+        das PDF nach pdf_destination, das Log daneben (gleicher Name mit .log), damit der Aufrufer es
+        auf Warnungen prüfen kann. Gibt False zurück, falls der Daemon nicht helfen konnte. Mit einem
+        GenerationJob wird der Prozess registriert, sodass ein Abbruch ihn sofort beendet.
+        """
+        if not self.available:
+            return False
+        process = self._acquire()
+        if process is None:
+            return False
+        try:
+            with job.attach(process.process) if job is not None else contextlib.nullcontext():
+                pdf_file = process.compile(body, self.timeout)
+            if pdf_file is None:
+                return False
+            shutil.move(pdf_file, pdf_destination)
+            with contextlib.suppress(OSError):
+                shutil.move(os.path.splitext(pdf_file)[0] + '.log', os.path.splitext(pdf_destination)[0] + '.log')
+            return True
+        finally:
+            process.discard()
+
+    def close(self) -> None:
+        """Beendet alle wartenden Prozesse und entfernt die Arbeitsverzeichnisse."""
+        with self._lock:
+            self.available = False
+            for process in self._idle:
+                process.discard()
+            self._idle = []
+        shutil.rmtree(self.base_dir, ignore_errors=True)
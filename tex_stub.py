@@ -0,0 +1,109 @@
+# tex_stub.py
+#
+# Ersatz für pdflatex für Benchmarks und Tests ohne TeX-Installation.
+# Erzeugt für jede durch \newpage getrennte Urkunde eine Seite einer minimalen, gültigen PDF-Datei.
+# Für den Hintergrund der Overlay-Engine (pdf_overlay.py) wird zusätzlich die Positionsdatei geschrieben.
+
+import os
+import re
+import sys
+from typing import List
+
+STUB_VERSION = 'pdfTeX 3.14159265 (Stub für Benchmarks)'
+
+# Musterseiten der Felder im Hintergrund-Dokument der Overlay-Engine
+SAMPLE_PATTERN = re.compile(r'^\\UrkundenMuster\{', re.MULTILINE)
+# TeX-Punkte (sp) pro PDF-Punkt
+SP_PER_BP = 65536 * 72.27 / 72
+
+def build_pdf(page_texts: List[str]) -> bytes:
+    """Erzeugt eine minimale PDF-Datei mit einer A4-Seite pro Text."""
+    # Einheitliche Breiten für alle Zeichen, damit die Overlay-Engine die Musterseiten auswerten kann
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /FirstChar 0 /LastChar 255 /Widths ["
+               + b" ".join(b"500" for _ in range(256)) + b"] >>"]
+    kids = []
+    for text in page_texts:
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        content = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % kid for kid in kids)
+                  + b"] /Count %d >>" % len(kids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+def write_positions(jobname: str, fields: int) -> None:
+    """Schreibt Positionen (Seite 1, untereinander) und Wortabstand der Felder wie \\UrkundenFeld und \\UrkundenMuster."""
+    with open(jobname + '.felder', 'w', encoding='utf-8') as f:
+        for number in range(fields):
+            f.write(f"feld {number} 1 {int(297.5 * SP_PER_BP)} {int((600 - 40 * number) * SP_PER_BP)} "
+                    f"{int(425 * SP_PER_BP)}\n")
+        for number in range(fields):
+            f.write(f"schrift {number} {int(3.3 * SP_PER_BP)}\n")
+
+def write_output(jobname: str, document: str) -> int:
+    """
+    Schreibt PDF und Log für ein Dokument, eine Seite pro durch \\newpage getrennter Urkunde. Der Hintergrund
+    der Overlay-Engine erhält eine Seite und eine Musterseite pro Feld sowie die Positionsdatei.
+    """
+    body = document.split('\\begin{document}', 1)[-1]
+    fields = len(SAMPLE_PATTERN.findall(body))
+    if fields:
+        write_positions(jobname, fields)
+        page_texts = ["Hintergrund"] + [f"Muster {number}" for number in range(1, fields + 1)]
+    else:
+        page_texts = [f"Urkunde {number}" for number in range(1, len(body.split('\\newpage')) + 1)]
+    with open(jobname + '.pdf', 'wb') as f:
+        f.write(build_pdf(page_texts))
+    with open(jobname + '.log', 'w', encoding='utf-8') as f:
+        f.write(f"This is {STUB_VERSION}\nOutput written on {jobname}.pdf ({len(page_texts)} pages).\n")
+    return 0
+
+def main(argv: List[str]) -> int:
+    """Wertet die von certificate_generator und format_cache verwendeten pdflatex-Argumente aus."""
+    if '--version' in argv:
+        print(STUB_VERSION)
+        return 0
+
+    jobname = None
+    filenames = []
+    for arg in argv:
+        if arg.startswith('-jobname='):
+            jobname = arg.split('=', 1)[1]
+        elif not arg.startswith('-') and not arg.startswith('&'):
+            filenames.append(arg)
+    if not filenames:
+        if '-ini' in argv:
+            return 1
+        # Ohne Dateiname liest pdflatex das Dokument vom Terminal (tex_daemon)
+        document = sys.stdin.buffer.read().decode('utf-8')
+        return write_output(jobname or 'texput', document)
+    tex_filename = filenames[-1]
+    if not os.path.exists(tex_filename) and os.path.exists(tex_filename + '.tex'):
+        tex_filename += '.tex'
+    jobname = jobname or os.path.splitext(os.path.basename(tex_filename))[0]
+
+    if '-ini' in argv:
+        # Formaterzeugung: eine Platzhalterdatei genügt, beim Kompilieren wird -fmt ignoriert
+        with open(jobname + '.fmt', 'wb') as f:
+            f.write(b'stub format\n')
+        return 0
+
+    with open(tex_filename, 'r', encoding='utf-8') as f:
+        return write_output(jobname, f.read())
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
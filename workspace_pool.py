@@ -0,0 +1,109 @@
+# workspace_pool.py
+
+import contextlib
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from typing import List, Optional
+import config
+
+def get_workspace_base_dir() -> str:
+    """
+    Verzeichnis für die Arbeitsverzeichnisse: config.WORKSPACE_DIR, sonst /dev/shm (im Arbeitsspeicher),
+    falls vorhanden und beschreibbar, sonst das temporäre Verzeichnis des Systems.
+    """
+    if config.WORKSPACE_DIR:
+        return config.WORKSPACE_DIR
+    if config.USE_TMPFS and os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+class Workspace:
+    """
+    Ein wiederverwendbares Arbeitsverzeichnis für pdflatex. Jede Kompilierung erhält einen eigenen
+    Jobnamen, damit Dateien einer früheren, fehlgeschlagenen Kompilierung nie für das Ergebnis gehalten werden.
+    """
+
+    def __init__(self, base_dir: str):
+        self.path = tempfile.mkdtemp(prefix='urkunden_', dir=base_dir)
+        self.count = 0
+
+    def next_jobname(self) -> str:
+        self.count += 1
+        return f"urkunde_{self.count}"
+
+    def clean(self, jobname: str) -> None:
+        """
+        Löscht die Dateien einer Kompilierung (.tex, .aux, .log, .pdf, ...) samt ihrer erneuten Versuche
+        (<jobname>-1, ...), das Verzeichnis bleibt bestehen.
+        """
+        prefix = (jobname + '.', jobname + '-')
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def remove(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+class WorkspacePool:
+    """
+    Arbeitsverzeichnisse, die über einen ganzen Lauf wiederverwendet werden, statt pro Urkunde ein
+    temporäres Verzeichnis anzulegen und zu löschen. Jeder Worker-Thread erhält ein freies Verzeichnis;
+    es werden höchstens so viele angelegt, wie gleichzeitig kompiliert wird.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = base_dir or get_workspace_base_dir()
+        self._free: List[Workspace] = []
+        self._all: List[Workspace] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Workspace:
+        """Gibt ein freies Arbeitsverzeichnis zurück und legt nur bei Bedarf ein neues an."""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        workspace = Workspace(self.base_dir)
+        with self._lock:
+            self._all.append(workspace)
+        return workspace
+
+    def release(self, workspace: Workspace) -> None:
+        """Gibt ein Arbeitsverzeichnis zurück, nachdem die Dateien der Kompilierung gelöscht wurden."""
+        with self._lock:
+            self._free.append(workspace)
+
+    def close(self) -> None:
+        """Löscht alle Arbeitsverzeichnisse."""
+        with self._lock:
+            workspaces, self._all, self._free = self._all, [], []
+        for workspace in workspaces:
+            workspace.remove()
+
+def install_file(source: str, destination: str) -> None:
+    """
+    Verschiebt eine Datei atomar an ihr Ziel: die Zieldatei ist immer entweder die alte oder die
+    vollständige neue Datei. Liegt das Arbeitsverzeichnis auf einem anderen Dateisystem (z. B. /dev/shm),
+    wird zuerst neben das Ziel kopiert und dann umbenannt.
+    """
+    try:
+        os.replace(source, destination)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    temp_destination = destination + '.tmp'
+    try:
+        shutil.copyfile(source, temp_destination)
+        os.replace(temp_destination, destination)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_destination)
+        raise
+    os.remove(source)